@@ -7,6 +7,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from pydantic import BaseModel
 from datetime import datetime, timezone
 from .auth_utils import get_current_user
+from .email_outbox import outbox as email_outbox
 from typing import Optional
 
 router = APIRouter(prefix="/users", tags=["user-approval"])
@@ -159,7 +160,6 @@ async def approve_user(
     
     # Send approval email to user
     try:
-        from .email_service import EmailService
         import os
         
         # Get organization's email settings
@@ -175,12 +175,6 @@ async def approve_user(
             sendgrid_key = os.environ.get("SENDGRID_API_KEY")
         
         if sendgrid_key:
-            email_service = EmailService(
-                api_key=sendgrid_key,
-                from_email=org_settings.get("sendgrid_from_email", "noreply@opsplatform.com") if org_settings else "noreply@opsplatform.com",
-                from_name=org_settings.get("sendgrid_from_name", "Operations Platform") if org_settings else "Operations Platform"
-            )
-            
             # Get frontend URL
             frontend_url = os.environ.get("FRONTEND_URL")
             if not frontend_url:
@@ -246,16 +240,19 @@ async def approve_user(
             </html>
             """
             
-            success = email_service.send_email(
-                to_email=user["email"],
+            success = await email_outbox.enqueue(
+                db,
+                to_emails=[user["email"]],
                 subject=f"Profile Approved - Welcome to {org_name}!",
-                html_content=html_content
-            )
+                html_content=html_content,
+                organization_id=user.get("organization_id"),
+                email_type="registration_approved"
+            ) is not None
             
             if success:
-                print(f"✅ Approval email sent successfully to {user['email']}")
+                print(f"✅ Approval email queued for {user['email']}")
             else:
-                print(f"⚠️ Failed to send approval email to {user['email']}")
+                print(f"⚠️ Failed to queue approval email for {user['email']}")
         else:
             print(f"⚠️ No SendGrid API key configured - cannot send approval email")
             
@@ -363,7 +360,6 @@ async def reject_user(
     
     # Send rejection email to user
     try:
-        from .email_service import EmailService
         import os
         
         # Get organization's email settings
@@ -379,12 +375,6 @@ async def reject_user(
             sendgrid_key = os.environ.get("SENDGRID_API_KEY")
         
         if sendgrid_key:
-            email_service = EmailService(
-                api_key=sendgrid_key,
-                from_email=org_settings.get("sendgrid_from_email", "noreply@opsplatform.com") if org_settings else "noreply@opsplatform.com",
-                from_name=org_settings.get("sendgrid_from_name", "Operations Platform") if org_settings else "Operations Platform"
-            )
-            
             # Get organization name
             org = await db.organizations.find_one({"id": user.get("organization_id")})
             org_name = org.get("name", "Operations Platform") if org else "Operations Platform"
@@ -428,16 +418,19 @@ async def reject_user(
             </html>
             """
             
-            success = email_service.send_email(
-                to_email=user["email"],
+            success = await email_outbox.enqueue(
+                db,
+                to_emails=[user["email"]],
                 subject=f"Profile Registration Update - {org_name}",
-                html_content=html_content
-            )
+                html_content=html_content,
+                organization_id=user.get("organization_id"),
+                email_type="registration_rejected"
+            ) is not None
             
             if success:
-                print(f"✅ Rejection email sent successfully to {user['email']}")
+                print(f"✅ Rejection email queued for {user['email']}")
             else:
-                print(f"⚠️ Failed to send rejection email to {user['email']}")
+                print(f"⚠️ Failed to queue rejection email for {user['email']}")
         else:
             print(f"⚠️ No SendGrid API key configured - cannot send rejection email")
             
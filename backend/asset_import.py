@@ -0,0 +1,220 @@
+"""
+Asset Import - Bulk asset ingestion
+
+POST /api/assets/import reads the upload with import_files (CSV, gzip
+CSV or XLSX) and handles it ASSET_IMPORT_BATCH_SIZE rows at a time:
+
+    1. each row is validated with AssetCreate (blank cells count as absent)
+       and turned into an Asset document
+    2. the batch's asset tags are checked against the organization with one
+       `$in` query, and against earlier rows of the file; unit names are
+       resolved with one `$in` query and cached
+    3. the batch is written with one insert_many(ordered=False) and parent
+       assets are flagged with one update_many
+
+Authentication and the permission check happen once per request, not once
+per row. scripts/benchmark_asset_import.py measures the pipeline at 100k
+rows.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo.errors import BulkWriteError
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Tuple, Set, AsyncIterator
+import json
+import os
+import re
+import uuid
+
+from .asset_models import Asset, AssetCreate
+
+ASSET_IMPORT_BATCH_SIZE = int(os.environ.get("ASSET_IMPORT_BATCH_SIZE", "1000"))
+MAX_REPORTED_ERRORS = 500
+
+REQUIRED_COLUMNS = ["name"]
+
+# Columns holding JSON objects, and the list column (comma or semicolon separated)
+JSON_COLUMNS = {"gps_coordinates", "specifications", "custom_fields"}
+LIST_COLUMNS = {"tags"}
+
+
+# Asset fields AssetCreate does not carry, with their model defaults. Built
+# once: Asset.model_construct() per row spends most of its time inspecting
+# default factories.
+ASSET_ONLY_DEFAULTS = {
+    name: field.default
+    for name, field in Asset.model_fields.items()
+    if name not in AssetCreate.model_fields and not field.is_required() and field.default_factory is None
+}
+
+
+def generate_asset_tag() -> str:
+    return f"AST-{datetime.now(timezone.utc).strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
+
+
+def _format_validation_error(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in e['loc'])}: {e['msg']}" for e in error.errors()
+    )
+
+
+def row_to_asset_data(row: Dict[str, str]) -> Dict[str, Any]:
+    """AssetCreate input for a row: known columns only, blank cells dropped"""
+    data: Dict[str, Any] = {}
+    for field in AssetCreate.model_fields:
+        value = row.get(field)
+        if not value:
+            continue
+        if field in LIST_COLUMNS:
+            data[field] = [item.strip() for item in re.split(r"[;,]", value) if item.strip()]
+        elif field in JSON_COLUMNS:
+            try:
+                data[field] = json.loads(value)
+            except ValueError:
+                raise ValueError(f"{field}: must be a JSON object")
+        else:
+            data[field] = value
+    return data
+
+
+def prepare_rows(
+    rows: List[Tuple[int, Dict[str, str]]],
+    organization_id: str,
+    user_id: str
+) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Dict[str, Any]]]:
+    """Validate rows and build asset documents; returns ([(row, document)], errors)
+
+    Pure CPU work with no database access. unit_name and duplicate tags are
+    filled in and checked by the importer.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    documents = []
+    errors = []
+
+    for row_number, row in rows:
+        try:
+            asset_data = AssetCreate.model_validate(row_to_asset_data(row))
+        except ValidationError as e:
+            errors.append({"row": row_number, "error": _format_validation_error(e)})
+            continue
+        except ValueError as e:
+            errors.append({"row": row_number, "error": str(e)})
+            continue
+
+        # Same document create_asset stores, without re-validating through Asset
+        asset_dict = {
+            name: list(default) if isinstance(default, list) else default
+            for name, default in ASSET_ONLY_DEFAULTS.items()
+        }
+        asset_dict.update(asset_data.model_dump())
+        asset_dict.update({
+            "id": str(uuid.uuid4()),
+            "organization_id": organization_id,
+            "asset_tag": asset_data.asset_tag or generate_asset_tag(),
+            "current_value": asset_data.current_value or asset_data.purchase_cost,
+            "created_by": user_id,
+            "created_at": now,
+            "updated_at": now
+        })
+        documents.append((row_number, asset_dict))
+
+    return documents, errors
+
+
+class AssetImporter:
+    """Imports batches of rows for one organization, caching lookups across batches"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, user: Dict[str, Any]):
+        self.db = db
+        self.organization_id = user["organization_id"]
+        self.user_id = user["id"]
+        self.seen_tags: Set[str] = set()
+        self.unit_names: Dict[str, Optional[str]] = {}
+        self.imported = 0
+        self.failed = 0
+        self.errors: List[Dict[str, Any]] = []
+
+    def _fail(self, errors: List[Dict[str, Any]]):
+        self.failed += len(errors)
+        self.errors.extend(errors[:MAX_REPORTED_ERRORS - len(self.errors)])
+
+    async def _resolve_units(self, unit_ids: Set[str]):
+        missing = [unit_id for unit_id in unit_ids if unit_id not in self.unit_names]
+        if not missing:
+            return
+        units = await self.db.organization_units.find(
+            {"id": {"$in": missing}},
+            {"_id": 0, "id": 1, "name": 1}
+        ).to_list(None)
+        self.unit_names.update({unit_id: None for unit_id in missing})
+        self.unit_names.update({unit["id"]: unit.get("name") for unit in units})
+
+    async def import_batch(self, rows: List[Tuple[int, Dict[str, str]]]):
+        documents, errors = await run_in_threadpool(prepare_rows, rows, self.organization_id, self.user_id)
+
+        # Duplicate tags: against the organization in one query, then within the file
+        tags = [document["asset_tag"] for _, document in documents]
+        existing = {
+            asset["asset_tag"] for asset in await self.db.assets.find(
+                {"organization_id": self.organization_id, "asset_tag": {"$in": tags}},
+                {"_id": 0, "asset_tag": 1}
+            ).to_list(None)
+        } if tags else set()
+
+        accepted = []
+        for row_number, document in documents:
+            tag = document["asset_tag"]
+            if tag in existing or tag in self.seen_tags:
+                errors.append({"row": row_number, "error": f"Asset tag '{tag}' already exists"})
+                continue
+            self.seen_tags.add(tag)
+            accepted.append((row_number, document))
+
+        await self._resolve_units({document["unit_id"] for _, document in accepted if document["unit_id"]})
+        for _, document in accepted:
+            if document["unit_id"]:
+                document["unit_name"] = self.unit_names.get(document["unit_id"])
+
+        inserted = len(accepted)
+        if accepted:
+            try:
+                await self.db.assets.insert_many([document.copy() for _, document in accepted], ordered=False)
+            except BulkWriteError as e:
+                write_errors = e.details.get("writeErrors", [])
+                inserted -= len(write_errors)
+                for error in write_errors:
+                    errors.append({"row": accepted[error["index"]][0], "error": error.get("errmsg", "Insert failed")})
+
+        parent_ids = list({document["parent_asset_id"] for _, document in accepted if document["parent_asset_id"]})
+        if parent_ids:
+            await self.db.assets.update_many(
+                {"id": {"$in": parent_ids}},
+                {"$set": {"has_children": True}}
+            )
+
+        self.imported += inserted
+        self._fail(sorted(errors, key=lambda error: error["row"]))
+
+
+async def import_assets(
+    db: AsyncIOMotorDatabase,
+    user: Dict[str, Any],
+    rows: AsyncIterator[Tuple[int, Dict[str, str]]]
+) -> Dict[str, Any]:
+    """Import every row; returns {imported, failed, errors} (first MAX_REPORTED_ERRORS errors)"""
+    importer = AssetImporter(db, user)
+    batch = []
+    async for row in rows:
+        batch.append(row)
+        if len(batch) >= ASSET_IMPORT_BATCH_SIZE:
+            await importer.import_batch(batch)
+            batch = []
+    if batch:
+        await importer.import_batch(batch)
+
+    return {
+        "imported": importer.imported,
+        "failed": importer.failed,
+        "errors": importer.errors
+    }
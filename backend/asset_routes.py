@@ -14,6 +14,8 @@ from fastapi.responses import StreamingResponse
 
 from .asset_models import Asset, AssetCreate, AssetUpdate, AssetStats, AssetHistory
 from .auth_utils import get_current_user
+from .asset_import import import_assets, REQUIRED_COLUMNS as ASSET_REQUIRED_COLUMNS
+from .import_files import ImportFileError, file_type, iter_upload_rows
 
 router = APIRouter(prefix="/assets", tags=["Assets"])
 
@@ -497,52 +499,24 @@ async def bulk_import_assets(
     request: Request = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Bulk import assets from CSV"""
+    """Bulk import assets from CSV, gzip-compressed CSV or XLSX (requires asset.create.organization permission)"""
     user = await get_current_user(request, db)
     
-    if not file.filename.endswith('.csv'):
+    from .permission_routes import check_permission
+    has_permission = await check_permission(db, user["id"], "asset", "create", "organization")
+    if not has_permission:
+        raise HTTPException(status_code=403, detail="You don't have permission to create assets")
+    
+    if not file_type(file.filename):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only CSV files are supported",
+            detail="Only CSV, gzip-compressed CSV (.csv.gz) and XLSX files are supported",
         )
     
-    # Read CSV content
-    content = await file.read()
-    import csv
-    from io import StringIO
-    
-    csv_data = StringIO(content.decode('utf-8'))
-    reader = csv.DictReader(csv_data)
-    
-    imported = 0
-    errors = []
-    
-    for row_num, row in enumerate(reader, start=2):
-        try:
-            # Create asset from row
-            asset_data = AssetCreate(
-                asset_tag=row.get('asset_tag', ''),
-                name=row.get('name', ''),
-                description=row.get('description'),
-                asset_type=row.get('asset_type', 'equipment'),
-                criticality=row.get('criticality', 'C'),
-                make=row.get('make'),
-                model=row.get('model'),
-                serial_number=row.get('serial_number'),
-            )
-            
-            # Create using existing endpoint logic
-            await create_asset(asset_data, request, db)
-            imported += 1
-            
-        except Exception as e:
-            errors.append({
-                "row": row_num,
-                "error": str(e)
-            })
-    
-    return {
-        "imported": imported,
-        "failed": len(errors),
-        "errors": errors
-    }
+    try:
+        return await import_assets(db, user, iter_upload_rows(file, ASSET_REQUIRED_COLUMNS))
+    except ImportFileError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to read file: {str(e)}",
+        )
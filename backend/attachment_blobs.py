@@ -0,0 +1,177 @@
+"""
+Attachment Blobs - Content-addressed, reference-counted attachment storage
+
+Every attachment upload is hashed (SHA-256) before anything is written to
+GridFS. The hash is looked up in attachment_blobs, which is unique per
+(organization_id, sha256):
+
+    hit  - the existing GridFS file is reused and its ref_count incremented;
+           nothing is written
+    miss - the file is streamed into GridFS and a blob record with
+           ref_count 1 is created
+
+Removing an attachment releases its reference; the GridFS file is deleted
+only when the last reference goes. Dedup is scoped to the organization, so
+a blob is never shared across tenants.
+
+Attachments uploaded before blob records existed have no attachment_blobs
+entry; releasing one of those deletes its GridFS file directly, as before.
+"""
+from fastapi import HTTPException, UploadFile, status
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Tuple
+import asyncio
+import hashlib
+import logging
+
+from .gridfs_streaming import CHUNK_SIZE, upload_stream
+
+logger = logging.getLogger(__name__)
+
+
+def _hash_file(fileobj) -> Tuple[str, int]:
+    fileobj.seek(0)
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = fileobj.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    fileobj.seek(0)
+    return digest.hexdigest(), size
+
+
+async def hash_upload(file: UploadFile) -> Tuple[str, int]:
+    """SHA-256 and size of an UploadFile's spooled body; returns (sha256, size)
+
+    Runs in a thread (hashlib releases the GIL) so hashing a large upload
+    doesn't stall the event loop. The file is rewound afterwards.
+    """
+    return await asyncio.to_thread(_hash_file, file.file)
+
+
+async def _add_reference(db: AsyncIOMotorDatabase, organization_id: str, sha256: str) -> Optional[Dict[str, Any]]:
+    return await db.attachment_blobs.find_one_and_update(
+        {"organization_id": organization_id, "sha256": sha256},
+        {
+            "$inc": {"ref_count": 1},
+            "$set": {"last_referenced_at": datetime.now(timezone.utc).isoformat()}
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+async def store_attachment(
+    db: AsyncIOMotorDatabase,
+    file: UploadFile,
+    organization_id: str,
+    metadata: Dict[str, Any],
+    max_size: Optional[int] = None
+) -> Tuple[str, int, str, bool]:
+    """Store an upload, reusing identical content already in the organization
+
+    Returns (file_id, size, sha256, deduplicated). metadata is only applied
+    when a new GridFS file is written.
+    """
+    sha256, size = await hash_upload(file)
+    if max_size is not None and size > max_size:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size is {max_size / (1024*1024)}MB"
+        )
+
+    blob = await _add_reference(db, organization_id, sha256)
+    if blob:
+        return blob["file_id"], blob["size"], sha256, True
+
+    file_id, size = await upload_stream(
+        db,
+        file,
+        metadata={**metadata, "organization_id": organization_id, "sha256": sha256},
+        max_size=max_size
+    )
+
+    try:
+        await db.attachment_blobs.insert_one({
+            "organization_id": organization_id,
+            "sha256": sha256,
+            "file_id": str(file_id),
+            "size": size,
+            "content_type": metadata.get("content_type"),
+            "ref_count": 1,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "last_referenced_at": datetime.now(timezone.utc).isoformat()
+        })
+    except DuplicateKeyError:
+        # The same content was stored concurrently: keep that copy
+        blob = await _add_reference(db, organization_id, sha256)
+        if blob:
+            await AsyncIOMotorGridFSBucket(db).delete(file_id)
+            return blob["file_id"], blob["size"], sha256, True
+        raise
+
+    return str(file_id), size, sha256, False
+
+
+async def release_attachment(db: AsyncIOMotorDatabase, organization_id: str, file_id: str, count: int = 1) -> bool:
+    """Drop references to a stored attachment; returns True if the file was deleted"""
+    fs = AsyncIOMotorGridFSBucket(db)
+
+    blob = await db.attachment_blobs.find_one_and_update(
+        {"organization_id": organization_id, "file_id": file_id},
+        {"$inc": {"ref_count": -count}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+
+    if blob is None:
+        # Stored before content addressing: the file has a single owner
+        try:
+            await fs.delete(ObjectId(file_id))
+            return True
+        except (InvalidId, NoFile):
+            return False
+
+    if blob["ref_count"] > 0:
+        return False
+
+    # Only delete if no upload re-referenced the blob in the meantime
+    result = await db.attachment_blobs.delete_one(
+        {"organization_id": organization_id, "file_id": file_id, "ref_count": {"$lte": 0}}
+    )
+    if not result.deleted_count:
+        return False
+
+    try:
+        await fs.delete(ObjectId(file_id))
+    except NoFile:
+        logger.warning(f"Attachment blob {file_id} had no GridFS file")
+    return True
+
+
+async def storage_stats(db: AsyncIOMotorDatabase, organization_id: str) -> Dict[str, Any]:
+    """Stored vs. referenced bytes for an organization's attachments"""
+    pipeline = [
+        {"$match": {"organization_id": organization_id}},
+        {"$group": {
+            "_id": None,
+            "blobs": {"$sum": 1},
+            "references": {"$sum": "$ref_count"},
+            "stored_bytes": {"$sum": "$size"},
+            "referenced_bytes": {"$sum": {"$multiply": ["$size", "$ref_count"]}}
+        }}
+    ]
+    result = await db.attachment_blobs.aggregate(pipeline).to_list(1)
+    stats = result[0] if result else {"blobs": 0, "references": 0, "stored_bytes": 0, "referenced_bytes": 0}
+    stats.pop("_id", None)
+    stats["saved_bytes"] = stats["referenced_bytes"] - stats["stored_bytes"]
+    return stats
@@ -0,0 +1,149 @@
+"""
+Attachment Index - One document per attachment across all resources
+
+Resources keep their embedded `attachments` arrays (the per-resource
+endpoints read them), and every upload/delete also maintains a row in the
+`attachments` collection:
+
+    id, organization_id, file_id, filename, file_size, content_type, sha256,
+    resource_type, resource_id, resource_name, uploaded_by,
+    uploaded_by_name, uploaded_at, created_at
+
+so organization-wide listing, filtering and paging is a single indexed
+query. Pages are ordered newest first by (created_at, id) and continued
+with an opaque cursor. Listed rows keep the embedded attachment's shape
+(id = file id, size); the row's own id is returned as entry_id.
+
+Attachments uploaded before the index existed are added by
+migrate_attachments_index.py.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from fastapi import HTTPException, status
+from typing import Optional, Dict, Any, List, Tuple
+import base64
+import re
+import uuid
+
+# Resource type -> collection holding its embedded attachments
+RESOURCE_COLLECTIONS = {
+    "task": "tasks",
+    "inspection": "inspection_executions",
+    "checklist": "checklist_executions",
+}
+
+
+def resource_name(resource: Dict[str, Any]) -> str:
+    return resource.get("title") or resource.get("name") or resource.get("template_name") or "Unnamed"
+
+
+def build_entry(
+    organization_id: str,
+    resource_type: str,
+    resource: Dict[str, Any],
+    attachment: Dict[str, Any]
+) -> Dict[str, Any]:
+    """Index row for an attachment embedded in a resource"""
+    return {
+        "id": str(uuid.uuid4()),
+        "organization_id": organization_id,
+        "file_id": attachment["id"],
+        "filename": attachment.get("filename"),
+        "file_size": attachment.get("size", 0),
+        "content_type": attachment.get("content_type"),
+        "sha256": attachment.get("sha256"),
+        "resource_type": resource_type,
+        "resource_id": resource["id"],
+        "resource_name": resource_name(resource),
+        "uploaded_by": attachment.get("uploaded_by"),
+        "uploaded_by_name": attachment.get("uploaded_by_name"),
+        "uploaded_at": attachment.get("uploaded_at"),
+        "created_at": attachment.get("uploaded_at"),
+    }
+
+
+def to_response(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """An index row in the shape the attachment list has always returned
+
+    id is the file id (what download and delete take) and size the byte
+    count, as on the embedded attachment; the row's own id is entry_id.
+    """
+    response = {key: value for key, value in entry.items() if key not in ("id", "file_size")}
+    response["id"] = entry["file_id"]
+    response["size"] = entry.get("file_size", 0)
+    response["entry_id"] = entry["id"]
+    return response
+
+
+async def add_entry(
+    db: AsyncIOMotorDatabase,
+    organization_id: str,
+    resource_type: str,
+    resource: Dict[str, Any],
+    attachment: Dict[str, Any]
+):
+    await db.attachments.insert_one(build_entry(organization_id, resource_type, resource, attachment))
+
+
+async def remove_entries(db: AsyncIOMotorDatabase, organization_id: str, resource_type: str, resource_id: str, file_id: str) -> int:
+    """Drop a resource's index rows for a file; returns how many were removed"""
+    result = await db.attachments.delete_many({
+        "organization_id": organization_id,
+        "resource_type": resource_type,
+        "resource_id": resource_id,
+        "file_id": file_id
+    })
+    return result.deleted_count
+
+
+def encode_cursor(entry: Dict[str, Any]) -> str:
+    raw = f"{entry['created_at']}|{entry['id']}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, entry_id = raw.rsplit("|", 1)
+        return created_at, entry_id
+    except (ValueError, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+async def list_entries(
+    db: AsyncIOMotorDatabase,
+    organization_id: str,
+    limit: int,
+    cursor: Optional[str] = None,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
+    content_type: Optional[str] = None,
+    uploaded_by: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page of attachments, newest first; returns (entries, next_cursor)"""
+    query: Dict[str, Any] = {"organization_id": organization_id}
+    if resource_type:
+        query["resource_type"] = resource_type
+    if resource_id:
+        query["resource_id"] = resource_id
+    if content_type:
+        # "image/" matches every image type; anything else matches exactly
+        query["content_type"] = {"$regex": f"^{re.escape(content_type)}"} if content_type.endswith("/") else content_type
+    if uploaded_by:
+        query["uploaded_by"] = uploaded_by
+
+    if cursor:
+        created_at, entry_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "id": {"$lt": entry_id}}
+        ]
+
+    entries = await db.attachments.find(
+        query, {"_id": 0}
+    ).sort([("created_at", -1), ("id", -1)]).limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = encode_cursor(entries[limit - 1]) if len(entries) > limit else None
+    return [to_response(entry) for entry in entries[:limit]], next_cursor
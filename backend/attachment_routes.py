@@ -1,11 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request, UploadFile, File
-from fastapi.responses import StreamingResponse
-from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Depends, Request, Response, UploadFile, File
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import List, Optional
 from datetime import datetime, timezone
 from .auth_utils import get_current_user
+from .gridfs_streaming import open_grid_file, stream_response
+from .attachment_blobs import store_attachment, release_attachment, storage_stats
+from .attachment_index import RESOURCE_COLLECTIONS, list_entries, add_entry, remove_entries
 import uuid
-import io
 
 router = APIRouter(prefix="/attachments", tags=["Attachments"])
 
@@ -24,47 +25,52 @@ MAX_FILE_SIZE = 100 * 1024 * 1024
 @router.get("")
 async def list_all_attachments(
     request: Request,
+    response: Response,
     resource_type: str = None,
+    resource_id: str = None,
+    content_type: str = None,
+    uploaded_by: str = None,
+    cursor: str = None,
     limit: int = 50,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """List all attachments for the organization, optionally filtered by resource type"""
+    """List attachments for the organization, newest first
+
+    Filter by resource_type (and resource_id), content_type ("image/" for
+    every image type) or uploaded_by. When more results exist, the
+    X-Next-Cursor response header holds the cursor for the next page.
+    """
     user = await get_current_user(request, db)
     
-    # Build query
-    query = {}
-    
-    # Get all resources for this organization and extract their attachments
-    resources_to_check = ["tasks", "inspections", "checklists", "assets", "work_orders", "projects"]
-    
-    if resource_type:
-        resources_to_check = [resource_type + "s" if not resource_type.endswith("s") else resource_type]
-    
-    all_attachments = []
-    
-    for collection_name in resources_to_check:
-        if collection_name in dir(db):
-            collection = getattr(db, collection_name)
-            resources = await collection.find(
-                {"organization_id": user["organization_id"]},
-                {"_id": 0, "id": 1, "attachments": 1, "title": 1, "name": 1}
-            ).to_list(1000)
-            
-            for resource in resources:
-                attachments = resource.get("attachments", [])
-                for att in attachments:
-                    att["resource_type"] = collection_name.rstrip("s")
-                    att["resource_id"] = resource.get("id")
-                    att["resource_name"] = resource.get("title") or resource.get("name") or "Unnamed"
-                    all_attachments.append(att)
-    
-    # Sort by created_at descending
-    all_attachments.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+    limit = max(1, min(limit, 200))
+    if resource_type and resource_type.endswith("s"):
+        resource_type = resource_type[:-1]
+    
+    attachments, next_cursor = await list_entries(
+        db,
+        user["organization_id"],
+        limit,
+        cursor=cursor,
+        resource_type=resource_type,
+        resource_id=resource_id,
+        content_type=content_type,
+        uploaded_by=uploaded_by
+    )
     
-    # Limit results
-    return all_attachments[:limit]
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return attachments
 
 
+@router.get("/storage-stats")
+async def get_attachment_storage_stats(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Attachment storage for the organization, including bytes saved by deduplication"""
+    user = await get_current_user(request, db)
+    return await storage_stats(db, user["organization_id"])
+
 
 @router.post("/{resource_type}/{resource_id}/upload")
 async def upload_attachment(
@@ -74,7 +80,7 @@ async def upload_attachment(
     request: Request = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Upload file attachment"""
+    """Upload file attachment (identical content is stored once per organization)"""
     user = await get_current_user(request, db)
     
     # Validate resource type
@@ -85,12 +91,7 @@ async def upload_attachment(
         )
     
     # Get collection based on resource type
-    collection_map = {
-        "task": "tasks",
-        "inspection": "inspection_executions",
-        "checklist": "checklist_executions"
-    }
-    collection = db[collection_map[resource_type]]
+    collection = db[RESOURCE_COLLECTIONS[resource_type]]
     
     # Verify resource exists and user has access
     resource = await collection.find_one(
@@ -103,42 +104,34 @@ async def upload_attachment(
             detail=f"{resource_type.capitalize()} not found"
         )
     
-    # Read file content
-    content = await file.read()
-    
-    # Check file size
-    if len(content) > MAX_FILE_SIZE:
-        raise HTTPException(
-            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-            detail=f"File too large. Maximum size is {MAX_FILE_SIZE / (1024*1024)}MB"
-        )
-    
-    # Store file in GridFS
-    fs = AsyncIOMotorGridFSBucket(db)
-    file_id = await fs.upload_from_stream(
-        file.filename,
-        content,
+    # Reuse identical content already stored for the organization; otherwise
+    # stream the file into GridFS chunk by chunk
+    uploaded_at = datetime.now(timezone.utc).isoformat()
+    file_id, size, sha256, deduplicated = await store_attachment(
+        db,
+        file,
+        user["organization_id"],
         metadata={
             "resource_type": resource_type,
             "resource_id": resource_id,
-            "organization_id": user["organization_id"],
             "uploaded_by": user["id"],
             "uploaded_by_name": user["name"],
             "content_type": file.content_type,
-            "size": len(content),
-            "uploaded_at": datetime.now(timezone.utc).isoformat()
-        }
+            "uploaded_at": uploaded_at
+        },
+        max_size=MAX_FILE_SIZE
     )
     
     # Create attachment record
     attachment = {
-        "id": str(file_id),
+        "id": file_id,
         "filename": file.filename,
         "content_type": file.content_type,
-        "size": len(content),
+        "size": size,
+        "sha256": sha256,
         "uploaded_by": user["id"],
         "uploaded_by_name": user["name"],
-        "uploaded_at": datetime.now(timezone.utc).isoformat()
+        "uploaded_at": uploaded_at
     }
     
     # Add attachment to resource
@@ -149,6 +142,7 @@ async def upload_attachment(
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    await add_entry(db, user["organization_id"], resource_type, resource, attachment)
     
     # Log audit event
     await db.audit_logs.insert_one({
@@ -164,7 +158,8 @@ async def upload_attachment(
         "timestamp": datetime.now(timezone.utc).isoformat(),
         "context": {
             "filename": file.filename,
-            "size": len(content)
+            "size": size,
+            "deduplicated": deduplicated
         }
     })
     
@@ -192,12 +187,7 @@ async def get_attachments(
         )
     
     # Get collection
-    collection_map = {
-        "task": "tasks",
-        "inspection": "inspection_executions",
-        "checklist": "checklist_executions"
-    }
-    collection = db[collection_map[resource_type]]
+    collection = db[RESOURCE_COLLECTIONS[resource_type]]
     
     # Get resource
     resource = await collection.find_one(
@@ -217,43 +207,52 @@ async def get_attachments(
 async def download_attachment(
     file_id: str,
     request: Request,
+    resource_type: Optional[str] = None,
+    resource_id: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Download attachment file"""
+    """Download attachment file (streamed; supports Range requests)
+
+    Deduplicated uploads share one GridFS file, so the filename and content
+    type come from the attachment record: the one on the given resource,
+    else the caller's own upload of the file, else the first upload.
+    """
     user = await get_current_user(request, db)
     
-    try:
-        from bson import ObjectId
-        fs = AsyncIOMotorGridFSBucket(db)
-        
-        # Get file metadata
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-        metadata = grid_out.metadata
-        
-        # Verify access
-        if metadata.get("organization_id") != user["organization_id"]:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="Access denied"
-            )
-        
-        # Read file content
-        content = await grid_out.read()
-        
-        # Return file as streaming response
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type=metadata.get("content_type", "application/octet-stream"),
-            headers={
-                "Content-Disposition": f"attachment; filename=\"{grid_out.filename}\""
-            }
-        )
-        
-    except Exception as e:
+    grid_out = await open_grid_file(db, file_id)
+    if not grid_out:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="File not found"
         )
+    
+    metadata = grid_out.metadata or {}
+    
+    # Verify access
+    if metadata.get("organization_id") != user["organization_id"]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Access denied"
+        )
+    
+    query = {"organization_id": user["organization_id"], "file_id": file_id}
+    if resource_type and resource_id:
+        query.update({"resource_type": resource_type, "resource_id": resource_id})
+    entries = await db.attachments.find(
+        query,
+        {"_id": 0, "filename": 1, "content_type": 1, "uploaded_by": 1}
+    ).sort("created_at", 1).to_list(100)
+    entry = next((e for e in entries if e.get("uploaded_by") == user["id"]), entries[0] if entries else {})
+    
+    filename = entry.get("filename") or grid_out.filename
+    content_type = entry.get("content_type") or metadata.get("content_type") or "application/octet-stream"
+    
+    return stream_response(
+        grid_out,
+        request.headers.get("range"),
+        media_type=content_type,
+        headers={"Content-Disposition": f"attachment; filename=\"{filename}\""}
+    )
 
 
 @router.delete("/{resource_type}/{resource_id}/attachments/{file_id}")
@@ -275,12 +274,7 @@ async def delete_attachment(
         )
     
     # Get collection
-    collection_map = {
-        "task": "tasks",
-        "inspection": "inspection_executions",
-        "checklist": "checklist_executions"
-    }
-    collection = db[collection_map[resource_type]]
+    collection = db[RESOURCE_COLLECTIONS[resource_type]]
     
     # Get resource
     resource = await collection.find_one(
@@ -294,6 +288,7 @@ async def delete_attachment(
         )
     
     # Remove attachment from resource
+    references = sum(1 for att in resource.get("attachments", []) if att.get("id") == file_id)
     await collection.update_one(
         {"id": resource_id},
         {
@@ -301,14 +296,12 @@ async def delete_attachment(
             "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
         }
     )
+    await remove_entries(db, user["organization_id"], resource_type, resource_id, file_id)
     
-    # Delete file from GridFS
-    try:
-        from bson import ObjectId
-        fs = AsyncIOMotorGridFSBucket(db)
-        await fs.delete(ObjectId(file_id))
-    except:
-        pass  # File might not exist in GridFS
+    # Drop this resource's references; the file is deleted from GridFS once
+    # nothing else in the organization points at it
+    if references:
+        await release_attachment(db, user["organization_id"], file_id, count=references)
     
     # Log audit event
     await db.audit_logs.insert_one({
@@ -14,7 +14,7 @@ from .auth_utils import (
     validate_password_strength
 )
 from .sanitization import sanitize_dict
-from .email_service import EmailService
+from .email_outbox import outbox as email_outbox
 from .init_phase1_data import initialize_permissions, initialize_system_roles
 from .auth_constants import (
     MSG_REGISTRATION_PENDING,
@@ -108,8 +108,6 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
     
     # Send "Registration Pending" email to user
     try:
-        from .email_service import EmailService
-        
         # Get organization email settings (may not exist yet for new org)
         org_settings = await db.organization_settings.find_one(
             {"organization_id": organization_id}
@@ -125,12 +123,6 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
             sendgrid_key = os.environ.get("SENDGRID_API_KEY")
         
         if sendgrid_key:
-            email_service = EmailService(
-                api_key=sendgrid_key,
-                from_email="noreply@opsplatform.com",
-                from_name="Operations Platform"
-            )
-            
             html_content = f"""
             <!DOCTYPE html>
             <html>
@@ -181,16 +173,19 @@ async def register(user_data: UserCreate, db: AsyncIOMotorDatabase = Depends(get
             </html>
             """
             
-            success = email_service.send_email(
-                to_email=user_data.email,
+            success = await email_outbox.enqueue(
+                db,
+                to_emails=[user_data.email],
                 subject="Welcome to Operations Platform! 🚀",
-                html_content=html_content
-            )
+                html_content=html_content,
+                organization_id=organization_id,
+                email_type="registration"
+            ) is not None
             
             if success:
-                print(f"✅ Registration pending email sent to {user_data.email}")
+                print(f"✅ Registration pending email queued for {user_data.email}")
             else:
-                print(f"⚠️ Failed to send registration pending email to {user_data.email}")
+                print(f"⚠️ Failed to queue registration pending email for {user_data.email}")
         else:
             print(f"⚠️ No SendGrid API key configured - cannot send registration email")
             
@@ -700,7 +695,6 @@ async def forgot_password(
     
     # Send email with reset link
     try:
-        from .email_service import EmailService
         import os
         
         # Get frontend URL from environment or construct from backend URL
@@ -722,12 +716,6 @@ async def forgot_password(
         )
         
         if org_settings and org_settings.get("sendgrid_api_key"):
-            email_service = EmailService(
-                api_key=org_settings["sendgrid_api_key"],
-                from_email=org_settings.get("sendgrid_from_email", "noreply@opsplatform.com"),
-                from_name=org_settings.get("sendgrid_from_name", "Operations Platform")
-            )
-            
             # Send password reset email
             html_content = f"""
             <!DOCTYPE html>
@@ -772,16 +760,19 @@ async def forgot_password(
             </html>
             """
             
-            success = email_service.send_email(
-                to_email=user["email"],
+            success = await email_outbox.enqueue(
+                db,
+                to_emails=[user["email"]],
                 subject="Password Reset Request - Operations Platform",
-                html_content=html_content
-            )
+                html_content=html_content,
+                organization_id=user.get("organization_id"),
+                email_type="password_reset"
+            ) is not None
             
             if success:
-                print(f"✅ Password reset email sent successfully to {user['email']}")
+                print(f"✅ Password reset email queued for {user['email']}")
             else:
-                print(f"⚠️ Failed to send password reset email to {user['email']}")
+                print(f"⚠️ Failed to queue password reset email for {user['email']}")
                 
     except Exception as e:
         # Log error but don't fail the request
@@ -865,19 +856,12 @@ async def reset_password(
     
     # Send confirmation email
     try:
-        from .email_service import EmailService
         
         org_settings = await db.organization_settings.find_one(
             {"organization_id": user.get("organization_id")}
         )
         
         if org_settings and org_settings.get("sendgrid_api_key"):
-            email_service = EmailService(
-                api_key=org_settings["sendgrid_api_key"],
-                from_email=org_settings.get("sendgrid_from_email", "noreply@opsplatform.com"),
-                from_name=org_settings.get("sendgrid_from_name", "Operations Platform")
-            )
-            
             html_content = f"""
             <!DOCTYPE html>
             <html>
@@ -916,16 +900,19 @@ async def reset_password(
             </html>
             """
             
-            success = email_service.send_email(
-                to_email=user["email"],
+            success = await email_outbox.enqueue(
+                db,
+                to_emails=[user["email"]],
                 subject="Password Changed Successfully - Operations Platform",
-                html_content=html_content
-            )
+                html_content=html_content,
+                organization_id=user.get("organization_id"),
+                email_type="password_changed"
+            ) is not None
             
             if success:
-                print(f"✅ Password change confirmation email sent to {user['email']}")
+                print(f"✅ Password change confirmation email queued for {user['email']}")
             else:
-                print(f"⚠️ Failed to send password change confirmation to {user['email']}")
+                print(f"⚠️ Failed to queue password change confirmation for {user['email']}")
                 
     except Exception as e:
         print(f"❌ Exception while sending password confirmation email: {str(e)}")
@@ -1,11 +1,11 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request, UploadFile, File
+from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from typing import List, Dict
-from datetime import datetime, timezone, timedelta
-from .auth_utils import get_current_user, get_password_hash
-import csv
-import io
-import uuid
+from .auth_utils import get_current_user
+from .user_import import (
+    importer as user_importer, ImportContext, iter_user_rows, USER_IMPORT_BATCH_SIZE
+)
+from .import_files import ImportFileError
 
 router = APIRouter(prefix="/bulk-import", tags=["Bulk Import"])
 
@@ -17,52 +17,11 @@ def get_db(request: Request) -> AsyncIOMotorDatabase:
 
 # ==================== HELPER FUNCTIONS ====================
 
-def validate_csv_row(row: dict, row_number: int) -> tuple:
-    """Validate a single CSV row"""
-    errors = []
-    
-    # Required fields
-    if not row.get("email"):
-        errors.append(f"Row {row_number}: Email is required")
-    if not row.get("name"):
-        errors.append(f"Row {row_number}: Name is required")
-    
-    # Email format validation (basic)
-    email = row.get("email", "")
-    if email and "@" not in email:
-        errors.append(f"Row {row_number}: Invalid email format")
-    
-    # Role validation
-    valid_roles = ["viewer", "operator", "inspector", "supervisor", "manager", "team_lead", "operations_manager", "admin", "master", "developer"]
-    role = row.get("role", "viewer").lower()
-    if role and role not in valid_roles:
-        errors.append(f"Row {row_number}: Invalid role. Must be one of: {', '.join(valid_roles)}")
-    
-    return (len(errors) == 0, errors)
-
-
-def parse_csv_file(file_content: str) -> tuple:
-    """Parse CSV file content"""
-    try:
-        csv_reader = csv.DictReader(io.StringIO(file_content))
-        rows = list(csv_reader)
-        return (True, rows, None)
-    except Exception as e:
-        return (False, [], str(e))
+JOB_PROJECTION = {"_id": 0, "locked_by": 0, "locked_until": 0, "creator_level": 0}
 
 
-# ==================== ENDPOINTS ====================
-
-@router.post("/validate")
-async def validate_bulk_import(
-    file: UploadFile = File(...),
-    request: Request = None,
-    db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    """Validate CSV file for bulk user import - Requires user.create.organization permission"""
-    user = await get_current_user(request, db)
-    
-    # Check permission (not hardcoded role)
+async def require_import_permission(db: AsyncIOMotorDatabase, user: dict):
+    """Importing users requires user.create.organization permission (not a hardcoded role)"""
     from .permission_routes import check_permission
     has_permission = await check_permission(
         db,
@@ -77,294 +36,196 @@ async def validate_bulk_import(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="You don't have permission to import users"
         )
-    
-    # Validate file type
+
+
+def require_csv(file: UploadFile):
     if not file.filename.endswith('.csv'):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Only CSV files are supported"
         )
-    
-    # Read file content
-    content = await file.read()
-    file_content = content.decode('utf-8')
-    
-    # Parse CSV
-    success, rows, error = parse_csv_file(file_content)
-    
-    if not success:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to parse CSV: {error}"
-        )
-    
-    # Get current user's role level for hierarchy check
+
+
+async def get_role_level(db: AsyncIOMotorDatabase, user: dict) -> int:
+    """Current user's role level for the hierarchy check (lower is more authority)"""
     current_user_role = await db.roles.find_one({
         "code": user.get("role"),
         "organization_id": user["organization_id"]
     })
-    current_level = current_user_role.get("level", 999) if current_user_role else 999
+    return current_user_role.get("level", 999) if current_user_role else 999
+
+
+# ==================== ENDPOINTS ====================
+
+@router.post("/validate")
+async def validate_bulk_import(
+    file: UploadFile = File(...),
+    request: Request = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Validate CSV file for bulk user import - Requires user.create.organization permission"""
+    user = await get_current_user(request, db)
+    await require_import_permission(db, user)
+    require_csv(file)
     
-    # Validate rows
+    context = ImportContext(db, user["organization_id"], await get_role_level(db, user))
+    
+    # Same streaming parse and batched lookups as the import job
+    total_count = 0
+    valid_count = 0
+    invalid_count = 0
+    duplicate_count = 0
     valid_rows = []
     invalid_rows = []
     duplicate_emails = []
     
-    for i, row in enumerate(rows, start=2):  # Start at 2 (1 is header)
-        is_valid, errors = validate_csv_row(row, i)
-        
-        # Additional role hierarchy check
-        role_code = row.get("role", "viewer").lower()
-        target_role = await db.roles.find_one({
-            "code": role_code,
-            "organization_id": user["organization_id"]
-        })
+    async def check(batch: list):
+        nonlocal valid_count, invalid_count, duplicate_count
+        accepted, rejected = await context.check_batch(batch)
+        valid_count += len(accepted)
+        invalid_count += len(rejected)
         
-        if target_role:
-            target_level = target_role.get("level", 999)
-            # Can only import users with equal or lower authority (higher level number)
-            if current_level > target_level:
-                errors.append(f"Cannot import {role_code} role (higher authority than your role)")
-                is_valid = False
-        
-        # Check if email already exists
-        email = row.get("email", "").lower().strip()
-        existing_user = await db.users.find_one({
-            "email": email,
-            "organization_id": user["organization_id"]
-        })
-        
-        if existing_user:
-            duplicate_emails.append({
-                "row": i,
-                "email": email,
-                "message": "Email already exists in organization"
-            })
-            invalid_rows.append({
-                "row": i,
-                "data": row,
-                "errors": ["Email already exists"]
-            })
-        elif is_valid:
-            valid_rows.append({
-                "row": i,
-                "email": email,
-                "name": row.get("name"),
-                "role": role_code,
-                "group": row.get("group", "")
-            })
-        else:
-            invalid_rows.append({
-                "row": i,
-                "data": row,
-                "errors": errors
-            })
+        for entry in accepted:
+            if len(valid_rows) < 10:
+                valid_rows.append({key: entry[key] for key in ("row", "email", "name", "role", "group")})
+        for entry in rejected:
+            if entry["duplicate"]:
+                duplicate_count += 1
+            if entry["duplicate"] and len(duplicate_emails) < 20:
+                duplicate_emails.append({
+                    "row": entry["row"],
+                    "email": entry["email"],
+                    "message": "Email already exists in organization"
+                })
+            if len(invalid_rows) < 20:
+                invalid_rows.append({"row": entry["row"], "data": entry["data"], "errors": entry["errors"]})
+    
+    batch = []
+    try:
+        async for row_number, row in iter_user_rows(file.read):
+            total_count += 1
+            batch.append((row_number, row))
+            if len(batch) >= USER_IMPORT_BATCH_SIZE:
+                await check(batch)
+                batch = []
+        if batch:
+            await check(batch)
+    except ImportFileError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Failed to parse CSV: {str(e)}"
+        )
     
     return {
-        "is_valid": len(invalid_rows) == 0,
-        "total_count": len(rows),
-        "valid_count": len(valid_rows),
-        "invalid_count": len(invalid_rows),
-        "duplicate_count": len(duplicate_emails),
-        "preview": valid_rows[:10],  # Show first 10
-        "errors": invalid_rows[:20],  # Show first 20 errors
-        "duplicates": duplicate_emails[:20]
+        "is_valid": invalid_count == 0,
+        "total_count": total_count,
+        "valid_count": valid_count,
+        "invalid_count": invalid_count,
+        "duplicate_count": duplicate_count,
+        "preview": valid_rows,  # Show first 10
+        "errors": invalid_rows,  # Show first 20 errors
+        "duplicates": duplicate_emails
     }
 
 
-@router.post("/users")
+@router.post("/users", status_code=status.HTTP_202_ACCEPTED)
 async def import_users(
     file: UploadFile = File(...),
     send_invitations: bool = True,
     request: Request = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Import users from CSV file - Requires user.create.organization permission"""
+    """Queue a CSV user import - Requires user.create.organization permission
+    
+    Poll GET /bulk-import/jobs/{job_id} for progress; rejected rows are
+    downloadable from GET /bulk-import/jobs/{job_id}/errors.
+    """
     user = await get_current_user(request, db)
+    await require_import_permission(db, user)
+    require_csv(file)
     
-    # Check permission (not hardcoded role)
-    from .permission_routes import check_permission
-    has_permission = await check_permission(
+    job = await user_importer.create_job(
         db,
-        user["id"],
-        "user",
-        "create",
-        "organization"
+        file,
+        user,
+        creator_level=await get_role_level(db, user),
+        send_invitations=send_invitations
     )
+    job.pop("creator_level", None)
     
-    if not has_permission:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="You don't have permission to import users"
-        )
+    return {"message": "Import queued", "job": job}
+
+
+@router.get("/jobs")
+async def list_import_jobs(
+    request: Request,
+    limit: int = 20,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """List recent user import jobs for the organization"""
+    user = await get_current_user(request, db)
+    await require_import_permission(db, user)
     
-    # Validate file type
-    if not file.filename.endswith('.csv'):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Only CSV files are supported"
-        )
+    jobs = await db.user_import_jobs.find(
+        {"organization_id": user["organization_id"]},
+        JOB_PROJECTION
+    ).sort("created_at", -1).limit(limit).to_list(limit)
     
-    # Read file content
-    content = await file.read()
-    file_content = content.decode('utf-8')
+    return jobs
+
+
+@router.get("/jobs/{job_id}")
+async def get_import_job(
+    job_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """User import job status and progress"""
+    user = await get_current_user(request, db)
+    await require_import_permission(db, user)
     
-    # Parse CSV
-    success, rows, error = parse_csv_file(file_content)
+    job = await db.user_import_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        JOB_PROJECTION
+    )
     
-    if not success:
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Failed to parse CSV: {error}"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
         )
     
-    # Get current user's role level for hierarchy check
-    current_user_role = await db.roles.find_one({
-        "code": user.get("role"),
-        "organization_id": user["organization_id"]
-    })
-    current_level = current_user_role.get("level", 999) if current_user_role else 999
-    
-    # Process rows
-    imported_users = []
-    failed_imports = []
+    job["progress"] = round(job["bytes_read"] / job["size"], 3) if job.get("size") else None
+    return job
+
+
+@router.get("/jobs/{job_id}/errors")
+async def download_import_errors(
+    job_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Download the rows an import rejected as CSV (row, email, errors)"""
+    user = await get_current_user(request, db)
+    await require_import_permission(db, user)
     
-    for i, row in enumerate(rows, start=2):
-        try:
-            # Validate row
-            is_valid, errors = validate_csv_row(row, i)
-            
-            if not is_valid:
-                failed_imports.append({
-                    "row": i,
-                    "email": row.get("email"),
-                    "errors": errors
-                })
-                continue
-            
-            # Role hierarchy check
-            role_code = row.get("role", "viewer").lower()
-            target_role = await db.roles.find_one({
-                "code": role_code,
-                "organization_id": user["organization_id"]
-            })
-            
-            if target_role:
-                target_level = target_role.get("level", 999)
-                if current_level > target_level:
-                    failed_imports.append({
-                        "row": i,
-                        "email": row.get("email"),
-                        "errors": [f"Cannot import {role_code} role (higher authority than your role)"]
-                    })
-                    continue
-            
-            email = row.get("email", "").lower().strip()
-            
-            # Check if email already exists
-            existing_user = await db.users.find_one({
-                "email": email,
-                "organization_id": user["organization_id"]
-            })
-            
-            if existing_user:
-                failed_imports.append({
-                    "row": i,
-                    "email": email,
-                    "errors": ["Email already exists"]
-                })
-                continue
-            
-            # Create user
-            new_user = {
-                "id": str(uuid.uuid4()),
-                "email": email,
-                "name": row.get("name", "").strip(),
-                "role": role_code,
-                "organization_id": user["organization_id"],
-                "auth_provider": "local",
-                "is_active": True,
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            
-            # Set default password if provided
-            if row.get("password"):
-                new_user["password_hash"] = get_password_hash(row["password"])
-            
-            await db.users.insert_one(new_user)
-            
-            # Add to group if specified
-            group_name = row.get("group", "").strip()
-            if group_name:
-                group = await db.user_groups.find_one({
-                    "organization_id": user["organization_id"],
-                    "name": group_name
-                })
-                if group:
-                    await db.user_groups.update_one(
-                        {"id": group["id"]},
-                        {"$addToSet": {"member_ids": new_user["id"]}}
-                    )
-            
-            imported_users.append({
-                "email": email,
-                "name": new_user["name"],
-                "role": new_user["role"]
-            })
-            
-            # Send invitation if requested
-            if send_invitations:
-                # Create invitation
-                invitation = {
-                    "id": str(uuid.uuid4()),
-                    "organization_id": user["organization_id"],
-                    "email": email,
-                    "role_id": new_user["role"],
-                    "invited_by": user["id"],
-                    "invited_by_name": user["name"],
-                    "status": "pending",
-                    "expires_at": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
-                    "created_at": datetime.now(timezone.utc).isoformat()
-                }
-                await db.invitations.insert_one(invitation)
-                
-                # TODO: Send invitation email
-        
-        except Exception as e:
-            failed_imports.append({
-                "row": i,
-                "email": row.get("email"),
-                "errors": [str(e)]
-            })
+    job = await db.user_import_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        {"_id": 0, "id": 1, "filename": 1}
+    )
     
-    # Log audit event
-    await db.audit_logs.insert_one({
-        "id": str(uuid.uuid4()),
-        "organization_id": user["organization_id"],
-        "user_id": user["id"],
-        "user_email": user["email"],
-        "user_name": user["name"],
-        "action": "users.bulk_imported",
-        "resource_type": "user",
-        "resource_id": "bulk",
-        "result": "success",
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "context": {
-            "total_rows": len(rows),
-            "imported": len(imported_users),
-            "failed": len(failed_imports),
-            "filename": file.filename
-        }
-    })
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Import job not found"
+        )
     
-    return {
-        "message": "Import completed",
-        "imported_count": len(imported_users),
-        "failed_count": len(failed_imports),
-        "imported_users": imported_users,
-        "failed_imports": failed_imports[:50]  # Limit to first 50 errors
-    }
+    stem = job["filename"].rsplit(".", 1)[0]
+    return StreamingResponse(
+        user_importer.iter_error_report(db, job_id),
+        media_type="text/csv",
+        headers={"Content-Disposition": f"attachment; filename=\"{stem}_errors.csv\""}
+    )
 
 
 @router.get("/users/template")
@@ -0,0 +1,23 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List, Dict, Any
+
+
+class BulkOperation(BaseModel):
+    """One queued client operation"""
+    type: str  # task.update, work_order.status, inventory.adjust
+    id: str  # Target task / work order / inventory item
+    data: Dict[str, Any] = {}
+    op_id: Optional[str] = None  # Client-generated; a replayed op_id returns the stored result
+
+
+class BulkRequest(BaseModel):
+    operations: List[BulkOperation] = Field(..., min_length=1, max_length=500)
+
+
+class WorkOrderStatusData(BaseModel):
+    status: str = Field(..., min_length=1)
+
+
+class StockAdjustmentData(BaseModel):
+    adjustment: float
+    reason: Optional[str] = None
@@ -0,0 +1,395 @@
+"""
+Bulk Routes - Replay a batch of typed operations in one request
+
+Offline mobile clients queue task updates, work order status changes and
+stock adjustments and sync them with a single POST /api/bulk:
+
+    {"operations": [
+        {"op_id": "c1", "type": "task.update", "id": "<task_id>", "data": {"status": "completed"}},
+        {"op_id": "c2", "type": "work_order.status", "id": "<wo_id>", "data": {"status": "in_progress"}},
+        {"op_id": "c3", "type": "inventory.adjust", "id": "<item_id>", "data": {"adjustment": -2}}
+    ]}
+
+Operations are validated with the same models and rules as the single
+endpoints (task_update_fields, status_change_fields), their targets are
+loaded with one `$in` query per collection, and the writes go out as one
+bulk_write per collection, in request order. The response has one result
+per operation, in request order, carrying the target's state afterwards.
+Stock adjustments use the same atomic update pipeline as
+/inventory/items/{item_id}/adjust and are written to the stock-movement
+ledger.
+
+Operations with an op_id are reserved in bulk_operation_results (unique on
+organization_id + op_id, ensured at startup and before the first batch)
+before anything is written. A reservation is a lease of
+BULK_RESERVATION_LEASE_MINUTES; it is filled in with the result afterwards
+and then kept for BULK_RESULT_TTL_DAYS. A batch re-sent after a lost
+response returns the stored results, and an overlapping retry of the same
+operation gets a 409 while the first attempt holds the reservation, so
+(for example) a stock adjustment is never applied twice. Reservations of
+operations that were not applied are released so they can be retried,
+also when the batch fails part way. Only if the process dies mid-batch
+does an operation answer 409 until its lease runs out.
+"""
+from fastapi import APIRouter, HTTPException, status, Depends, Request
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from pydantic import BaseModel, ValidationError
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Callable, Awaitable, Type
+import asyncio
+
+from .auth_utils import get_current_user
+from .bulk_models import BulkRequest, WorkOrderStatusData, StockAdjustmentData
+from .task_models import TaskUpdate
+from .task_routes import task_update_fields
+from .workorder_routes import status_change_fields
+from .inventory_stock import build_movement, record_movements, stock_update_pipeline
+
+router = APIRouter(prefix="/bulk", tags=["Bulk"])
+
+BULK_RESULT_TTL_DAYS = 7
+BULK_RESERVATION_LEASE_MINUTES = 5
+
+_indexes_ready = False
+
+
+def get_db(request: Request) -> AsyncIOMotorDatabase:
+    return request.app.state.db
+
+
+class BulkContext:
+    """Request-wide state shared by operation handlers"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, user: dict):
+        self.db = db
+        self.user = user
+        self.user_names: Dict[str, str] = {}
+
+
+# ==================== OPERATION HANDLERS ====================
+# Each returns the MongoDB update (document or pipeline) for its target, or None when there is nothing to write
+
+async def _task_update(ctx: BulkContext, task: dict, data: TaskUpdate) -> Optional[dict]:
+    update_data = await task_update_fields(
+        ctx.db, ctx.user, task, data.model_dump(exclude_unset=True), assignee_names=ctx.user_names
+    )
+    if not update_data:
+        return None
+    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
+    return {"$set": update_data}
+
+
+async def _work_order_status(ctx: BulkContext, work_order: dict, data: WorkOrderStatusData) -> Optional[dict]:
+    started = work_order.get("actual_start") is not None
+    return {"$set": status_change_fields(data.status, ctx.user, started)}
+
+
+async def _inventory_adjust(ctx: BulkContext, item: dict, data: StockAdjustmentData) -> Optional[list]:
+    return stock_update_pipeline(data.adjustment, datetime.now(timezone.utc).isoformat())
+
+
+def _inventory_movement(ctx: BulkContext, item: dict, data: StockAdjustmentData) -> dict:
+    return build_movement(item, data.adjustment, "adjustment", ctx.user["id"], reason=data.reason)
+
+
+class OperationType:
+    def __init__(
+        self,
+        collection: str,
+        model: Type[BaseModel],
+        handler: Callable[[BulkContext, dict, Any], Awaitable[Any]],
+        not_found: str,
+        ledger: Optional[Callable[[BulkContext, dict, Any], dict]] = None
+    ):
+        self.collection = collection
+        self.model = model
+        self.handler = handler
+        self.not_found = not_found
+        self.ledger = ledger  # Builds the stock movement for an applied operation
+
+
+OPERATION_TYPES = {
+    "task.update": OperationType("tasks", TaskUpdate, _task_update, "Task not found"),
+    "work_order.status": OperationType("work_orders", WorkOrderStatusData, _work_order_status, "Work order not found"),
+    "inventory.adjust": OperationType(
+        "inventory_items", StockAdjustmentData, _inventory_adjust, "Item not found", ledger=_inventory_movement
+    ),
+}
+
+
+def _apply_to_snapshot(document: dict, update):
+    """Reflect an update in the loaded target so later operations on it see the change"""
+    if isinstance(update, list):
+        return  # Pipelines derive fields on the server; nothing later depends on them
+    document.update(update.get("$set", {}))
+    for field, amount in update.get("$inc", {}).items():
+        document[field] = (document.get(field) or 0) + amount
+
+
+def _error(index: int, op, status_code: int, detail: str) -> dict:
+    return {
+        "index": index,
+        "op_id": op.op_id,
+        "type": op.type,
+        "id": op.id,
+        "ok": False,
+        "status_code": status_code,
+        "error": detail
+    }
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase):
+    """Create the indexes reservations depend on (idempotent); called at startup"""
+    global _indexes_ready
+    await db.bulk_operation_results.create_index([("organization_id", 1), ("op_id", 1)], unique=True)
+    await db.bulk_operation_results.create_index([("expires_at", 1)], expireAfterSeconds=0)
+    _indexes_ready = True
+
+
+async def _reserve(db: AsyncIOMotorDatabase, organization_id: str, user_id: str, op_ids: List[str]) -> set:
+    """Insert a placeholder per op_id; returns the op_ids this request now owns"""
+    if not _indexes_ready:
+        # Without the unique index a reservation guarantees nothing: fail closed
+        try:
+            await ensure_indexes(db)
+        except Exception:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Bulk operations are temporarily unavailable. Please retry shortly.",
+                headers={"Retry-After": "30"}
+            )
+    expires_at = datetime.now(timezone.utc) + timedelta(minutes=BULK_RESERVATION_LEASE_MINUTES)
+    placeholders = [
+        {
+            "organization_id": organization_id,
+            "op_id": op_id,
+            "result": None,
+            "created_by": user_id,
+            "expires_at": expires_at
+        }
+        for op_id in op_ids
+    ]
+    try:
+        await db.bulk_operation_results.insert_many(placeholders, ordered=False)
+        return set(op_ids)
+    except BulkWriteError as e:
+        taken = {op_ids[err["index"]] for err in e.details.get("writeErrors", [])}
+        return set(op_ids) - taken
+
+
+async def _load_recorded(
+    db: AsyncIOMotorDatabase,
+    organization_id: str,
+    op_ids: List[str],
+    operations: list,
+    positions: Dict[str, int],
+    results: List[Optional[dict]]
+):
+    """Fill in results for op_ids already recorded: the stored result, or 409 while another request holds them"""
+    async for stored in db.bulk_operation_results.find(
+        {"organization_id": organization_id, "op_id": {"$in": op_ids}},
+        {"_id": 0, "op_id": 1, "result": 1}
+    ):
+        index = positions[stored["op_id"]]
+        if stored.get("result"):
+            results[index] = {**stored["result"], "index": index, "replayed": True}
+        else:
+            results[index] = _error(
+                index, operations[index], 409, "Operation is already being applied by another request"
+            )
+
+
+async def _record_results(db: AsyncIOMotorDatabase, organization_id: str, results: List[dict]):
+    """Fill reservations in with their results and keep them for BULK_RESULT_TTL_DAYS"""
+    expires_at = datetime.now(timezone.utc) + timedelta(days=BULK_RESULT_TTL_DAYS)
+    await db.bulk_operation_results.bulk_write([
+        UpdateOne(
+            {"organization_id": organization_id, "op_id": result["op_id"]},
+            {"$set": {"result": result, "expires_at": expires_at}}
+        )
+        for result in results
+    ], ordered=False)
+
+
+# ==================== ENDPOINT ====================
+
+@router.post("")
+async def run_bulk_operations(
+    bulk_data: BulkRequest,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Apply a batch of task, work order and inventory operations; one result per operation"""
+    user = await get_current_user(request, db)
+    org_id = user["organization_id"]
+    operations = bulk_data.operations
+    results: List[Optional[dict]] = [None] * len(operations)
+
+    # Operations already applied by an earlier attempt of this batch
+    op_ids = [op.op_id for op in operations if op.op_id]
+    if len(set(op_ids)) != len(op_ids):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="op_id values must be unique")
+    positions = {op.op_id: index for index, op in enumerate(operations) if op.op_id}
+    if op_ids:
+        await _load_recorded(db, org_id, op_ids, operations, positions, results)
+
+    # Validate payloads
+    pending = []
+    for index, op in enumerate(operations):
+        if results[index]:
+            continue
+        op_type = OPERATION_TYPES.get(op.type)
+        if not op_type:
+            results[index] = _error(index, op, 400, f"Unknown operation type. Must be one of: {', '.join(OPERATION_TYPES)}")
+            continue
+        try:
+            pending.append((index, op, op_type, op_type.model.model_validate(op.data)))
+        except ValidationError as e:
+            results[index] = _error(index, op, 422, "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" for err in e.errors()
+            ))
+
+    # Reserve op_ids before writing anything: an overlapping retry of the same
+    # operation loses the insert on the unique index and is not applied again
+    reserved = set()
+    to_reserve = [op.op_id for _, op, _, _ in pending if op.op_id]
+    if to_reserve:
+        reserved = await _reserve(db, org_id, user["id"], to_reserve)
+        lost = [op_id for op_id in to_reserve if op_id not in reserved]
+        if lost:
+            await _load_recorded(db, org_id, lost, operations, positions, results)
+            for op_id in lost:
+                index = positions[op_id]
+                if not results[index]:  # Released by the other request in the meantime
+                    results[index] = _error(
+                        index, operations[index], 409, "Operation is already being applied by another request"
+                    )
+        pending = [entry for entry in pending if not results[entry[0]]]
+
+    # From here on, an error must not strand reservations: release every
+    # reserved operation that was not written, and record those that were
+    written: set = set()
+    try:
+        # Load every target with one query per collection
+        ids_by_collection: Dict[str, set] = {}
+        for _, op, op_type, _ in pending:
+            ids_by_collection.setdefault(op_type.collection, set()).add(op.id)
+        targets: Dict[str, Dict[str, dict]] = {}
+        for collection, ids in ids_by_collection.items():
+            documents = await db[collection].find(
+                {"id": {"$in": list(ids)}, "organization_id": org_id},
+                {"_id": 0}
+            ).to_list(None)
+            targets[collection] = {document["id"]: document for document in documents}
+
+        ctx = BulkContext(db, user)
+        assignees = {
+            data.assigned_to for _, op, _, data in pending
+            if op.type == "task.update" and data.assigned_to
+        }
+        if assignees:
+            async for assignee in db.users.find({"id": {"$in": list(assignees)}}, {"_id": 0, "id": 1, "name": 1}):
+                ctx.user_names[assignee["id"]] = assignee.get("name")
+
+        # Build the writes in request order
+        writes: Dict[str, List[tuple]] = {}
+        unchanged = []
+        for index, op, op_type, data in pending:
+            target = targets.get(op_type.collection, {}).get(op.id)
+            if not target:
+                results[index] = _error(index, op, 404, op_type.not_found)
+                continue
+            try:
+                update = await op_type.handler(ctx, target, data)
+            except HTTPException as e:
+                results[index] = _error(index, op, e.status_code, e.detail)
+                continue
+            if not update:
+                unchanged.append((index, op, op_type))
+                continue
+            movement = op_type.ledger(ctx, target, data) if op_type.ledger else None
+            _apply_to_snapshot(target, update)
+            writes.setdefault(op_type.collection, []).append(
+                (index, op, op_type, UpdateOne({"id": op.id, "organization_id": org_id}, update), movement)
+            )
+
+        async def execute(collection: str, entries: List[tuple]) -> List[tuple]:
+            """One bulk_write; returns the entries that were applied"""
+            try:
+                await db[collection].bulk_write([entry[3] for entry in entries], ordered=True)
+                written.update(op.op_id for _, op, _, _, _ in entries if op.op_id)
+                return entries
+            except BulkWriteError as e:
+                failed = {err["index"]: err.get("errmsg", "Write failed") for err in e.details.get("writeErrors", [])}
+                first_failure = min(failed) if failed else len(entries)
+                for position, (index, op, _, _, _) in enumerate(entries):
+                    if position in failed:
+                        results[index] = _error(index, op, 500, failed[position])
+                    elif position > first_failure:
+                        results[index] = _error(index, op, 409, "Not applied: an earlier operation on this collection failed")
+                written.update(op.op_id for _, op, _, _, _ in entries[:first_failure] if op.op_id)
+                return entries[:first_failure]
+
+        applied = await asyncio.gather(*(execute(collection, entries) for collection, entries in writes.items()))
+        succeeded = [(index, op, op_type) for entries in applied for index, op, op_type, _, _ in entries] + unchanged
+        await record_movements(db, [movement for entries in applied for *_, movement in entries if movement])
+
+        # Current state of every target that changed, one query per collection
+        changed_ids: Dict[str, set] = {}
+        for _, op, op_type in succeeded:
+            changed_ids.setdefault(op_type.collection, set()).add(op.id)
+        final: Dict[str, Dict[str, dict]] = {}
+        for collection, ids in changed_ids.items():
+            documents = await db[collection].find(
+                {"id": {"$in": list(ids)}, "organization_id": org_id},
+                {"_id": 0}
+            ).to_list(None)
+            final[collection] = {document["id"]: document for document in documents}
+
+        records = []
+        for index, op, op_type in succeeded:
+            results[index] = {
+                "index": index,
+                "op_id": op.op_id,
+                "type": op.type,
+                "id": op.id,
+                "ok": True,
+                "status_code": 200,
+                "result": final.get(op_type.collection, {}).get(op.id)
+            }
+            if op.op_id in reserved:
+                records.append(results[index])
+        if records:
+            await _record_results(db, org_id, records)
+    except BaseException:
+        abandoned = [op_id for op_id in reserved if op_id not in written]
+        if abandoned:
+            await db.bulk_operation_results.delete_many({"organization_id": org_id, "op_id": {"$in": abandoned}})
+        applied_ops = [op for op in operations if op.op_id in written]
+        if applied_ops:
+            await _record_results(db, org_id, [
+                {
+                    "index": positions[op.op_id],
+                    "op_id": op.op_id,
+                    "type": op.type,
+                    "id": op.id,
+                    "ok": True,
+                    "status_code": 200,
+                    "result": None
+                }
+                for op in applied_ops
+            ])
+        raise
+
+    # Nothing was written for the rest: release their reservations for a retry
+    released = [op.op_id for index, op in enumerate(operations) if op.op_id in reserved and not results[index]["ok"]]
+    if released:
+        await db.bulk_operation_results.delete_many({"organization_id": org_id, "op_id": {"$in": released}})
+
+    return {
+        "succeeded": sum(1 for result in results if result["ok"]),
+        "failed": sum(1 for result in results if not result["ok"]),
+        "results": results
+    }
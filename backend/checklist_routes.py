@@ -559,8 +559,8 @@ async def complete_checklist(
     
     # Auto-start workflow if required
     if requires_approval and workflow_template_id:
-        from .workflow_engine import WorkflowEngine
-        engine = WorkflowEngine(db)
+        from .workflow_engine import get_workflow_engine
+        engine = get_workflow_engine(db)
         
         try:
             # Check for duplicate workflow
@@ -5,7 +5,7 @@ All endpoints require 'developer' role
 from fastapi import APIRouter, HTTPException, Depends, Request, Body
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import Dict, List, Any, Optional
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import os
 import psutil
 import logging
@@ -732,6 +732,55 @@ async def get_performance_metrics(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/metrics/scheduler")
+async def get_scheduler_metrics(
+    limit: int = 20,
+    current_user: dict = Depends(get_current_developer),
+    db = Depends(get_db)
+):
+    """Get scheduler leader, per-job lag/duration summary and recent runs"""
+    try:
+        leader = await db.scheduler_locks.find_one({"_id": "scheduler_leader"})
+        
+        # Summary over the last 7 days of runs, per job
+        since = (datetime.now(timezone.utc) - timedelta(days=7)).isoformat()
+        summary = await db.scheduler_runs.aggregate([
+            {"$match": {"started_at": {"$gte": since}}},
+            {"$sort": {"started_at": -1}},
+            {"$group": {
+                "_id": "$job_id",
+                "runs": {"$sum": 1},
+                "errors": {"$sum": {"$cond": [{"$eq": ["$outcome", "error"]}, 1, 0]}},
+                "avg_duration_ms": {"$avg": "$duration_ms"},
+                "max_duration_ms": {"$max": "$duration_ms"},
+                "avg_lag_ms": {"$avg": "$lag_ms"},
+                "max_lag_ms": {"$max": "$lag_ms"},
+                "last_run_at": {"$first": "$started_at"},
+                "last_outcome": {"$first": "$outcome"}
+            }},
+            {"$project": {"_id": 0, "job_id": "$_id", "runs": 1, "errors": 1,
+                          "avg_duration_ms": 1, "max_duration_ms": 1,
+                          "avg_lag_ms": 1, "max_lag_ms": 1,
+                          "last_run_at": 1, "last_outcome": 1}}
+        ]).to_list(None)
+        
+        recent_runs = await db.scheduler_runs.find({}, {"_id": 0}).sort("started_at", -1).limit(limit).to_list(limit)
+        
+        return {
+            "leader": {
+                "instance_id": leader.get("owner"),
+                "expires_at": leader.get("expires_at"),
+                "renewed_at": leader.get("renewed_at")
+            } if leader else None,
+            "jobs": summary,
+            "recent_runs": recent_runs,
+            "timestamp": datetime.now(timezone.utc).isoformat()
+        }
+    except Exception as e:
+        logger.error(f"Get scheduler metrics failed: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 # ============================================================================
 # PHASE 3: WEBHOOK TESTING
 # ============================================================================
@@ -743,11 +792,15 @@ async def get_webhooks(
 ):
     """Get all configured webhooks"""
     try:
+        from .webhook_delivery import dispatcher
+        
         webhooks = await db.webhooks.find({}).to_list(length=1000)
+        circuits = await dispatcher.circuit_status(db, [w.get('url') for w in webhooks if w.get('url')])
         
         for webhook in webhooks:
             if '_id' in webhook:
                 webhook['_id'] = str(webhook['_id'])
+            webhook['circuit'] = circuits.get(str(webhook.get('url')))
         
         return {
             "webhooks": webhooks,
@@ -0,0 +1,538 @@
+"""
+Email Outbox - Durable, batched transactional email delivery
+
+Handlers queue messages into email_outbox with a single insert and return
+immediately; a pool of background workers sends them through the SendGrid v3
+HTTP API using one pooled aiohttp session. Nothing on the request path waits
+for SendGrid.
+
+Messages that share sender, subject and body (and organization, since the API
+key is per organization) get the same batch_key. A worker claims up to
+MAX_PERSONALIZATIONS recipients worth of them and sends a single request with
+one personalization per recipient, so recipients never see each other.
+
+Sends are bounded by the worker count and a process-wide token bucket
+(EMAIL_RATE_PER_SECOND). Transient failures (network errors, 429, 5xx) are
+retried with exponential backoff and jitter; other 4xx responses fail
+immediately. A 4xx for a multi-message batch is usually one bad recipient,
+so the batch is split instead: each message gets a batch_key of its own
+and is re-queued to be sent alone, and only the offending one fails.
+
+Outbox statuses:
+    pending   - waiting for its first attempt
+    sending   - claimed by a worker (reclaimable once locked_until passes)
+    retrying  - last attempt failed, next attempt at next_attempt_at
+    sent      - accepted by the provider
+    failed    - permanent error or gave up after max_retries attempts
+
+The API base URL comes from EMAIL_API_BASE_URL, so a local HTTP sink that
+accepts POST /v3/mail/send (see scripts/fake_email_sink.py) can stand in for
+SendGrid in tests.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Tuple
+import asyncio
+import hashlib
+import os
+import random
+import time
+import uuid
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+EMAIL_API_BASE_URL = os.environ.get("EMAIL_API_BASE_URL", "https://api.sendgrid.com").rstrip("/")
+
+# Worker pool, connection pool and provider rate limit
+EMAIL_WORKERS = int(os.environ.get("EMAIL_WORKERS", "4"))
+EMAIL_MAX_CONNECTIONS = int(os.environ.get("EMAIL_MAX_CONNECTIONS", "10"))
+EMAIL_RATE_PER_SECOND = float(os.environ.get("EMAIL_RATE_PER_SECOND", "10"))
+
+# SendGrid accepts at most 1000 personalizations per request
+MAX_PERSONALIZATIONS = 1000
+
+DEFAULT_FROM_EMAIL = "noreply@opsplatform.com"
+DEFAULT_FROM_NAME = "Operations Platform"
+
+# Retry policy (seconds)
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 30
+MAX_BACKOFF_SECONDS = 3600
+
+# Per-request timeouts (seconds)
+REQUEST_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
+
+# How long a claimed message stays locked before another worker may take it
+CLAIM_LEASE_SECONDS = REQUEST_TIMEOUT * 2
+
+POLL_INTERVAL_SECONDS = 5
+
+CLAIMABLE_STATUSES = ["pending", "retrying"]
+PENDING_STATUSES = ["pending", "sending", "retrying"]
+
+
+def compute_batch_key(
+    organization_id: Optional[str],
+    from_email: str,
+    from_name: str,
+    subject: str,
+    html_content: str
+) -> str:
+    """Messages with the same key can share one provider request"""
+    digest = hashlib.sha256()
+    for part in (organization_id or "", from_email, from_name, subject, html_content):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def compute_backoff(attempt: int) -> float:
+    """Exponential backoff with jitter: half fixed, half random, capped"""
+    delay = min(MAX_BACKOFF_SECONDS, RETRY_BASE_DELAY * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def build_message(
+    to_emails: List[str],
+    subject: str,
+    html_content: str,
+    organization_id: Optional[str] = None,
+    email_type: str = "generic",
+    metadata: Optional[Dict[str, Any]] = None,
+    from_email: Optional[str] = None,
+    from_name: Optional[str] = None
+) -> Dict[str, Any]:
+    """Build a queued outbox document"""
+    now = datetime.now(timezone.utc).isoformat()
+
+    # Sender left unset resolves from organization settings at send time
+    message = {
+        "id": str(uuid.uuid4()),
+        "organization_id": organization_id,
+        "to_emails": list(dict.fromkeys(e for e in to_emails if e)),
+        "subject": subject,
+        "html_content": html_content,
+        "from_email": from_email,
+        "from_name": from_name,
+        "email_type": email_type,
+        "metadata": metadata or {},
+        "status": "pending",
+        "attempt_count": 0,
+        "max_retries": MAX_RETRIES,
+        "next_attempt_at": now,
+        "created_at": now,
+        "updated_at": now
+    }
+    message["batch_key"] = compute_batch_key(
+        organization_id, from_email or "", from_name or "", subject, html_content
+    )
+    return message
+
+
+def build_messages(to_emails: List[str], *args, **kwargs) -> List[Dict[str, Any]]:
+    """build_message, split so no message has more than MAX_PERSONALIZATIONS recipients
+
+    Every recipient is one personalization, and a claimed batch always holds
+    whole messages, so a larger message could never be sent.
+    """
+    recipients = list(dict.fromkeys(e for e in to_emails if e))
+    return [
+        build_message(recipients[start:start + MAX_PERSONALIZATIONS], *args, **kwargs)
+        for start in range(0, len(recipients), MAX_PERSONALIZATIONS)
+    ]
+
+
+def build_payload(messages: List[dict], from_email: str, from_name: str) -> Dict[str, Any]:
+    """SendGrid v3 mail/send body: one personalization per recipient"""
+    first = messages[0]
+    return {
+        "personalizations": [
+            {"to": [{"email": email}], "custom_args": {"outbox_id": m["id"]}}
+            for m in messages for email in m["to_emails"]
+        ],
+        "from": {"email": from_email, "name": from_name},
+        "subject": first["subject"],
+        "content": [{"type": "text/html", "value": first["html_content"]}]
+    }
+
+
+class RateLimiter:
+    """Token bucket shared by all workers of this process"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.capacity = burst or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """Back off after the provider throttles us: no tokens for `seconds`"""
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+
+class EmailOutbox:
+    """Queues transactional email and drains it with a bounded worker pool"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.rate_limiter: Optional[RateLimiter] = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Open the shared HTTP session and start the worker pool"""
+        if self._workers:
+            return
+
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self.rate_limiter = RateLimiter(EMAIL_RATE_PER_SECOND)
+        self.session = self._new_session()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(EMAIL_WORKERS)
+        ]
+        logger.info(f"Email outbox started with {EMAIL_WORKERS} workers")
+
+    async def stop(self):
+        """Stop workers and close the HTTP session; unsent mail stays queued"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def wake(self):
+        """Nudge idle workers after new mail is queued"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _new_session(self) -> aiohttp.ClientSession:
+        return aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=EMAIL_MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+
+    # ==================== QUEUEING ====================
+
+    async def enqueue(
+        self,
+        db: AsyncIOMotorDatabase,
+        to_emails: List[str],
+        subject: str,
+        html_content: str,
+        organization_id: Optional[str] = None,
+        email_type: str = "generic",
+        metadata: Optional[Dict[str, Any]] = None,
+        from_email: Optional[str] = None,
+        from_name: Optional[str] = None
+    ) -> Optional[str]:
+        """Queue one message (any number of recipients) in a single insert; returns its id
+
+        More than MAX_PERSONALIZATIONS recipients are queued as several
+        messages; the id of the first is returned.
+        """
+        messages = build_messages(
+            to_emails, subject, html_content, organization_id,
+            email_type, metadata, from_email, from_name
+        )
+        if not messages:
+            return None
+
+        await db.email_outbox.insert_many([message.copy() for message in messages])
+        self.wake()
+        return messages[0]["id"]
+
+    async def enqueue_many(self, db: AsyncIOMotorDatabase, messages: List[Dict[str, Any]]) -> List[str]:
+        """Queue many messages in a single insert; each item holds enqueue()'s keyword arguments"""
+        documents = [document for message in messages for document in build_messages(**message)]
+        if not documents:
+            return []
+
+        await db.email_outbox.insert_many([document.copy() for document in documents])
+        self.wake()
+        return [document["id"] for document in documents]
+
+    # ==================== SENDER / API KEY ====================
+
+    async def resolve_sender(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: Optional[str]
+    ) -> Tuple[Optional[str], str, str]:
+        """API key and default sender: organization settings, then environment"""
+        settings = None
+        if organization_id:
+            settings = await db.organization_settings.find_one(
+                {"organization_id": organization_id},
+                {"_id": 0, "sendgrid_api_key": 1, "sendgrid_from_email": 1, "sendgrid_from_name": 1}
+            )
+        settings = settings or {}
+
+        return (
+            settings.get("sendgrid_api_key") or os.environ.get("SENDGRID_API_KEY"),
+            settings.get("sendgrid_from_email") or DEFAULT_FROM_EMAIL,
+            settings.get("sendgrid_from_name") or DEFAULT_FROM_NAME
+        )
+
+    # ==================== SENDING ====================
+
+    async def send_now(
+        self,
+        api_key: str,
+        to_email: str,
+        subject: str,
+        html_content: str,
+        from_email: str = DEFAULT_FROM_EMAIL,
+        from_name: str = DEFAULT_FROM_NAME
+    ) -> Tuple[bool, Optional[str]]:
+        """Send immediately, bypassing the queue (configuration test emails)"""
+        message = {"id": "direct", "to_emails": [to_email], "subject": subject, "html_content": html_content}
+        payload = build_payload([message], from_email, from_name)
+
+        if self.session:
+            status_code, error, _ = await self._post(self.session, api_key, payload)
+        else:
+            async with self._new_session() as session:
+                status_code, error, _ = await self._post(session, api_key, payload)
+
+        succeeded = status_code is not None and status_code < 300
+        return succeeded, None if succeeded else (error or f"HTTP {status_code}")
+
+    async def _post(
+        self,
+        session: aiohttp.ClientSession,
+        api_key: str,
+        payload: Dict[str, Any]
+    ) -> Tuple[Optional[int], Optional[str], Optional[float]]:
+        """POST to mail/send; returns status code, error text and Retry-After"""
+        try:
+            async with session.post(
+                f"{EMAIL_API_BASE_URL}/v3/mail/send",
+                json=payload,
+                headers={"Authorization": f"Bearer {api_key}"}
+            ) as response:
+                error = None
+                if response.status >= 300:
+                    error = (await response.text())[:1000]
+                retry_after = response.headers.get("Retry-After")
+                return (
+                    response.status,
+                    error,
+                    float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return None, str(e) or e.__class__.__name__, None
+
+    async def _worker_loop(self, index: int):
+        """Claim and send due batches until cancelled"""
+        while True:
+            try:
+                batch = await self._claim_batch()
+                if batch:
+                    await self._send_batch(batch)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Email worker {index} error: {str(e)}")
+
+            # Idle: wait for new mail or the next poll
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _due_filter(self, now: datetime) -> Dict[str, Any]:
+        return {
+            "$or": [
+                {"status": {"$in": CLAIMABLE_STATUSES}, "next_attempt_at": {"$lte": now.isoformat()}},
+                {"status": "sending", "locked_until": {"$lt": now.isoformat()}}
+            ]
+        }
+
+    async def _claim_batch(self) -> List[dict]:
+        """Claim the oldest due message plus due messages with the same batch_key"""
+        now = datetime.now(timezone.utc)
+        claim_id = f"{self.worker_id}:{uuid.uuid4().hex[:8]}"
+        claim = {
+            "status": "sending",
+            "locked_by": claim_id,
+            "locked_until": (now + timedelta(seconds=CLAIM_LEASE_SECONDS)).isoformat()
+        }
+
+        first = await self.db.email_outbox.find_one_and_update(
+            self._due_filter(now),
+            {"$set": claim},
+            sort=[("next_attempt_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if not first:
+            return []
+
+        # Fill the request with identical messages, staying under the
+        # personalization limit (retrying messages only join once due)
+        budget = MAX_PERSONALIZATIONS - len(first["to_emails"])
+        candidates = await self.db.email_outbox.find(
+            {"batch_key": first["batch_key"], "id": {"$ne": first["id"]}, **self._due_filter(now)},
+            {"_id": 0, "id": 1, "to_emails": 1}
+        ).sort("next_attempt_at", 1).limit(MAX_PERSONALIZATIONS).to_list(None)
+
+        ids = []
+        for candidate in candidates:
+            if len(candidate["to_emails"]) > budget:
+                break
+            budget -= len(candidate["to_emails"])
+            ids.append(candidate["id"])
+
+        if not ids:
+            return [first]
+
+        # Another worker may win some of these; only keep what we claimed
+        await self.db.email_outbox.update_many(
+            {"id": {"$in": ids}, **self._due_filter(now)},
+            {"$set": claim}
+        )
+        others = await self.db.email_outbox.find(
+            {"id": {"$in": ids}, "locked_by": claim_id},
+            {"_id": 0}
+        ).to_list(None)
+        return [first] + others
+
+    async def _send_batch(self, batch: List[dict]):
+        """Send one claimed batch as a single request and record the outcome"""
+        first = batch[0]
+        api_key, default_from_email, default_from_name = await self.resolve_sender(
+            self.db, first.get("organization_id")
+        )
+
+        if not api_key:
+            await self._finish(batch, {"status": "failed", "last_error": "SendGrid API key not configured"})
+            return
+
+        payload = build_payload(
+            batch,
+            first.get("from_email") or default_from_email,
+            first.get("from_name") or default_from_name
+        )
+
+        await self.rate_limiter.acquire()
+        status_code, error, retry_after = await self._post(self.session, api_key, payload)
+        now = datetime.now(timezone.utc)
+
+        if status_code is not None and status_code < 300:
+            await self._finish(batch, {
+                "status": "sent",
+                "status_code": status_code,
+                "batch_size": len(batch),
+                "sent_at": now.isoformat()
+            }, attempted=True)
+            return
+
+        result = {
+            "status_code": status_code,
+            "last_error": error or f"HTTP {status_code}",
+            "last_attempt_at": now.isoformat()
+        }
+
+        # Client errors other than throttling won't succeed on retry
+        transient = status_code is None or status_code == 429 or status_code >= 500
+        if not transient and len(batch) > 1:
+            await self._split_batch(batch, result)
+            return
+        if not transient:
+            await self._finish(batch, {**result, "status": "failed"}, attempted=True)
+            return
+
+        # Messages in a batch may have different attempt counts; schedule each
+        retry, exhausted = [], []
+        for message in batch:
+            attempt = message.get("attempt_count", 0) + 1
+            (exhausted if attempt >= message.get("max_retries", MAX_RETRIES) else retry).append(message)
+
+        if exhausted:
+            await self._finish(exhausted, {**result, "status": "failed"}, attempted=True)
+        for message in retry:
+            delay = max(retry_after or 0, compute_backoff(message.get("attempt_count", 0) + 1))
+            await self._finish([message], {
+                **result,
+                "status": "retrying",
+                "next_attempt_at": (now + timedelta(seconds=delay)).isoformat()
+            }, attempted=True)
+
+        logger.warning(f"Email batch of {len(batch)} failed ({result['last_error']}); {len(retry)} will retry")
+
+    async def _split_batch(self, batch: List[dict], result: Dict[str, Any]):
+        """Re-queue a rejected batch one message per request, so an error fails only its own message"""
+        await self.db.email_outbox.bulk_write([
+            UpdateOne(
+                {"id": message["id"], "locked_by": message["locked_by"]},
+                {
+                    "$set": {
+                        **result,
+                        "status": "retrying",
+                        "batch_key": f"single:{message['id']}",
+                        "next_attempt_at": result["last_attempt_at"],
+                        "updated_at": result["last_attempt_at"]
+                    },
+                    "$unset": {"locked_by": "", "locked_until": ""}
+                }
+            )
+            for message in batch
+        ], ordered=False)
+        self.wake()
+        logger.warning(f"Email batch of {len(batch)} rejected ({result['last_error']}); sending messages individually")
+
+    async def _finish(self, messages: List[dict], result: Dict[str, Any], attempted: bool = False):
+        """Release the claim and store the result on every message of a batch"""
+        update = {
+            "$set": {**result, "updated_at": datetime.now(timezone.utc).isoformat()},
+            "$unset": {"locked_by": "", "locked_until": ""}
+        }
+        if attempted:
+            update["$inc"] = {"attempt_count": 1}
+
+        await self.db.email_outbox.update_many(
+            {"id": {"$in": [m["id"] for m in messages]}, "locked_by": messages[0]["locked_by"]},
+            update
+        )
+
+    # ==================== STATS ====================
+
+    async def stats(self, db: AsyncIOMotorDatabase, since: str) -> Dict[str, int]:
+        """Message counts by status created since the given ISO timestamp"""
+        counts = await db.email_outbox.aggregate([
+            {"$match": {"created_at": {"$gte": since}}},
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        return {c["_id"]: c["count"] for c in counts}
+
+
+# Process-wide outbox (started from server startup)
+outbox = EmailOutbox()
@@ -0,0 +1,423 @@
+"""
+Email Templates - Transactional email templates parsed once at import
+
+Each template (subject and HTML body) is parsed when this module is
+imported into its literal text and the fields between it, with "{{" / "}}"
+already unescaped. A render is then a single join of the literal pieces and
+the variable values, so nothing is re-parsed per call and no code is
+generated. For the "invitation_reminder" subject the parsed form is:
+
+    literals: ("Reminder: Your OpsPlatform invitation expires in ", " day(s)")
+    fields:   ("days_left",)
+
+Template sources use str.format syntax ("{field}", with "{{" / "}}" for
+literal braces) and render exactly as str.format would. Format specs and
+conversions are not supported. Variables are inserted as-is, so HTML
+fragments (e.g. reason_text) must be built by the caller.
+
+Micro-benchmark: python scripts/benchmark_email_templates.py
+"""
+from string import Formatter
+from typing import Dict, Tuple, Any
+
+
+class TemplateText:
+    """One template string split into literal text and the fields between it"""
+
+    __slots__ = ("literals", "fields")
+
+    def __init__(self, name: str, source: str):
+        literals = [""]
+        fields = []
+        for literal, field, spec, conversion in Formatter().parse(source):
+            literals[-1] += literal
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Template {name}: format specs are not supported ({field})")
+            if not field.isidentifier():
+                raise ValueError(f"Template {name}: invalid field {{{field}}}")
+            fields.append(field)
+            literals.append("")
+        # len(literals) == len(fields) + 1
+        self.literals = tuple(literals)
+        self.fields = tuple(fields)
+
+    def render(self, variables: Dict[str, Any]) -> str:
+        if not self.fields:
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for field, literal in zip(self.fields, self.literals[1:]):
+            parts.append(format(variables[field]))
+            parts.append(literal)
+        return "".join(parts)
+
+
+class CompiledTemplate:
+    """A subject and HTML body, parsed once"""
+
+    __slots__ = ("name", "fields", "subject", "html")
+
+    def __init__(self, name: str, subject: str, html: str):
+        self.name = name
+        self.subject = TemplateText(name, subject)
+        self.html = TemplateText(name, html)
+        self.fields = frozenset(self.subject.fields + self.html.fields)
+
+    def render(self, variables: Dict[str, Any]) -> Tuple[str, str]:
+        """Render (subject, html); raises KeyError for a missing variable"""
+        try:
+            return self.subject.render(variables), self.html.render(variables)
+        except KeyError:
+            missing = self.fields - variables.keys()
+            raise KeyError(f"Template {self.name} is missing variables: {', '.join(sorted(missing))}")
+
+
+# ==================== TEMPLATE SOURCES ====================
+
+INVITATION_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #667eea; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+        .expires {{ background: #fef3c7; border-left: 4px solid #f59e0b; padding: 15px; margin: 20px 0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎉 You're Invited!</h1>
+        </div>
+        <div class="content">
+            <p>Hi there!</p>
+            <p><strong>{inviter_name}</strong> has invited you to join <strong>{organization_name}</strong> on OpsPlatform.</p>
+
+            <div style="text-align: center;">
+                <a href="{invitation_link}" class="button">Accept Invitation</a>
+            </div>
+
+            <div class="expires">
+                <strong>⏰ Important:</strong> This invitation expires in <strong>7 days</strong>. Please accept it before it expires.
+            </div>
+
+            <p>OpsPlatform is an operational management platform that helps teams streamline inspections, tasks, and reporting.</p>
+
+            <p>If you have any questions, please contact your administrator.</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated email from OpsPlatform. Please do not reply.</p>
+            <p>If you didn't expect this invitation, you can safely ignore this email.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+INVITATION_REMINDER_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: #ef4444; color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #ef4444; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .urgent {{ background: #fee2e2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>⏰ Invitation Expiring Soon</h1>
+        </div>
+        <div class="content">
+            <div class="urgent">
+                <strong>⚠️ Urgent:</strong> Your invitation to join <strong>{organization_name}</strong> expires in <strong>{days_left} day(s)</strong>!
+            </div>
+
+            <p>You haven't accepted your invitation yet. Don't miss out!</p>
+
+            <div style="text-align: center;">
+                <a href="{invitation_link}" class="button">Accept Invitation Now</a>
+            </div>
+
+            <p>After the invitation expires, you'll need to request a new one from your administrator.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+REGISTRATION_PENDING_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+        .info-box {{ background: #dbeafe; border-left: 4px solid #3b82f6; padding: 15px; margin: 20px 0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>✅ Registration Successful!</h1>
+        </div>
+        <div class="content">
+            <p>Hi {name},</p>
+            <p>Thank you for registering with {organization_name}!</p>
+
+            <div class="info-box">
+                <strong>ℹ️ Account Status:</strong> Your account is currently <strong>pending approval</strong>. 
+                An administrator will review your registration and you'll receive an email once your account is approved.
+            </div>
+
+            <p>This usually takes 24-48 hours. You'll receive an email notification once your account is approved and you can start using the platform.</p>
+
+            <p>If you have any questions, please contact your administrator.</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated email from {organization_name}. Please do not reply.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+REGISTRATION_APPROVED_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #10b981 0%, #059669 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #10b981; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+        .success-box {{ background: #d1fae5; border-left: 4px solid #10b981; padding: 15px; margin: 20px 0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>🎉 Account Approved!</h1>
+        </div>
+        <div class="content">
+            <p>Hi {name},</p>
+            <p>Great news! Your account for <strong>{organization_name}</strong> has been approved.</p>
+
+            <div class="success-box">
+                <strong>✅ You can now log in and start using the platform!</strong>
+            </div>
+
+            <div style="text-align: center;">
+                <a href="{login_url}" class="button">Log In Now</a>
+            </div>
+
+            <p>If you have any questions or need assistance getting started, please contact your administrator.</p>
+
+            <p>Welcome aboard!</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated email from {organization_name}. Please do not reply.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+REGISTRATION_REJECTED_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+        .warning-box {{ background: #fee2e2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>Registration Update</h1>
+        </div>
+        <div class="content">
+            <p>Hi {name},</p>
+            <p>We regret to inform you that your registration for <strong>{organization_name}</strong> was not approved at this time.</p>
+
+            <div class="warning-box">
+                {reason_text}
+            </div>
+
+            <p>If you believe this was a mistake or would like more information, please contact your administrator or support team.</p>
+
+            <p>You're welcome to re-register if your circumstances have changed.</p>
+        </div>
+        <div class="footer">
+            <p>This is an automated email from {organization_name}. Please do not reply.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+WORKFLOW_STARTED_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #3b82f6 0%, #1d4ed8 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #3b82f6; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .info-box {{ background: #dbeafe; border-left: 4px solid #3b82f6; padding: 15px; margin: 20px 0; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>📋 New Approval Request</h1>
+        </div>
+        <div class="content">
+            <p>Hi there!</p>
+            <p>A new workflow <strong>{workflow_name}</strong> has been started and requires your approval.</p>
+            <div class="info-box">
+                <p><strong>Resource Type:</strong> {resource_type}</p>
+                <p><strong>Resource Name:</strong> {resource_name}</p>
+            </div>
+            <p>Please review and take action on this workflow.</p>
+            <a href="{frontend_url}/approvals" class="button">View My Approvals</a>
+            <p style="margin-top: 30px; font-size: 14px; color: #6b7280;">
+                Click the button above to go to your approvals dashboard.
+            </p>
+        </div>
+        <div class="footer">
+            <p>© 2025 OpsPlatform. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+WORKFLOW_APPROVED_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #10b981 0%, #059669 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #10b981; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .success-box {{ background: #d1fae5; border-left: 4px solid #10b981; padding: 15px; margin: 20px 0; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>✅ Workflow Approved!</h1>
+        </div>
+        <div class="content">
+            <p>Hi there!</p>
+            <p>Great news! Your workflow <strong>{workflow_name}</strong> has been approved.</p>
+            <div class="success-box">
+                <p><strong>Resource Type:</strong> {resource_type}</p>
+                <p><strong>Resource Name:</strong> {resource_name}</p>
+                <p><strong>Approved By:</strong> {approved_by}</p>
+            </div>
+            <a href="{frontend_url}/workflows" class="button">View Workflow</a>
+        </div>
+        <div class="footer">
+            <p>© 2025 OpsPlatform. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+WORKFLOW_REJECTED_HTML = """
+<!DOCTYPE html>
+<html>
+<head>
+    <style>
+        body {{ font-family: Arial, sans-serif; line-height: 1.6; color: #333; }}
+        .container {{ max-width: 600px; margin: 0 auto; padding: 20px; }}
+        .header {{ background: linear-gradient(135deg, #ef4444 0%, #dc2626 100%); color: white; padding: 30px; text-align: center; border-radius: 10px 10px 0 0; }}
+        .content {{ background: #f9fafb; padding: 30px; border: 1px solid #e5e7eb; }}
+        .button {{ display: inline-block; background: #ef4444; color: white; padding: 12px 30px; text-decoration: none; border-radius: 5px; margin: 20px 0; }}
+        .error-box {{ background: #fee2e2; border-left: 4px solid #ef4444; padding: 15px; margin: 20px 0; }}
+        .footer {{ text-align: center; padding: 20px; color: #6b7280; font-size: 12px; }}
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <h1>❌ Workflow Rejected</h1>
+        </div>
+        <div class="content">
+            <p>Hi there!</p>
+            <p>Your workflow <strong>{workflow_name}</strong> has been rejected.</p>
+            <div class="error-box">
+                <p><strong>Resource Type:</strong> {resource_type}</p>
+                <p><strong>Resource Name:</strong> {resource_name}</p>
+                <p><strong>Rejected By:</strong> {rejected_by}</p>
+                <p><strong>Comments:</strong> {comments}</p>
+            </div>
+            <p>Please review the comments and take appropriate action.</p>
+            <a href="{frontend_url}/workflows" class="button">View Workflow</a>
+        </div>
+        <div class="footer">
+            <p>© 2025 OpsPlatform. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+
+# ==================== REGISTRY ====================
+
+TEMPLATE_SOURCES = {
+    "invitation": ("Invitation to join {organization_name} on OpsPlatform", INVITATION_HTML),
+    "invitation_reminder": ("Reminder: Your OpsPlatform invitation expires in {days_left} day(s)", INVITATION_REMINDER_HTML),
+    "registration_pending": ("Registration Successful - Pending Approval", REGISTRATION_PENDING_HTML),
+    "registration_approved": ("Account Approved - Welcome to OpsPlatform!", REGISTRATION_APPROVED_HTML),
+    "registration_rejected": ("Registration Status Update", REGISTRATION_REJECTED_HTML),
+    "workflow_started": ("New Approval Request: {workflow_name}", WORKFLOW_STARTED_HTML),
+    "workflow_approved": ("Workflow Approved: {workflow_name}", WORKFLOW_APPROVED_HTML),
+    "workflow_rejected": ("Workflow Rejected: {workflow_name}", WORKFLOW_REJECTED_HTML),
+}
+
+# Parsed once, at import
+TEMPLATES: Dict[str, CompiledTemplate] = {
+    name: CompiledTemplate(name, subject, html)
+    for name, (subject, html) in TEMPLATE_SOURCES.items()
+}
+
+def render_email(template_name: str, **variables) -> Tuple[str, str]:
+    """Render a template to (subject, html)"""
+    return TEMPLATES[template_name].render(variables)
@@ -7,6 +7,7 @@ import uuid
 
 from .emergency_models import Emergency
 from .auth_utils import get_current_user
+from .sms_bulk import sender as sms_sender
 
 router = APIRouter(prefix="/emergencies", tags=["Emergencies"])
 
@@ -26,6 +27,12 @@ class EmergencyCreate(BaseModel):
     affected_areas: List[str] = []
 
 
+class EmergencyBroadcast(BaseModel):
+    """Broadcast an emergency alert by SMS or WhatsApp"""
+    channel: str = "sms"  # sms, whatsapp
+    message: Optional[str] = None
+
+
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def declare_emergency(
     emergency_data: EmergencyCreate,
@@ -145,3 +152,86 @@ async def activate_emergency(
     )
     
     return await db.emergencies.find_one({"id": emergency_id}, {"_id": 0})
+
+
+@router.post("/{emergency_id}/broadcast", status_code=status.HTTP_202_ACCEPTED)
+async def broadcast_emergency(
+    emergency_id: str,
+    broadcast: EmergencyBroadcast,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Alert every active, opted-in user with a phone number; returns a bulk send job to poll via /sms/jobs"""
+    user = await get_current_user(request, db)
+    
+    if broadcast.channel not in ["sms", "whatsapp"]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Channel must be 'sms' or 'whatsapp'"
+        )
+    
+    emergency = await db.emergencies.find_one(
+        {"id": emergency_id, "organization_id": user["organization_id"]},
+        {"_id": 0}
+    )
+    
+    if not emergency:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Emergency not found"
+        )
+    
+    # Phone numbers of active users. A user with notification preferences is
+    # alerted only if opted in to the channel, at the preferred number if set;
+    # users without preferences are alerted at their profile phone
+    users = await db.users.find(
+        {"organization_id": user["organization_id"], "is_active": True},
+        {"_id": 0, "id": 1, "phone": 1}
+    ).to_list(None)
+    opt_in_field = f"{broadcast.channel}_enabled"
+    preferences = {
+        prefs["user_id"]: prefs
+        async for prefs in db.user_preferences.find(
+            {"user_id": {"$in": [u["id"] for u in users]}},
+            {"_id": 0, "user_id": 1, "phone_number": 1, opt_in_field: 1}
+        )
+    }
+    
+    phones = []
+    for member in users:
+        prefs = preferences.get(member["id"])
+        if prefs is None:
+            phone = member.get("phone")
+        elif prefs.get(opt_in_field):
+            phone = prefs.get("phone_number") or member.get("phone")
+        else:
+            continue
+        if phone:
+            phones.append(phone)
+    
+    message = broadcast.message or (
+        f"EMERGENCY {emergency['emergency_number']}: {emergency['emergency_type']} "
+        f"({emergency['severity']})"
+        + (f" at {emergency['location']}" if emergency.get("location") else "")
+        + f". {emergency['description']}"
+    )
+    
+    job = await sms_sender.create_job(
+        db,
+        organization_id=user["organization_id"],
+        channel=broadcast.channel,
+        phone_numbers=phones,
+        message=message,
+        created_by=user["id"],
+        source={"type": "emergency", "id": emergency_id}
+    )
+    
+    await db.emergencies.update_one(
+        {"id": emergency_id},
+        {
+            "$push": {"broadcast_job_ids": job["id"]},
+            "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}
+        }
+    )
+    
+    return job
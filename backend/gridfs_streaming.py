@@ -0,0 +1,159 @@
+"""
+GridFS Streaming - Chunked upload and ranged download helpers
+
+Uploads are piped from the (spooled) UploadFile into a GridFS upload stream
+one chunk at a time, and downloads are streamed out of GridFS chunk by chunk,
+so peak memory per transfer stays at one GridFS chunk regardless of file
+size. Downloads honour single-range HTTP Range requests (video seeking,
+resumable downloads, PDF viewers fetching pages on demand).
+"""
+from fastapi import HTTPException, UploadFile, status
+from fastapi.responses import StreamingResponse, Response
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+from bson import ObjectId
+from bson.errors import InvalidId
+from gridfs.errors import NoFile
+from typing import Optional, Dict, Any, Tuple, AsyncIterator
+import re
+
+# GridFS default chunk size; reads and writes are aligned to it
+CHUNK_SIZE = 255 * 1024
+
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+async def upload_stream(
+    db: AsyncIOMotorDatabase,
+    file: UploadFile,
+    metadata: Dict[str, Any],
+    max_size: Optional[int] = None,
+    filename: Optional[str] = None
+) -> Tuple[ObjectId, int]:
+    """Pipe an UploadFile into GridFS chunk by chunk; returns (file_id, size)
+
+    metadata["size"] is filled in with the final size. Uploads over max_size
+    are aborted (already written chunks are removed) with a 413.
+    """
+    fs = AsyncIOMotorGridFSBucket(db)
+    grid_in = fs.open_upload_stream(
+        filename or file.filename,
+        chunk_size_bytes=CHUNK_SIZE,
+        metadata=metadata
+    )
+
+    size = 0
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            if max_size is not None and size > max_size:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File too large. Maximum size is {max_size / (1024*1024)}MB"
+                )
+            await grid_in.write(chunk)
+
+        await grid_in.set("metadata", {**metadata, "size": size})
+        await grid_in.close()
+    except BaseException:
+        await grid_in.abort()
+        raise
+
+    return grid_in._id, size
+
+
+async def open_grid_file(db: AsyncIOMotorDatabase, file_id: str) -> Optional[AsyncIOMotorGridOut]:
+    """Open a GridFS file for reading, or None if the id is invalid or missing"""
+    try:
+        return await AsyncIOMotorGridFSBucket(db).open_download_stream(ObjectId(file_id))
+    except (InvalidId, NoFile, TypeError):
+        return None
+
+
+def parse_range(range_header: Optional[str], length: int) -> Optional[Tuple[int, int]]:
+    """Parse a single "bytes=" range into inclusive (start, end)
+
+    Returns None when there is no usable Range header (serve the whole
+    file); raises a 416 for ranges that cannot be satisfied.
+    """
+    if not range_header:
+        return None
+
+    match = _RANGE_RE.match(range_header.strip())
+    if not match or (not match.group(1) and not match.group(2)):
+        # Multiple ranges or unknown units: fall back to the full body
+        return None
+
+    start_text, end_text = match.groups()
+    if start_text:
+        start = int(start_text)
+        end = min(int(end_text), length - 1) if end_text else length - 1
+    else:
+        # Suffix range: the last N bytes
+        suffix = int(end_text)
+        start = max(length - suffix, 0)
+        end = length - 1
+
+    if start >= length or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{length}"}
+        )
+    return start, end
+
+
+async def _iter_grid_out(grid_out: AsyncIOMotorGridOut, remaining: int) -> AsyncIterator[bytes]:
+    while remaining > 0:
+        chunk = await grid_out.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield chunk
+
+
+def stream_response(
+    grid_out: AsyncIOMotorGridOut,
+    range_header: Optional[str],
+    media_type: str,
+    headers: Optional[Dict[str, str]] = None,
+    if_none_match: Optional[str] = None
+) -> Response:
+    """Stream a GridFS file (or the requested byte range of it)
+
+    GridFS files are immutable, so the file id doubles as a strong ETag and a
+    matching If-None-Match gets an empty 304.
+    """
+    length = grid_out.length
+    etag = f'"{grid_out._id}"'
+    response_headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        **(headers or {})
+    }
+
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        response_headers.pop("Content-Disposition", None)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+
+    byte_range = parse_range(range_header, length)
+    if byte_range is None:
+        response_headers["Content-Length"] = str(length)
+        return StreamingResponse(
+            _iter_grid_out(grid_out, length),
+            media_type=media_type,
+            headers=response_headers
+        )
+
+    start, end = byte_range
+    grid_out.seek(start)
+    response_headers["Content-Range"] = f"bytes {start}-{end}/{length}"
+    response_headers["Content-Length"] = str(end - start + 1)
+    return StreamingResponse(
+        _iter_grid_out(grid_out, end - start + 1),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=response_headers
+    )
@@ -0,0 +1,215 @@
+"""
+Import Files - Streaming row readers for bulk import uploads
+
+Yields (row_number, row) pairs from an uploaded spreadsheet without holding
+the whole file in memory. Header names are lower-cased and stripped, the
+header is row 1 and blank rows are skipped, so row numbers match what
+csv.DictReader used to report. Cell values are stripped strings ("" when
+empty).
+
+Supported uploads (by file name):
+
+    .csv             UTF-8 (BOM allowed), read CHUNK_SIZE bytes at a time
+    .csv.gz / .gz    gzip-compressed CSV, decompressed incrementally and
+                     capped at IMPORT_MAX_DECOMPRESSED bytes
+    .xlsx            first worksheet, read with openpyxl in read-only mode
+                     in a worker thread, XLSX_BATCH_ROWS rows per hop
+
+Anything unreadable raises ImportFileError, which routes turn into a 400.
+"""
+from fastapi import UploadFile
+from starlette.concurrency import run_in_threadpool
+from datetime import date, datetime
+from typing import Optional, List, Dict, Any, Tuple, AsyncIterator, Awaitable, Callable
+import codecs
+import csv
+import io
+import itertools
+import os
+import zlib
+
+from .gridfs_streaming import CHUNK_SIZE
+
+IMPORT_MAX_DECOMPRESSED = int(os.environ.get("IMPORT_MAX_DECOMPRESSED", str(500 * 1024 * 1024)))
+XLSX_BATCH_ROWS = 2000
+
+IMPORT_FILE_TYPES = [".csv", ".csv.gz", ".gz", ".xlsx"]
+
+Row = Tuple[int, Dict[str, str]]
+
+
+class ImportFileError(ValueError):
+    """The upload cannot be read as an import file"""
+
+
+def _record_boundary(text: str) -> int:
+    """Length of the longest prefix of text that ends between two records
+
+    A line break only ends a record when it is outside a quoted field, i.e.
+    preceded by an even number of quote characters ("" escapes count twice).
+    """
+    end = text.rfind("\n")
+    while end != -1:
+        if text.count('"', 0, end) % 2 == 0:
+            return end + 1
+        end = text.rfind("\n", 0, end)
+    return 0
+
+
+class _RowBuilder:
+    """Turns raw records into numbered row dicts once the header is known"""
+
+    def __init__(self, required_columns: List[str]):
+        self.required_columns = required_columns
+        self.header: Optional[List[str]] = None
+        self.row_number = 1
+
+    def add(self, fields: List[str]) -> Optional[Row]:
+        if not any(fields):
+            return None
+        if self.header is None:
+            self.header = [name.strip().lower() for name in fields]
+            missing = [column for column in self.required_columns if column not in self.header]
+            if missing:
+                raise ImportFileError(f"Missing required columns: {', '.join(missing)}")
+            return None
+
+        self.row_number += 1
+        values = [value.strip() for value in fields] + [""] * (len(self.header) - len(fields))
+        return self.row_number, dict(zip(self.header, values))
+
+    def finish(self):
+        if self.header is None:
+            raise ImportFileError("File is empty")
+
+
+async def iter_csv_rows(
+    read: Callable[[int], Awaitable[bytes]],
+    required_columns: List[str]
+) -> AsyncIterator[Row]:
+    """Rows of a UTF-8 CSV, parsed CHUNK_SIZE bytes at a time"""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    builder = _RowBuilder(required_columns)
+    pending = ""
+
+    while True:
+        chunk = await read(CHUNK_SIZE)
+        try:
+            text = pending + decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError:
+            raise ImportFileError("File is not valid UTF-8")
+
+        # Only parse up to a record boundary; the rest waits for more bytes
+        cut = _record_boundary(text) if chunk else len(text)
+        complete, pending = text[:cut], text[cut:]
+
+        try:
+            records = list(csv.reader(io.StringIO(complete)))
+        except csv.Error as e:
+            raise ImportFileError(str(e))
+
+        for fields in records:
+            row = builder.add(fields)
+            if row:
+                yield row
+
+        if not chunk:
+            break
+
+    builder.finish()
+
+
+def gunzip(read: Callable[[int], Awaitable[bytes]]) -> Callable[[int], Awaitable[bytes]]:
+    """Wrap a byte reader so it returns decompressed gzip data"""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    total = 0
+
+    async def read_decompressed(size: int) -> bytes:
+        nonlocal total
+        try:
+            while True:
+                if decompressor.unconsumed_tail:
+                    data = decompressor.decompress(decompressor.unconsumed_tail, size)
+                else:
+                    compressed = await read(size)
+                    if not compressed:
+                        if not decompressor.eof:
+                            raise ImportFileError("Compressed file is truncated")
+                        return decompressor.flush()
+                    data = decompressor.decompress(compressed, size)
+
+                if data:
+                    total += len(data)
+                    if total > IMPORT_MAX_DECOMPRESSED:
+                        raise ImportFileError(
+                            f"Decompressed file is larger than {IMPORT_MAX_DECOMPRESSED // (1024 * 1024)}MB"
+                        )
+                    return data
+        except zlib.error:
+            raise ImportFileError("File is not valid gzip")
+
+    return read_decompressed
+
+
+def _cell_text(value: Any) -> str:
+    """Spreadsheet cell as the text a CSV export would contain"""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+async def iter_xlsx_rows(file: UploadFile, required_columns: List[str]) -> AsyncIterator[Row]:
+    """Rows of the first worksheet of an XLSX upload"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFileError("XLSX import is not available (openpyxl is not installed)")
+
+    def open_sheet():
+        workbook = load_workbook(file.file, read_only=True, data_only=True)
+        return workbook, workbook.worksheets[0].iter_rows(values_only=True)
+
+    try:
+        workbook, rows = await run_in_threadpool(open_sheet)
+    except Exception as e:
+        raise ImportFileError(f"File is not a valid XLSX workbook: {str(e)}")
+
+    builder = _RowBuilder(required_columns)
+    try:
+        while True:
+            batch = await run_in_threadpool(lambda: list(itertools.islice(rows, XLSX_BATCH_ROWS)))
+            if not batch:
+                break
+            for values in batch:
+                row = builder.add([_cell_text(value) for value in values])
+                if row:
+                    yield row
+    finally:
+        workbook.close()
+
+    builder.finish()
+
+
+def file_type(filename: str) -> Optional[str]:
+    """Matching entry of IMPORT_FILE_TYPES, or None"""
+    name = (filename or "").lower()
+    for extension in sorted(IMPORT_FILE_TYPES, key=len, reverse=True):
+        if name.endswith(extension):
+            return extension
+    return None
+
+
+def iter_upload_rows(file: UploadFile, required_columns: List[str]) -> AsyncIterator[Row]:
+    """Rows of an uploaded CSV, gzip-compressed CSV or XLSX file"""
+    kind = file_type(file.filename)
+    if kind == ".xlsx":
+        return iter_xlsx_rows(file, required_columns)
+    if kind in (".csv.gz", ".gz"):
+        return iter_csv_rows(gunzip(file.read), required_columns)
+    return iter_csv_rows(file.read, required_columns)
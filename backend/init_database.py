@@ -95,6 +95,136 @@ async def initialize_phase1_database():
     await db.audit_logs.create_index([("resource_type", 1), ("resource_id", 1)])
     print("✅ Created index: audit_logs (user_id, organization_id, resource)")
     
+    # Workflow approver resolution indexes
+    await db.users.create_index([("organization_id", 1), ("role_id", 1), ("status", 1)])
+    await db.delegations.create_index([("delegator_id", 1), ("active", 1), ("valid_until", 1)])
+    await db.org_units.create_index([("parent_id", 1)])
+    print("✅ Created index: users (organization_id, role_id, status), delegations (delegator_id), org_units (parent_id)")
+    
+    # Workflow instance indexes (conditional state transitions match on id)
+    await db.workflow_instances.create_index([("id", 1)], unique=True)
+    await db.workflow_instances.create_index([("status", 1), ("due_at", 1)])
+    print("✅ Created index: workflow_instances (id, status/due_at)")
+    
+    # Scheduler run history indexes
+    await db.scheduler_runs.create_index([("job_id", 1), ("started_at", -1)])
+    await db.workflow_instances.create_index([("reminder_claim_id", 1)], sparse=True)
+    print("✅ Created index: scheduler_runs (job_id, started_at)")
+    
+    # Webhook delivery queue indexes
+    await db.webhook_deliveries.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.webhook_deliveries.create_index([("webhook_id", 1), ("created_at", -1)])
+    await db.webhook_deliveries.create_index([("id", 1)], unique=True)
+    await db.webhook_deliveries.create_index([("batch_id", 1)], sparse=True)
+    await db.webhook_deliveries.create_index([("batch_claim_id", 1)], sparse=True)
+    print("✅ Created index: webhook_deliveries (status, next_attempt_at)")
+    
+    # Webhook subscriptions, loaded per organization by the routing table
+    await db.webhooks.create_index([("organization_id", 1), ("is_active", 1)])
+    print("✅ Created index: webhooks (organization_id, is_active)")
+    
+    # Webhook circuit breaker state, one document per receiving URL
+    await db.webhook_circuits.create_index([("url", 1)], unique=True)
+    print("✅ Created index: webhook_circuits (url)")
+    
+    # Email outbox: due-message claims, batch_key fill-up and stats
+    await db.email_outbox.create_index([("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index([("batch_key", 1), ("status", 1), ("next_attempt_at", 1)])
+    await db.email_outbox.create_index([("id", 1)], unique=True)
+    await db.email_outbox.create_index([("created_at", -1)])
+    print("✅ Created index: email_outbox (status, next_attempt_at)")
+    
+    # Bulk SMS / WhatsApp jobs and their per-recipient progress
+    await db.sms_jobs.create_index([("id", 1)], unique=True)
+    await db.sms_jobs.create_index([("organization_id", 1), ("created_at", -1)])
+    await db.sms_jobs.create_index([("status", 1), ("created_at", 1)])
+    await db.sms_job_recipients.create_index([("job_id", 1), ("phone", 1)], unique=True)
+    await db.sms_job_recipients.create_index([("job_id", 1), ("status", 1), ("next_attempt_at", 1)])
+    print("✅ Created index: sms_jobs, sms_job_recipients (job_id, status, next_attempt_at)")
+    
+    # Content-addressed attachment blobs: one GridFS file per (org, sha256)
+    await db.attachment_blobs.create_index([("organization_id", 1), ("sha256", 1)], unique=True)
+    await db.attachment_blobs.create_index([("organization_id", 1), ("file_id", 1)])
+    print("✅ Created index: attachment_blobs (organization_id, sha256)")
+    
+    # Organization-wide attachment index (newest-first cursor pagination)
+    await db.attachments.create_index([("id", 1)], unique=True)
+    await db.attachments.create_index([("organization_id", 1), ("created_at", -1), ("id", -1)])
+    await db.attachments.create_index([("organization_id", 1), ("resource_type", 1), ("created_at", -1), ("id", -1)])
+    await db.attachments.create_index([("organization_id", 1), ("resource_type", 1), ("resource_id", 1), ("file_id", 1)])
+    await db.attachments.create_index([("organization_id", 1), ("file_id", 1), ("created_at", 1)])
+    print("✅ Created index: attachments (organization_id, created_at)")
+    
+    # Bulk PDF export jobs and the executions they select
+    await db.pdf_export_jobs.create_index([("id", 1)], unique=True)
+    await db.pdf_export_jobs.create_index([("organization_id", 1), ("created_at", -1)])
+    await db.pdf_export_jobs.create_index([("status", 1), ("created_at", 1)])
+    await db.inspection_executions.create_index([("organization_id", 1), ("started_at", 1)])
+    print("✅ Created index: pdf_export_jobs (status, created_at)")
+    
+    # Rendered inspection report cache
+    await db.pdf_render_cache.create_index(
+        [("execution_id", 1), ("content_hash", 1), ("generator_version", 1)], unique=True
+    )
+    await db.pdf_render_cache.create_index([("file_id", 1)])
+    await db.pdf_render_cache.create_index([("organization_id", 1)])
+    await db.pdf_render_stats.create_index([("organization_id", 1)], unique=True)
+    print("✅ Created index: pdf_render_cache (execution_id, content_hash, generator_version)")
+    
+    # Bulk user import jobs, their rejected rows and the per-batch email lookup
+    await db.user_import_jobs.create_index([("id", 1)], unique=True)
+    await db.user_import_jobs.create_index([("organization_id", 1), ("created_at", -1)])
+    await db.user_import_jobs.create_index([("status", 1), ("created_at", 1)])
+    await db.user_import_errors.create_index([("job_id", 1), ("row", 1)])
+    await db.users.create_index([("organization_id", 1), ("email", 1)])
+    print("✅ Created index: user_import_jobs (status, created_at)")
+    
+    # Asset tag lookups (create_asset and the batched import duplicate check)
+    await db.assets.create_index([("organization_id", 1), ("asset_tag", 1)])
+    print("✅ Created index: assets (organization_id, asset_tag)")
+    
+    # Bulk operation results kept for replayed offline syncs (expire via TTL)
+    await db.bulk_operation_results.create_index([("organization_id", 1), ("op_id", 1)], unique=True)
+    await db.bulk_operation_results.create_index([("expires_at", 1)], expireAfterSeconds=0)
+    await db.tasks.create_index([("id", 1)])
+    await db.work_orders.create_index([("id", 1)])
+    await db.inventory_items.create_index([("id", 1)])
+    print("✅ Created index: bulk_operation_results (organization_id, op_id)")
+    
+    # Stock-movement ledger (point-in-time stock and usage are ranged reads per item)
+    await db.stock_movements.create_index([("id", 1)], unique=True)
+    await db.stock_movements.create_index([("organization_id", 1), ("item_id", 1), ("created_at", -1)])
+    await db.stock_movements.create_index([("organization_id", 1), ("created_at", -1)])
+    print("✅ Created index: stock_movements (organization_id, item_id, created_at)")
+    
+    # Reorder list and low-stock job read only the items below their reorder point
+    await db.inventory_items.create_index(
+        [("organization_id", 1), ("part_number", 1)],
+        partialFilterExpression={"below_reorder": True, "is_active": True},
+        name="below_reorder_by_part_number"
+    )
+    await db.inventory_items.create_index(
+        [("reorder_notified", 1), ("reorder_claim_id", 1)],
+        partialFilterExpression={"below_reorder": True},
+        name="below_reorder_notification_claims"
+    )
+    await db.inventory_items.create_index([("organization_id", 1), ("is_active", 1), ("part_number", 1)])
+    # Items written before below_reorder existed (same test as inventory_stock.DERIVED_FIELD_STAGES)
+    await db.inventory_items.update_many(
+        {"below_reorder": {"$exists": False}},
+        [{"$set": {
+            "below_reorder": {"$lte": [
+                {"$ifNull": ["$quantity_available", 0]}, {"$ifNull": ["$reorder_point", 0]}
+            ]},
+            "reorder_notified": False
+        }}]
+    )
+    print("✅ Created index: inventory_items below_reorder (partial)")
+    
+    # Notification preferences by user (emergency broadcast opt-in lookup)
+    await db.user_preferences.create_index([("user_id", 1)])
+    print("✅ Created index: user_preferences (user_id)")
+    
     print("\n" + "=" * 80)
     print("✅ PHASE 1 DATABASE INITIALIZATION COMPLETE")
     print("=" * 80)
@@ -1,6 +1,6 @@
 from pydantic import BaseModel, Field, ConfigDict
 from typing import Optional, List, Dict, Any
-from datetime import datetime, timezone
+from datetime import datetime, timezone, date
 import uuid
 
 
@@ -235,4 +235,16 @@ class InspectionCalendarItem(BaseModel):
     unit_id: Optional[str] = None
     unit_name: Optional[str] = None
     asset_id: Optional[str] = None
-    asset_name: Optional[str] = None
\ No newline at end of file
+    asset_name: Optional[str] = None
+
+
+class InspectionBulkExportCreate(BaseModel):
+    """Bulk PDF export of the inspections matching the filters"""
+    format: str = "zip"  # zip (one PDF per inspection), pdf (single merged PDF)
+    execution_ids: Optional[List[str]] = None
+    template_id: Optional[str] = None
+    unit_id: Optional[str] = None
+    asset_id: Optional[str] = None
+    status: Optional[str] = None
+    started_from: Optional[date] = None  # Inclusive
+    started_to: Optional[date] = None  # Inclusive
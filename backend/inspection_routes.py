@@ -2,15 +2,31 @@ from fastapi import APIRouter, HTTPException, status, Depends, Request, UploadFi
 from fastapi.responses import StreamingResponse
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
+from datetime import datetime, timezone, timedelta
+import uuid
 from .auth_utils import get_current_user
+from .pdf_render_pool import iter_pdf
+from .pdf_cache import pdf_cache
+from .pdf_exports import exporter as pdf_exporter, EXPORT_FORMATS
+from .gridfs_streaming import upload_stream, open_grid_file, stream_response
+from .photo_derivatives import derivatives as photo_derivatives, RENDITIONS
 from .inspection_models import (
     InspectionTemplateCreate, InspectionQuestion, InspectionTemplate, InspectionTemplateUpdate,
     InspectionExecutionCreate, InspectionExecutionUpdate, InspectionExecutionComplete,
     InspectionExecution, InspectionAnswer, InspectionStats, InspectionSchedule,
-    TemplateAnalytics, InspectionCalendarItem
+    TemplateAnalytics, InspectionCalendarItem, InspectionBulkExportCreate
 )
 router = APIRouter(prefix="/inspections", tags=["Inspections"])
 
+# Max photo size: 100MB (same limit as attachments)
+MAX_PHOTO_SIZE = 100 * 1024 * 1024
+
+# Photos and their renditions never change once stored
+PHOTO_CACHE_CONTROL = "private, max-age=31536000, immutable"
+# The original served in place of a rendition that is not available (yet):
+# revalidate, so the client picks up the rendition once it exists
+PHOTO_FALLBACK_CACHE_CONTROL = "private, no-cache"
+
 def get_db(request: Request) -> AsyncIOMotorDatabase:
     """Dependency to get database from request state"""
     return request.app.state.db
@@ -515,8 +531,8 @@ async def complete_inspection(
     
     # Auto-start workflow if required
     if requires_approval and workflow_template_id:
-        from .workflow_engine import WorkflowEngine
-        engine = WorkflowEngine(db)
+        from .workflow_engine import get_workflow_engine
+        engine = get_workflow_engine(db)
         
         try:
             # Check for duplicate workflow
@@ -603,57 +619,80 @@ async def upload_inspection_photo(
     request: Request = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Upload a photo for an inspection using GridFS"""
+    """Upload a photo for an inspection using GridFS (streamed in chunks)
+
+    Thumbnail and medium renditions are generated in the background.
+    """
     user = await get_current_user(request, db)
     
-    # Read file content
-    content = await file.read()
-    
-    # Create GridFS bucket
-    fs = AsyncIOMotorGridFSBucket(db)
-    
-    # Upload to GridFS
-    file_id = await fs.upload_from_stream(
-        file.filename,
-        io.BytesIO(content),
+    file_id, size = await upload_stream(
+        db,
+        file,
         metadata={
             "content_type": file.content_type,
             "uploaded_by": user["id"],
             "organization_id": user["organization_id"],
             "uploaded_at": datetime.now(timezone.utc).isoformat(),
-        }
+            "derivative_status": "pending",
+        },
+        max_size=MAX_PHOTO_SIZE
     )
     
-    return {"file_id": str(file_id), "filename": file.filename}
+    photo_derivatives.schedule(db, str(file_id))
+    
+    return {"file_id": str(file_id), "filename": file.filename, "size": size}
 
 
 @router.get("/photos/{file_id}")
 async def get_inspection_photo(
     file_id: str,
     request: Request,
+    size: Optional[str] = None,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get a photo from GridFS"""
-    from fastapi.responses import StreamingResponse
-    
+    """Get a photo from GridFS (streamed; supports Range requests)
+
+    size=thumb|medium serves a downscaled rendition (WebP if the client
+    accepts it, JPEG otherwise) instead of the original.
+    """
     user = await get_current_user(request, db)
     
-    try:
-        fs = AsyncIOMotorGridFSBucket(db)
-        grid_out = await fs.open_download_stream(ObjectId(file_id))
-        
-        # Read file content
-        content = await grid_out.read()
-        
-        return StreamingResponse(
-            io.BytesIO(content),
-            media_type=grid_out.metadata.get("content_type", "image/jpeg")
+    if size is not None and size not in RENDITIONS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid size. Must be one of: {', '.join(RENDITIONS)}",
         )
-    except Exception as e:
+    
+    grid_out = await open_grid_file(db, file_id)
+    metadata = (grid_out.metadata or {}) if grid_out else {}
+    
+    if not grid_out or metadata.get("organization_id") not in (None, user["organization_id"]):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Photo not found",
         )
+    
+    headers = {"Cache-Control": PHOTO_CACHE_CONTROL}
+    
+    if size:
+        headers["Vary"] = "Accept"
+        derivative = await photo_derivatives.resolve(
+            db, file_id, metadata, size, request.headers.get("accept")
+        )
+        derivative_out = await open_grid_file(db, derivative[0]) if derivative else None
+        if derivative_out:
+            grid_out = derivative_out
+            metadata = grid_out.metadata or {}
+        else:
+            headers["Cache-Control"] = PHOTO_FALLBACK_CACHE_CONTROL
+    
+    return stream_response(
+        grid_out,
+        request.headers.get("range"),
+        media_type=metadata.get("content_type") or "image/jpeg",
+        headers=headers,
+        if_none_match=request.headers.get("if-none-match")
+    )
 
 
 # ==================== NEW ENHANCED ENDPOINTS ====================
@@ -1124,31 +1163,158 @@ async def export_inspection_pdf(
             detail="Template not found",
         )
     
-    # Generate PDF
-    try:
-        pdf_generator = InspectionPDFGenerator()
-        pdf_buffer = pdf_generator.generate_inspection_report(
-            execution_data=execution,
-            template_data=template
-        )
-        
-        # Prepare filename
-        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
-        filename = f"inspection_report_{execution_id}_{timestamp}.pdf"
-        
-        # Return as streaming response
-        return StreamingResponse(
-            pdf_buffer,
+    # Prepare filename
+    timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+    filename = f"inspection_report_{execution_id}_{timestamp}.pdf"
+    
+    # Finished inspections are served from the render cache when unchanged
+    cached = await pdf_cache.lookup(db, execution, template)
+    if cached:
+        return stream_response(
+            cached,
+            request.headers.get("range"),
             media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename={filename}"
-            }
+            headers={"Content-Disposition": f"attachment; filename={filename}"},
+            if_none_match=request.headers.get("if-none-match")
         )
+    
+    # Render in the PDF worker pool so ReportLab never blocks the event loop
+    try:
+        pdf_bytes = await pdf_cache.render(db, execution, template)
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to generate PDF: {str(e)}"
         )
+    
+    return StreamingResponse(
+        iter_pdf(pdf_bytes),
+        media_type="application/pdf",
+        headers={
+            "Content-Disposition": f"attachment; filename={filename}",
+            "Content-Length": str(len(pdf_bytes))
+        }
+    )
+
+
+@router.get("/pdf-cache/stats")
+async def get_pdf_cache_stats(
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Inspection report cache hit rate and render time saved for the organization"""
+    user = await get_current_user(request, db)
+    return await pdf_cache.stats(db, user["organization_id"])
+
+
+# ==================== BULK PDF EXPORTS ====================
+
+EXPORT_JOB_PROJECTION = {"_id": 0, "locked_by": 0, "locked_until": 0, "upload_id": 0}
+
+
+@router.post("/exports", status_code=status.HTTP_202_ACCEPTED)
+async def create_bulk_export(
+    export_data: InspectionBulkExportCreate,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Queue a bulk PDF export; poll GET /inspections/exports/{job_id} for progress"""
+    user = await get_current_user(request, db)
+    
+    if export_data.format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Invalid format. Must be one of: {', '.join(EXPORT_FORMATS)}",
+        )
+    
+    filters = export_data.model_dump(mode="json", exclude_none=True, exclude={"format"})
+    job = await pdf_exporter.create_job(
+        db,
+        user["organization_id"],
+        filters,
+        export_data.format,
+        created_by=user["id"]
+    )
+    
+    return {"message": f"Export of {job['total']} inspections queued", "job": job}
+
+
+@router.get("/exports")
+async def list_bulk_exports(
+    request: Request,
+    limit: int = 20,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """List recent bulk PDF exports for the organization"""
+    user = await get_current_user(request, db)
+    
+    jobs = await db.pdf_export_jobs.find(
+        {"organization_id": user["organization_id"]},
+        EXPORT_JOB_PROJECTION
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    
+    return jobs
+
+
+@router.get("/exports/{job_id}")
+async def get_bulk_export(
+    job_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get bulk PDF export progress"""
+    user = await get_current_user(request, db)
+    
+    job = await db.pdf_export_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        EXPORT_JOB_PROJECTION
+    )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export not found",
+        )
+    
+    job["progress"] = round(job["processed"] / job["total"] * 100, 1) if job["total"] else 100.0
+    return job
+
+
+@router.get("/exports/{job_id}/download")
+async def download_bulk_export(
+    job_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Download a finished bulk PDF export (streamed; supports Range requests)"""
+    user = await get_current_user(request, db)
+    
+    job = await db.pdf_export_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        {"_id": 0, "status": 1, "file_id": 1, "filename": 1, "format": 1}
+    )
+    
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Export not found",
+        )
+    
+    grid_out = await open_grid_file(db, job["file_id"]) if job.get("file_id") else None
+    if not grid_out:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Export is not ready (status: {job['status']})",
+        )
+    
+    return stream_response(
+        grid_out,
+        request.headers.get("range"),
+        media_type=EXPORT_FORMATS[job["format"]],
+        headers={"Content-Disposition": f"attachment; filename=\"{job['filename']}\""}
+    )
 
 
 @router.get("/scheduled")
@@ -25,6 +25,8 @@ class InventoryItem(BaseModel):
     reorder_point: float = 0.0
     reorder_quantity: float = 0.0
     lead_time_days: int = 0
+    below_reorder: bool = False  # quantity_available <= reorder_point, kept by every stock write
+    reorder_notified: bool = False  # Low-stock notification sent since it dropped below
     
     # Storage
     warehouse_id: Optional[str] = None
@@ -1,11 +1,16 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from datetime import datetime, timezone
 from typing import Optional
 import uuid
 
 from .inventory_models import InventoryItem, InventoryItemCreate, InventoryItemUpdate, InventoryStats
 from .auth_utils import get_current_user
+from .inventory_stock import (
+    apply_adjustment, build_movement, record_movements, list_movements, stock_at, usage,
+    field_update_pipeline, is_below_reorder
+)
 
 router = APIRouter(prefix="/inventory", tags=["Inventory"])
 
@@ -45,6 +50,7 @@ async def create_inventory_item(
         quantity_available=item_data.quantity_on_hand,
         reorder_point=item_data.reorder_point,
         reorder_quantity=item_data.reorder_quantity,
+        below_reorder=is_below_reorder(item_data.quantity_on_hand, item_data.reorder_point),
         unit_cost=item_data.unit_cost,
         total_value=item_data.quantity_on_hand * item_data.unit_cost,
         created_by=user["id"],
@@ -55,6 +61,10 @@ async def create_inventory_item(
     item_dict["updated_at"] = item_dict["updated_at"].isoformat()
     
     await db.inventory_items.insert_one(item_dict.copy())
+    if item_dict["quantity_on_hand"]:
+        await record_movements(db, [build_movement(
+            item_dict, item_dict["quantity_on_hand"], "initial", user["id"], created_at=item_dict["created_at"]
+        )])
     return item_dict
 
 
@@ -66,21 +76,25 @@ async def get_inventory_stats(
     """Get inventory statistics"""
     user = await get_current_user(request, db)
     
-    items = await db.inventory_items.find(
-        {"organization_id": user["organization_id"], "is_active": True},
-        {"_id": 0}
-    ).to_list(10000)
-    
-    total = len(items)
-    total_value = sum(i.get("total_value", 0) for i in items)
-    below_reorder = len([i for i in items if i.get("quantity_available", 0) <= i.get("reorder_point", 0)])
-    out_of_stock = len([i for i in items if i.get("quantity_available", 0) == 0])
+    totals = await db.inventory_items.aggregate([
+        {"$match": {"organization_id": user["organization_id"], "is_active": True}},
+        {"$group": {
+            "_id": None,
+            "total": {"$sum": 1},
+            "total_value": {"$sum": {"$ifNull": ["$total_value", 0]}},
+            "out_of_stock": {"$sum": {"$cond": [{"$eq": [{"$ifNull": ["$quantity_available", 0]}, 0]}, 1, 0]}}
+        }}
+    ]).to_list(1)
+    totals = totals[0] if totals else {"total": 0, "total_value": 0, "out_of_stock": 0}
+    below_reorder = await db.inventory_items.count_documents(
+        {"organization_id": user["organization_id"], "is_active": True, "below_reorder": True}
+    )
     
     stats = InventoryStats(
-        total_items=total,
-        total_value=round(total_value, 2),
+        total_items=totals["total"],
+        total_value=round(totals["total_value"], 2),
         items_below_reorder=below_reorder,
-        out_of_stock=out_of_stock
+        out_of_stock=totals["out_of_stock"]
     )
     
     return stats.model_dump()
@@ -91,17 +105,13 @@ async def get_reorder_items(
     request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Get items below reorder point"""
+    """Get items below reorder point (read from the below_reorder partial index)"""
     user = await get_current_user(request, db)
     
-    items = await db.inventory_items.find(
-        {"organization_id": user["organization_id"], "is_active": True},
+    return await db.inventory_items.find(
+        {"organization_id": user["organization_id"], "is_active": True, "below_reorder": True},
         {"_id": 0}
-    ).to_list(10000)
-    
-    reorder_items = [i for i in items if i.get("quantity_available", 0) <= i.get("reorder_point", 0)]
-    
-    return reorder_items
+    ).sort("part_number", 1).to_list(10000)
 
 
 @router.get("/items")
@@ -119,18 +129,15 @@ async def list_inventory_items(
     query = {"organization_id": user["organization_id"], "is_active": True}
     if category:
         query["category"] = category
+    if below_reorder:
+        query["below_reorder"] = True
     if search:
         query["$or"] = [
             {"part_number": {"$regex": search, "$options": "i"}},
             {"description": {"$regex": search, "$options": "i"}},
         ]
     
-    items = await db.inventory_items.find(query, {"_id": 0}).sort("part_number", 1).limit(limit).to_list(limit)
-    
-    if below_reorder:
-        items = [i for i in items if i.get("quantity_available", 0) <= i.get("reorder_point", 0)]
-    
-    return items
+    return await db.inventory_items.find(query, {"_id": 0}).sort("part_number", 1).limit(limit).to_list(limit)
 
 
 @router.get("/items/{item_id}")
@@ -168,18 +175,25 @@ async def update_inventory_item(
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     
     update_data = item_data.model_dump(exclude_unset=True)
+    now = datetime.now(timezone.utc).isoformat()
     
-    # Recalculate totals
-    if "quantity_on_hand" in update_data or "unit_cost" in update_data:
-        qty = update_data.get("quantity_on_hand", item.get("quantity_on_hand", 0))
-        cost = update_data.get("unit_cost", item.get("unit_cost", 0))
-        update_data["total_value"] = qty * cost
-        update_data["quantity_available"] = qty - item.get("quantity_reserved", 0)
+    # Totals and the reorder flag are recomputed from the stored values in the same write
+    updated = await db.inventory_items.find_one_and_update(
+        {"id": item_id},
+        field_update_pipeline(update_data, now),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
     
-    update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
-    await db.inventory_items.update_one({"id": item_id}, {"$set": update_data})
+    # A quantity set directly is a stock count: record the difference
+    if "quantity_on_hand" in update_data:
+        change = update_data["quantity_on_hand"] - (item.get("quantity_on_hand") or 0)
+        if change:
+            await record_movements(db, [build_movement(
+                updated, change, "count", user["id"], created_at=now
+            )])
     
-    return await db.inventory_items.find_one({"id": item_id}, {"_id": 0})
+    return updated
 
 
 @router.post("/items/{item_id}/adjust")
@@ -189,28 +203,71 @@ async def adjust_stock(
     request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Adjust stock levels"""
+    """Adjust stock levels (atomic; recorded in the stock-movement ledger)"""
     user = await get_current_user(request, db)
     
-    item = await db.inventory_items.find_one({"id": item_id, "organization_id": user["organization_id"]})
+    try:
+        adjustment = float(adjustment_data.get("adjustment", 0))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Adjustment must be a number")
+    
+    item = await apply_adjustment(
+        db,
+        user["organization_id"],
+        item_id,
+        adjustment,
+        user["id"],
+        reason=adjustment_data.get("reason")
+    )
     if not item:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     
-    adjustment = adjustment_data.get("adjustment", 0)
-    new_qty = item.get("quantity_on_hand", 0) + adjustment
-    new_available = new_qty - item.get("quantity_reserved", 0)
-    new_value = new_qty * item.get("unit_cost", 0)
+    return item
+
+
+@router.get("/items/{item_id}/movements")
+async def get_stock_movements(
+    item_id: str,
+    request: Request,
+    limit: int = 50,
+    before: Optional[str] = None,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Stock movements for an item, newest first (pass the last created_at as `before` for the next page)"""
+    user = await get_current_user(request, db)
     
-    await db.inventory_items.update_one(
-        {"id": item_id},
-        {"$set": {
-            "quantity_on_hand": new_qty,
-            "quantity_available": new_available,
-            "total_value": new_value,
-            "updated_at": datetime.now(timezone.utc).isoformat()
-        }}
-    )
+    return await list_movements(db, user["organization_id"], item_id, min(limit, 500), before)
+
+
+@router.get("/items/{item_id}/stock-at")
+async def get_stock_at(
+    item_id: str,
+    at: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Quantity on hand at a point in time (ISO timestamp), from the ledger"""
+    user = await get_current_user(request, db)
+    
+    item = await db.inventory_items.find_one({"id": item_id, "organization_id": user["organization_id"]}, {"_id": 0})
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
     
-    return await db.inventory_items.find_one({"id": item_id}, {"_id": 0})
+    return {"item_id": item_id, "at": at, "quantity_on_hand": await stock_at(db, item, at)}
 
 
+@router.get("/items/{item_id}/usage")
+async def get_stock_usage(
+    item_id: str,
+    request: Request,
+    days: int = 30,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Consumption over the last N days, average daily usage and days of cover"""
+    user = await get_current_user(request, db)
+    
+    item = await db.inventory_items.find_one({"id": item_id, "organization_id": user["organization_id"]}, {"_id": 0})
+    if not item:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Item not found")
+    
+    return await usage(db, item, max(1, min(days, 365)))
@@ -0,0 +1,223 @@
+"""
+Inventory Stock - Atomic stock adjustments and the stock-movement ledger
+
+An adjustment is one find_one_and_update whose update pipeline adds the
+delta to quantity_on_hand and recomputes the derived fields from the new
+value in the same write:
+
+    quantity_available = quantity_on_hand - quantity_reserved
+    total_value        = quantity_on_hand * unit_cost
+    below_reorder      = quantity_available <= reorder_point
+
+so concurrent adjustments (two technicians drawing the same part) cannot
+lose updates, and an adjustment is a single round trip. ($inc is not
+available inside pipelines; $add on the stored value is the atomic
+equivalent.) Edits through PUT /items/{item_id} use the same derived-field
+stages, so below_reorder is never stale: GET /items/reorder is a read of
+the partial index on it rather than a scan of the organization's items.
+Items written before the derived fields existed are filled in at startup
+by backfill_derived_fields.
+
+Every change to quantity_on_hand appends a row to stock_movements:
+
+    id, organization_id, item_id, part_number, quantity (signed delta),
+    unit_cost, value_change, movement_type, reason, reference_type,
+    reference_id, created_by, created_at
+
+Movement types: initial, adjustment, consumption, count (a quantity set
+through PUT /items/{item_id}). Stock at any point in time is the current
+quantity minus the movements after it, and usage over a period is the sum
+of its negative movements; both are ranged reads on
+(organization_id, item_id, created_at).
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any
+import uuid
+import logging
+
+logger = logging.getLogger(__name__)
+
+MOVEMENT_TYPES = ["initial", "adjustment", "consumption", "count"]
+
+
+# Derived fields, recomputed from the stored values in the same write as any
+# change to quantity_on_hand, quantity_reserved, unit_cost or reorder_point.
+# below_reorder backs the partial index the reorder list reads; reorder_notified
+# is cleared whenever an item climbs back above its reorder point, so the
+# low-stock job notifies again the next time it drops.
+DERIVED_FIELD_STAGES: List[Dict[str, Any]] = [
+    {"$set": {
+        "quantity_available": {"$subtract": [
+            {"$ifNull": ["$quantity_on_hand", 0]}, {"$ifNull": ["$quantity_reserved", 0]}
+        ]},
+        "total_value": {"$multiply": [{"$ifNull": ["$quantity_on_hand", 0]}, {"$ifNull": ["$unit_cost", 0]}]}
+    }},
+    {"$set": {
+        "below_reorder": {"$lte": ["$quantity_available", {"$ifNull": ["$reorder_point", 0]}]}
+    }},
+    {"$set": {
+        "reorder_notified": {"$and": ["$below_reorder", {"$ifNull": ["$reorder_notified", False]}]}
+    }}
+]
+
+
+def is_below_reorder(quantity_available: float, reorder_point: float) -> bool:
+    """Same test as DERIVED_FIELD_STAGES, for documents built in Python"""
+    return (quantity_available or 0) <= (reorder_point or 0)
+
+
+def stock_update_pipeline(adjustment: float, now: str) -> List[Dict[str, Any]]:
+    """Update pipeline adding adjustment to quantity_on_hand and recomputing derived fields"""
+    return [
+        {"$set": {
+            "quantity_on_hand": {"$add": [{"$ifNull": ["$quantity_on_hand", 0]}, adjustment]},
+            "updated_at": now
+        }},
+        *DERIVED_FIELD_STAGES
+    ]
+
+
+def field_update_pipeline(fields: Dict[str, Any], now: str) -> List[Dict[str, Any]]:
+    """Update pipeline setting fields to the given values and recomputing derived fields"""
+    # $literal: a value such as "$5 gasket" must not be read as a field path
+    values = {field: {"$literal": value} for field, value in fields.items()}
+    values["updated_at"] = now
+    return [{"$set": values}, *DERIVED_FIELD_STAGES]
+
+
+async def backfill_derived_fields(db: AsyncIOMotorDatabase) -> int:
+    """Compute the derived fields of items that predate below_reorder; idempotent"""
+    result = await db.inventory_items.update_many({"below_reorder": {"$exists": False}}, DERIVED_FIELD_STAGES)
+    if result.modified_count:
+        logger.info(f"Backfilled derived stock fields on {result.modified_count} inventory items")
+    return result.modified_count
+
+
+def build_movement(
+    item: Dict[str, Any],
+    quantity: float,
+    movement_type: str,
+    user_id: Optional[str],
+    reason: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[str] = None,
+    created_at: Optional[str] = None
+) -> Dict[str, Any]:
+    """Ledger row for a change of quantity to an item"""
+    unit_cost = item.get("unit_cost") or 0
+    return {
+        "id": str(uuid.uuid4()),
+        "organization_id": item["organization_id"],
+        "item_id": item["id"],
+        "part_number": item.get("part_number"),
+        "quantity": quantity,
+        "unit_cost": unit_cost,
+        "value_change": quantity * unit_cost,
+        "movement_type": movement_type,
+        "reason": reason,
+        "reference_type": reference_type,
+        "reference_id": reference_id,
+        "created_by": user_id,
+        "created_at": created_at or datetime.now(timezone.utc).isoformat()
+    }
+
+
+async def record_movements(db: AsyncIOMotorDatabase, movements: List[Dict[str, Any]]):
+    """Append to the ledger; a failure is logged, the stock change already happened"""
+    if not movements:
+        return
+    try:
+        await db.stock_movements.insert_many([movement.copy() for movement in movements], ordered=False)
+    except Exception as e:
+        logger.error(f"Could not record {len(movements)} stock movements: {str(e)}")
+
+
+async def apply_adjustment(
+    db: AsyncIOMotorDatabase,
+    organization_id: str,
+    item_id: str,
+    adjustment: float,
+    user_id: Optional[str],
+    movement_type: str = "adjustment",
+    reason: Optional[str] = None,
+    reference_type: Optional[str] = None,
+    reference_id: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Atomically apply a stock delta and record it; returns the updated item, or None if not found"""
+    now = datetime.now(timezone.utc).isoformat()
+    item = await db.inventory_items.find_one_and_update(
+        {"id": item_id, "organization_id": organization_id},
+        stock_update_pipeline(adjustment, now),
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not item:
+        return None
+
+    await record_movements(db, [build_movement(
+        item, adjustment, movement_type, user_id, reason, reference_type, reference_id, now
+    )])
+    return item
+
+
+async def list_movements(
+    db: AsyncIOMotorDatabase,
+    organization_id: str,
+    item_id: str,
+    limit: int,
+    before: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """An item's movements, newest first (before: created_at to continue from)"""
+    query: Dict[str, Any] = {"organization_id": organization_id, "item_id": item_id}
+    if before:
+        query["created_at"] = {"$lt": before}
+    return await db.stock_movements.find(
+        query, {"_id": 0}
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+
+
+async def _movement_total(db: AsyncIOMotorDatabase, match: Dict[str, Any]) -> Dict[str, float]:
+    totals = await db.stock_movements.aggregate([
+        {"$match": match},
+        {"$group": {
+            "_id": None,
+            "quantity": {"$sum": "$quantity"},
+            "consumed": {"$sum": {"$cond": [{"$lt": ["$quantity", 0]}, {"$multiply": ["$quantity", -1]}, 0]}},
+            "movements": {"$sum": 1}
+        }}
+    ]).to_list(1)
+    return totals[0] if totals else {"quantity": 0, "consumed": 0, "movements": 0}
+
+
+async def stock_at(db: AsyncIOMotorDatabase, item: Dict[str, Any], at: str) -> float:
+    """quantity_on_hand as of `at` (ISO timestamp): current quantity minus later movements"""
+    later = await _movement_total(db, {
+        "organization_id": item["organization_id"],
+        "item_id": item["id"],
+        "created_at": {"$gt": at}
+    })
+    return (item.get("quantity_on_hand") or 0) - later["quantity"]
+
+
+async def usage(db: AsyncIOMotorDatabase, item: Dict[str, Any], days: int) -> Dict[str, Any]:
+    """Consumption over the last `days` days and what it means for reordering"""
+    since = (datetime.now(timezone.utc) - timedelta(days=days)).isoformat()
+    totals = await _movement_total(db, {
+        "organization_id": item["organization_id"],
+        "item_id": item["id"],
+        "created_at": {"$gte": since}
+    })
+    daily = totals["consumed"] / days if days else 0
+    on_hand = item.get("quantity_on_hand") or 0
+    return {
+        "item_id": item["id"],
+        "days": days,
+        "consumed": totals["consumed"],
+        "net_change": totals["quantity"],
+        "movements": totals["movements"],
+        "average_daily_usage": round(daily, 3),
+        "days_of_cover": round(on_hand / daily, 1) if daily else None,
+        "lead_time_demand": round(daily * (item.get("lead_time_days") or 0), 3)
+    }
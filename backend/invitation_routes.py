@@ -5,6 +5,7 @@ from .permission_models import (
 )
 from .auth_utils import get_current_user
 from .email_service import EmailService
+from .email_outbox import outbox as email_outbox
 from datetime import datetime, timezone, timedelta
 from typing import Optional
 import uuid
@@ -136,16 +137,25 @@ async def create_invitation(
             org = await db.organizations.find_one({"id": current_user["organization_id"]})
             org_name = org.get("name") if org else "Your Organization"
             
-            email_sent = email_service.send_invitation_email(
-                to_email=invitation.email,
+            subject, html_content = email_service.render_invitation_email(
                 inviter_name=current_user.get("name", "A team member"),
                 organization_name=org_name,
                 invitation_token=invite.token,
                 frontend_url=frontend_url
             )
+            email_sent = await email_outbox.enqueue(
+                db,
+                to_emails=[invitation.email],
+                subject=subject,
+                html_content=html_content,
+                organization_id=current_user["organization_id"],
+                email_type="invitation",
+                from_email="noreply@opsplatform.com",
+                from_name="OpsPlatform"
+            ) is not None
             
             if email_sent:
-                print(f"✅ Invitation email sent to {invitation.email}")
+                print(f"✅ Invitation email queued for {invitation.email}")
         else:
             print(f"⚠️ SendGrid not configured. Email not sent to {invitation.email}")
     except Exception as e:
@@ -384,16 +394,25 @@ async def resend_invitation(
             org = await db.organizations.find_one({"id": current_user["organization_id"]})
             org_name = org.get("name") if org else "Your Organization"
             
-            email_sent = email_service.send_invitation_email(
-                to_email=invitation["email"],
+            subject, html_content = email_service.render_invitation_email(
                 inviter_name=current_user.get("name", "A team member"),
                 organization_name=org_name,
                 invitation_token=invitation["token"],
                 frontend_url=frontend_url
             )
+            email_sent = await email_outbox.enqueue(
+                db,
+                to_emails=[invitation["email"]],
+                subject=subject,
+                html_content=html_content,
+                organization_id=current_user["organization_id"],
+                email_type="invitation",
+                from_email="noreply@opsplatform.com",
+                from_name="OpsPlatform"
+            ) is not None
             
             if email_sent:
-                print(f"✅ Invitation resent to {invitation['email']}")
+                print(f"✅ Invitation resend queued for {invitation['email']}")
     except Exception as e:
         print(f"❌ Failed to resend invitation email: {str(e)}")
     
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Migration Script: embedded attachments → attachments index collection
+Adds an index row for every attachment embedded in tasks, inspection
+executions and checklist executions that doesn't have one yet. Safe to
+re-run.
+
+    python -m backend.migrate_attachments_index
+"""
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+
+from .attachment_index import RESOURCE_COLLECTIONS, build_entry
+
+BATCH_SIZE = 500
+
+
+async def migrate_attachments_index():
+    """Backfill the attachments collection from embedded attachment arrays"""
+    
+    # Connect to MongoDB
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'operational_platform')
+    
+    client = AsyncIOMotorClient(mongo_url)
+    db = client[db_name]
+    
+    print("="*80)
+    print("MIGRATION: embedded attachments → attachments index")
+    print("="*80)
+    
+    total_added = 0
+    
+    for resource_type, collection_name in RESOURCE_COLLECTIONS.items():
+        added = 0
+        batch = []
+        
+        cursor = db[collection_name].find(
+            {"attachments.0": {"$exists": True}},
+            {"_id": 0, "id": 1, "organization_id": 1, "attachments": 1,
+             "title": 1, "name": 1, "template_name": 1}
+        )
+        
+        async for resource in cursor:
+            indexed = {
+                doc["file_id"]: doc["count"]
+                async for doc in db.attachments.aggregate([
+                    {"$match": {"resource_type": resource_type, "resource_id": resource["id"]}},
+                    {"$group": {"_id": "$file_id", "count": {"$sum": 1}}},
+                    {"$project": {"_id": 0, "file_id": "$_id", "count": 1}}
+                ])
+            }
+            
+            for attachment in resource.get("attachments", []):
+                if not attachment.get("id"):
+                    continue
+                if indexed.get(attachment["id"], 0) > 0:
+                    indexed[attachment["id"]] -= 1
+                    continue
+                batch.append(build_entry(resource["organization_id"], resource_type, resource, attachment))
+            
+            if len(batch) >= BATCH_SIZE:
+                await db.attachments.insert_many(batch, ordered=False)
+                added += len(batch)
+                batch = []
+        
+        if batch:
+            await db.attachments.insert_many(batch, ordered=False)
+            added += len(batch)
+        
+        print(f"   {collection_name}: {added} attachments indexed")
+        total_added += added
+    
+    print(f"\n📊 Added {total_added} index rows")
+    print(f"   attachments collection: {await db.attachments.count_documents({})} records")
+    
+    client.close()
+
+
+if __name__ == "__main__":
+    print("\n🚀 Starting migration...\n")
+    asyncio.run(migrate_attachments_index())
+    print("\n✅ Migration script completed\n")
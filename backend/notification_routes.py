@@ -24,6 +24,7 @@ NOTIFICATION_TYPES = [
     "overdue",           # Task/inspection overdue
     "status_change",     # Status changed on watched item
     "group_added",       # Added to group
+    "low_stock",         # Inventory dropped below reorder point
     "system"             # System notifications
 ]
 
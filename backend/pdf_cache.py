@@ -0,0 +1,232 @@
+"""
+PDF Cache - Rendered inspection reports stored in GridFS
+
+A report is a pure function of the execution, its template and the
+generator code, so rendered PDFs are cached under
+
+    (execution_id, content_hash, generator_version)
+
+where content_hash is a SHA-256 over the canonical JSON of the execution
+and template. Amending an execution or editing its template changes the
+hash, and bumping GENERATOR_VERSION (any layout change) changes the version;
+either way the next export misses, re-renders, and replaces the execution's
+older cache entries. Nothing has to remember to invalidate.
+
+Only finished executions are cached; in-progress ones change on every
+answer and would only churn the cache.
+
+Hits, misses, render time and render time saved are accumulated per
+organization in pdf_render_stats (GET /api/inspections/pdf-cache/stats).
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket, AsyncIOMotorGridOut
+from pymongo.errors import DuplicateKeyError
+from bson import ObjectId
+from gridfs.errors import NoFile
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any
+import hashlib
+import json
+import time
+import logging
+
+from .gridfs_streaming import CHUNK_SIZE, open_grid_file
+from .pdf_generator_service import GENERATOR_VERSION
+from .pdf_render_pool import pdf_pool
+from .pdf_photos import fetch_report_photos
+
+logger = logging.getLogger(__name__)
+
+UNCACHED_STATUSES = ["in_progress"]
+
+
+def content_hash(execution: Dict[str, Any], template: Dict[str, Any]) -> str:
+    """SHA-256 over the canonical JSON of everything the report is built from"""
+    canonical = json.dumps(
+        {"execution": execution, "template": template},
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class PDFRenderCache:
+    """Serves inspection reports from GridFS, rendering and storing on a miss"""
+
+    async def lookup(
+        self,
+        db: AsyncIOMotorDatabase,
+        execution: Dict[str, Any],
+        template: Dict[str, Any]
+    ) -> Optional[AsyncIOMotorGridOut]:
+        """Open the cached report for this exact content, or None"""
+        if execution.get("status") in UNCACHED_STATUSES:
+            return None
+
+        entry = await db.pdf_render_cache.find_one(
+            {
+                "execution_id": execution["id"],
+                "content_hash": content_hash(execution, template),
+                "generator_version": GENERATOR_VERSION
+            },
+            {"_id": 0, "file_id": 1, "render_seconds": 1}
+        )
+        if not entry:
+            return None
+
+        grid_out = await open_grid_file(db, entry["file_id"])
+        if not grid_out:
+            # Blob went missing: drop the entry and render again
+            await db.pdf_render_cache.delete_one({"file_id": entry["file_id"]})
+            return None
+
+        await self._record(db, execution["organization_id"], hit=True, seconds=entry.get("render_seconds") or 0)
+        return grid_out
+
+    async def render(
+        self,
+        db: AsyncIOMotorDatabase,
+        execution: Dict[str, Any],
+        template: Dict[str, Any],
+        reject_when_busy: bool = True
+    ) -> bytes:
+        """Fetch its photos, render a report in the PDF pool and cache it; returns the PDF bytes"""
+        started = time.monotonic()
+        photos, failed_photos = await fetch_report_photos(db, execution)
+        pdf_bytes = await pdf_pool.render_inspection_report(
+            execution, template, photos, reject_when_busy=reject_when_busy
+        )
+        render_seconds = time.monotonic() - started
+
+        # A photo that failed to load (possibly a transient GridFS error) must not
+        # leave the degraded report cached under a hash that will never change.
+        # Photos excluded by policy are left out of every render, so they do not
+        # stop it being cached.
+        complete = not failed_photos
+        if not complete:
+            logger.warning(
+                f"Not caching PDF for execution {execution['id']}: "
+                f"{len(failed_photos)} photos could not be loaded"
+            )
+
+        if execution.get("status") not in UNCACHED_STATUSES:
+            if complete:
+                try:
+                    await self._store(db, execution, template, pdf_bytes, render_seconds)
+                except Exception as e:
+                    logger.warning(f"Could not cache PDF for execution {execution['id']}: {str(e)}")
+            await self._record(db, execution["organization_id"], hit=False, seconds=render_seconds)
+        return pdf_bytes
+
+    async def get_bytes(
+        self,
+        db: AsyncIOMotorDatabase,
+        execution: Dict[str, Any],
+        template: Dict[str, Any],
+        reject_when_busy: bool = True
+    ) -> bytes:
+        """Cached report bytes, rendering on a miss"""
+        grid_out = await self.lookup(db, execution, template)
+        if grid_out:
+            return await grid_out.read()
+        return await self.render(db, execution, template, reject_when_busy=reject_when_busy)
+
+    async def _store(
+        self,
+        db: AsyncIOMotorDatabase,
+        execution: Dict[str, Any],
+        template: Dict[str, Any],
+        pdf_bytes: bytes,
+        render_seconds: float
+    ):
+        fs = AsyncIOMotorGridFSBucket(db)
+        digest = content_hash(execution, template)
+        now = datetime.now(timezone.utc).isoformat()
+
+        file_id = await fs.upload_from_stream(
+            f"inspection_report_{execution['id']}.pdf",
+            pdf_bytes,
+            chunk_size_bytes=CHUNK_SIZE,
+            metadata={
+                "content_type": "application/pdf",
+                "organization_id": execution["organization_id"],
+                "pdf_cache": True,
+                "execution_id": execution["id"],
+                "size": len(pdf_bytes),
+                "uploaded_at": now
+            }
+        )
+
+        try:
+            await db.pdf_render_cache.insert_one({
+                "organization_id": execution["organization_id"],
+                "execution_id": execution["id"],
+                "content_hash": digest,
+                "generator_version": GENERATOR_VERSION,
+                "file_id": str(file_id),
+                "size": len(pdf_bytes),
+                "render_seconds": round(render_seconds, 3),
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            # Rendered concurrently by another request: keep theirs
+            await fs.delete(file_id)
+            return
+
+        await self.invalidate(db, execution["id"], keep_file_id=str(file_id))
+
+    async def invalidate(self, db: AsyncIOMotorDatabase, execution_id: str, keep_file_id: Optional[str] = None) -> int:
+        """Drop an execution's cached reports (except keep_file_id); returns how many"""
+        query: Dict[str, Any] = {"execution_id": execution_id}
+        if keep_file_id:
+            query["file_id"] = {"$ne": keep_file_id}
+
+        fs = AsyncIOMotorGridFSBucket(db)
+        removed = 0
+        async for entry in db.pdf_render_cache.find(query, {"_id": 0, "file_id": 1}):
+            await db.pdf_render_cache.delete_one({"file_id": entry["file_id"]})
+            try:
+                await fs.delete(ObjectId(entry["file_id"]))
+            except NoFile:
+                pass
+            removed += 1
+        return removed
+
+    async def _record(self, db: AsyncIOMotorDatabase, organization_id: str, hit: bool, seconds: float):
+        inc = {"hits": 1, "seconds_saved": seconds} if hit else {"misses": 1, "render_seconds": seconds}
+        await db.pdf_render_stats.update_one(
+            {"organization_id": organization_id},
+            {"$inc": inc, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}},
+            upsert=True
+        )
+
+    async def stats(self, db: AsyncIOMotorDatabase, organization_id: str) -> Dict[str, Any]:
+        """Hit rate, render time and render time saved for an organization"""
+        counters = await db.pdf_render_stats.find_one(
+            {"organization_id": organization_id},
+            {"_id": 0, "organization_id": 0}
+        ) or {}
+        hits = counters.get("hits", 0)
+        misses = counters.get("misses", 0)
+
+        usage = await db.pdf_render_cache.aggregate([
+            {"$match": {"organization_id": organization_id}},
+            {"$group": {"_id": None, "entries": {"$sum": 1}, "bytes": {"$sum": "$size"}}}
+        ]).to_list(1)
+        usage = usage[0] if usage else {"entries": 0, "bytes": 0}
+
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            "render_seconds": round(counters.get("render_seconds", 0), 1),
+            "seconds_saved": round(counters.get("seconds_saved", 0), 1),
+            "average_render_seconds": round(counters.get("render_seconds", 0) / misses, 3) if misses else None,
+            "entries": usage["entries"],
+            "stored_bytes": usage["bytes"],
+            "generator_version": GENERATOR_VERSION,
+            "updated_at": counters.get("updated_at")
+        }
+
+
+pdf_cache = PDFRenderCache()
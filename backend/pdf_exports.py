@@ -0,0 +1,451 @@
+"""
+PDF Exports - Bulk inspection report export jobs
+
+POST /api/inspections/exports stores a pdf_export_jobs document describing
+which executions to export and returns immediately. Background workers claim
+queued jobs with a renewable lease (same scheme as the bulk SMS sender) and
+write the output straight into GridFS:
+
+    zip - one PDF per inspection. Reports come from the PDF cache or render
+          in the PDF process pool with PDF_EXPORT_CONCURRENCY in flight; finished reports are appended to
+          the archive in order and flushed to GridFS immediately, so memory
+          is bounded by the number of reports in flight, not the job size.
+    pdf - every report in one document, rendered by a single pool worker
+          (a PDF cannot be assembled from independently rendered files
+          without a merge library). Limited to PDF_EXPORT_MAX_MERGED
+          inspections; photos are listed by count rather than embedded.
+
+Progress (processed / failed / total) is written after every report, so
+GET /api/inspections/exports/{job_id} can be polled while the job runs; the
+finished file is served by GET /api/inspections/exports/{job_id}/download.
+
+Job statuses: queued, running, completed, completed_with_errors, failed.
+A job whose worker died is reclaimed once its lease expires and restarted
+from scratch; the partial upload is removed first.
+"""
+from fastapi import HTTPException, status
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument
+from bson import ObjectId
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any
+from collections import deque
+import asyncio
+import os
+import uuid
+import zipfile
+import logging
+
+from .gridfs_streaming import CHUNK_SIZE
+from .pdf_render_pool import pdf_pool, PDF_WORKERS
+from .pdf_cache import pdf_cache
+
+logger = logging.getLogger(__name__)
+
+PDF_EXPORT_WORKERS = int(os.environ.get("PDF_EXPORT_WORKERS", "1"))
+PDF_EXPORT_CONCURRENCY = int(os.environ.get("PDF_EXPORT_CONCURRENCY", str(PDF_WORKERS)))
+PDF_EXPORT_MAX_INSPECTIONS = int(os.environ.get("PDF_EXPORT_MAX_INSPECTIONS", "2000"))
+PDF_EXPORT_MAX_MERGED = int(os.environ.get("PDF_EXPORT_MAX_MERGED", "300"))
+
+EXPORT_FORMATS = {
+    "zip": "application/zip",
+    "pdf": "application/pdf",
+}
+
+JOB_LEASE_SECONDS = 300
+POLL_INTERVAL_SECONDS = 5
+MAX_RECORDED_ERRORS = 50
+
+
+class _ZipSink:
+    """Write-only file object for ZipFile; buffered bytes are drained to GridFS
+
+    It has no seek(), so ZipFile writes data descriptors instead of going
+    back to patch local headers.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def build_query(organization_id: str, filters: Dict[str, Any]) -> Dict[str, Any]:
+    """Execution query for an export's filters (dates are inclusive days)"""
+    query: Dict[str, Any] = {"organization_id": organization_id}
+
+    if filters.get("execution_ids"):
+        query["id"] = {"$in": filters["execution_ids"]}
+    for field in ("template_id", "unit_id", "asset_id", "status"):
+        if filters.get(field):
+            query[field] = filters[field]
+
+    started = {}
+    if filters.get("started_from"):
+        started["$gte"] = filters["started_from"]
+    if filters.get("started_to"):
+        day_after = datetime.fromisoformat(filters["started_to"]) + timedelta(days=1)
+        started["$lt"] = day_after.date().isoformat()
+    if started:
+        query["started_at"] = started
+
+    return query
+
+
+class PDFExportRunner:
+    """Creates bulk PDF export jobs and runs them in background workers"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Start the export job workers"""
+        if self._workers:
+            return
+
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(PDF_EXPORT_WORKERS)
+        ]
+        logger.info(f"PDF export runner started with {PDF_EXPORT_WORKERS} job workers")
+
+    async def stop(self):
+        """Stop workers; running jobs are picked up again once their lease expires"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    # ==================== JOB CREATION ====================
+
+    async def create_job(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        filters: Dict[str, Any],
+        output_format: str,
+        created_by: str
+    ) -> Dict[str, Any]:
+        """Persist an export job for the executions matching filters; returns the job"""
+        total = await db.inspection_executions.count_documents(build_query(organization_id, filters))
+        limit = PDF_EXPORT_MAX_MERGED if output_format == "pdf" else PDF_EXPORT_MAX_INSPECTIONS
+        if total > limit:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Export matches {total} inspections; the limit for {output_format} exports is {limit}. Narrow the filters."
+            )
+        now = datetime.now(timezone.utc).isoformat()
+        timestamp = datetime.now(timezone.utc).strftime('%Y%m%d_%H%M%S')
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "organization_id": organization_id,
+            "filters": filters,
+            "format": output_format,
+            "filename": f"inspection_reports_{timestamp}.{output_format}",
+            "status": "queued" if total else "completed",
+            "total": total,
+            "processed": 0,
+            "failed": 0,
+            "errors": [],
+            "file_id": None,
+            "size": None,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "completed_at": None if total else now
+        }
+        await db.pdf_export_jobs.insert_one(job.copy())
+
+        self.wake()
+        return job
+
+    # ==================== WORKERS ====================
+
+    async def _worker_loop(self, index: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = await self._claim_job()
+                if job:
+                    await self._run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"PDF export worker {index} error: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _lease(self) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+    async def _claim_job(self) -> Optional[dict]:
+        """Atomically claim the oldest queued job (or one whose lease expired)"""
+        now = datetime.now(timezone.utc).isoformat()
+        return await self.db.pdf_export_jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "locked_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {"status": "running", "locked_by": self.worker_id, "locked_until": self._lease()}},
+            sort=[("created_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run_job(self, job: dict):
+        job_id = job["id"]
+        fs = AsyncIOMotorGridFSBucket(self.db)
+
+        # A previous worker died mid-upload: drop its orphaned chunks
+        if job.get("upload_id"):
+            await self.db["fs.chunks"].delete_many({"files_id": ObjectId(job["upload_id"])})
+
+        grid_in = fs.open_upload_stream(
+            job["filename"],
+            chunk_size_bytes=CHUNK_SIZE,
+            metadata={
+                "content_type": EXPORT_FORMATS[job["format"]],
+                "organization_id": job["organization_id"],
+                "export_job_id": job_id,
+                "uploaded_by": job["created_by"],
+                "uploaded_at": datetime.now(timezone.utc).isoformat()
+            }
+        )
+        await self.db.pdf_export_jobs.update_one(
+            {"id": job_id},
+            {"$set": {
+                "upload_id": str(grid_in._id),
+                "processed": 0,
+                "failed": 0,
+                "errors": [],
+                "started_at": datetime.now(timezone.utc).isoformat(),
+                "updated_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+
+        try:
+            if job["format"] == "zip":
+                rendered = await self._write_zip(job, grid_in)
+            else:
+                rendered = await self._write_merged(job, grid_in)
+        except asyncio.CancelledError:
+            await grid_in.abort()
+            raise
+        except _LeaseLost:
+            await grid_in.abort()
+            return
+        except Exception as e:
+            await grid_in.abort()
+            logger.error(f"PDF export job {job_id} failed: {str(e)}")
+            await self._finish_job(job_id, "failed", error=str(e))
+            return
+
+        if not rendered:
+            await grid_in.abort()
+            await self._finish_job(job_id, "failed", error="No reports could be rendered")
+            return
+
+        await grid_in.close()
+        current = await self.db.pdf_export_jobs.find_one({"id": job_id}, {"_id": 0, "failed": 1})
+        await self._finish_job(
+            job_id,
+            "completed_with_errors" if current and current.get("failed") else "completed",
+            file_id=str(grid_in._id),
+            size=grid_in.length
+        )
+
+    async def _executions(self, job: dict):
+        """Yield (execution, template) pairs for the job, oldest first"""
+        templates: Dict[str, Optional[dict]] = {}
+        cursor = self.db.inspection_executions.find(
+            build_query(job["organization_id"], job["filters"]),
+            {"_id": 0}
+        ).sort("started_at", 1).limit(PDF_EXPORT_MAX_INSPECTIONS)
+
+        async for execution in cursor:
+            template_id = execution.get("template_id")
+            if template_id not in templates:
+                templates[template_id] = await self.db.inspection_templates.find_one(
+                    {"id": template_id}, {"_id": 0}
+                )
+            yield execution, templates[template_id]
+
+    async def _write_zip(self, job: dict, grid_in) -> int:
+        """Render reports concurrently and append them to a ZIP in GridFS"""
+        sink = _ZipSink()
+        archive = zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED)
+        names = set()
+        inflight: deque = deque()
+        rendered = 0
+
+        async def render(execution: dict, template: Optional[dict]) -> bytes:
+            if not template:
+                raise ValueError("Template not found")
+            return await pdf_cache.get_bytes(self.db, execution, template, reject_when_busy=False)
+
+        async def complete_oldest():
+            nonlocal rendered
+            execution, task = inflight.popleft()
+            try:
+                pdf_bytes = await task
+            except Exception as e:
+                await self._record_progress(job["id"], execution["id"], error=str(e) or e.__class__.__name__)
+                return
+
+            name = self._entry_name(execution, names)
+            archive.writestr(name, pdf_bytes)
+            await grid_in.write(sink.drain())
+            rendered += 1
+            await self._record_progress(job["id"], execution["id"])
+
+        try:
+            async for execution, template in self._executions(job):
+                inflight.append((execution, asyncio.create_task(render(execution, template))))
+                if len(inflight) >= PDF_EXPORT_CONCURRENCY:
+                    await complete_oldest()
+            while inflight:
+                await complete_oldest()
+        finally:
+            for _, task in inflight:
+                task.cancel()
+
+        archive.close()
+        await grid_in.write(sink.drain())
+        return rendered
+
+    async def _write_merged(self, job: dict, grid_in) -> int:
+        """Render every report into one PDF in a single pool worker"""
+        reports = []
+        async for execution, template in self._executions(job):
+            if len(reports) >= PDF_EXPORT_MAX_MERGED:
+                break
+            if not template:
+                await self._record_progress(job["id"], execution["id"], error="Template not found")
+                continue
+            reports.append((execution, template))
+
+        if not reports:
+            return 0
+
+        # One long render: keep the lease alive while it runs
+        render = asyncio.create_task(pdf_pool.render_combined_report(reports))
+        try:
+            while not render.done():
+                await asyncio.wait({render}, timeout=JOB_LEASE_SECONDS / 3)
+                if not render.done():
+                    await self._renew_lease(job["id"])
+        finally:
+            if not render.done():
+                render.cancel()
+
+        pdf_bytes = render.result()
+        for offset in range(0, len(pdf_bytes), CHUNK_SIZE):
+            await grid_in.write(pdf_bytes[offset:offset + CHUNK_SIZE])
+
+        await self.db.pdf_export_jobs.update_one(
+            {"id": job["id"]},
+            {"$inc": {"processed": len(reports)}, "$set": {"updated_at": datetime.now(timezone.utc).isoformat()}}
+        )
+        return len(reports)
+
+    @staticmethod
+    def _entry_name(execution: dict, names: set) -> str:
+        """Readable, unique file name for a report inside the archive"""
+        parts = [
+            (execution.get("started_at") or "")[:10],
+            execution.get("template_name") or "inspection",
+            execution.get("unit_name") or execution.get("asset_name") or "",
+            execution["id"][:8]
+        ]
+        stem = "_".join(p for p in parts if p)
+        stem = "".join(c if c.isalnum() or c in "-_" else "_" for c in stem)
+        name = f"{stem}.pdf"
+        suffix = 1
+        while name in names:
+            suffix += 1
+            name = f"{stem}_{suffix}.pdf"
+        names.add(name)
+        return name
+
+    async def _record_progress(self, job_id: str, execution_id: str, error: Optional[str] = None):
+        """Count one report as processed (or failed) and renew the lease"""
+        now = datetime.now(timezone.utc).isoformat()
+        update: Dict[str, Any] = {
+            "$inc": {"processed": 1},
+            "$set": {"updated_at": now, "locked_until": self._lease()}
+        }
+        if error:
+            update["$inc"]["failed"] = 1
+            update["$push"] = {"errors": {
+                "$each": [{"execution_id": execution_id, "error": error}],
+                "$slice": MAX_RECORDED_ERRORS
+            }}
+
+        result = await self.db.pdf_export_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            update
+        )
+        if not result.matched_count:
+            raise _LeaseLost(job_id)
+
+    async def _renew_lease(self, job_id: str):
+        result = await self.db.pdf_export_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            {"$set": {"locked_until": self._lease()}}
+        )
+        if not result.matched_count:
+            raise _LeaseLost(job_id)
+
+    async def _finish_job(self, job_id: str, status: str, error: Optional[str] = None, **fields):
+        """Record the final status and release the lease"""
+        now = datetime.now(timezone.utc).isoformat()
+        update = {"status": status, "completed_at": now, "updated_at": now, **fields}
+        if error:
+            update["error"] = error
+
+        await self.db.pdf_export_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            {"$set": update, "$unset": {"locked_by": "", "locked_until": "", "upload_id": ""}}
+        )
+        logger.info(f"PDF export job {job_id} finished: {status}")
+
+
+class _LeaseLost(Exception):
+    """Another worker took over the job"""
+
+
+# Process-wide runner (started from server startup)
+exporter = PDFExportRunner()
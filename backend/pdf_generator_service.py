@@ -4,7 +4,7 @@ Generates professional inspection reports with photos, charts, and tables
 """
 
 from io import BytesIO
-from typing import List, Optional
+from typing import List, Optional, Tuple, Dict
 from datetime import datetime
 from pathlib import Path
 
@@ -14,12 +14,43 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.platypus import (
     SimpleDocTemplate, Table, TableStyle, Paragraph, 
-    Spacer, Image, PageBreak, KeepTogether, PageTemplate, Frame
+    Spacer, Image, PageBreak, KeepTogether, PageTemplate, Frame, Flowable
 )
+from reportlab.lib.utils import ImageReader
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
 from reportlab.graphics.shapes import Drawing
 from reportlab.graphics.charts.barcharts import VerticalBarChart
 
+# Bump whenever report output changes (layout, styles, content); cached
+# PDFs rendered by an older version are then re-rendered on next export
+GENERATOR_VERSION = 2
+
+# Prepared photos: {photo_id: (jpeg_bytes, width_px, height_px)}
+PhotoMap = Dict[str, Tuple[bytes, int, int]]
+
+# Photo evidence grid: two photos per row
+PHOTO_COLUMNS = 2
+PHOTO_MAX_WIDTH = 3.2*inch
+PHOTO_MAX_HEIGHT = 2.6*inch
+
+
+class PhotoFlowable(Flowable):
+    """Draws a shared ImageReader, so a photo is decoded once per report
+    no matter how many times it appears (and embedded once, since ReportLab
+    reuses the XObject for identical image data)"""
+    
+    def __init__(self, reader: ImageReader, width: float, height: float):
+        super().__init__()
+        self.reader = reader
+        self.width = width
+        self.height = height
+        
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+        
+    def draw(self):
+        self.canv.drawImage(self.reader, 0, 0, self.width, self.height)
+
 
 class InspectionPDFGenerator:
     """Service for generating inspection report PDFs"""
@@ -66,6 +97,7 @@ class InspectionPDFGenerator:
         self,
         execution_data: dict,
         template_data: dict,
+        photos: Optional[PhotoMap] = None,
     ) -> BytesIO:
         """
         Generate inspection report PDF
@@ -73,14 +105,45 @@ class InspectionPDFGenerator:
         Args:
             execution_data: Inspection execution dict
             template_data: Inspection template dict
+            photos: Print-sized photos by GridFS id (see pdf_photos);
+                without them, photo counts are listed instead
+            
+        Returns:
+            BytesIO containing PDF data
+        """
+        buffer = BytesIO()
+        doc = self._create_document(buffer)
+        doc.build(self._build_report_story(execution_data, template_data, photos))
+        buffer.seek(0)
+        return buffer
+        
+    def generate_combined_report(self, reports: List[Tuple[dict, dict]]) -> BytesIO:
+        """
+        Generate one PDF containing several inspection reports
+        
+        Args:
+            reports: (execution_data, template_data) pairs, one report each,
+                every report starting on a new page
             
         Returns:
             BytesIO containing PDF data
         """
         buffer = BytesIO()
+        doc = self._create_document(buffer)
+        
+        story = []
+        for idx, (execution_data, template_data) in enumerate(reports):
+            if idx:
+                story.append(PageBreak())
+            story.extend(self._build_report_story(execution_data, template_data))
+        
+        doc.build(story)
+        buffer.seek(0)
+        return buffer
         
-        # Create document
-        doc = SimpleDocTemplate(
+    def _create_document(self, buffer: BytesIO) -> SimpleDocTemplate:
+        """Create the report document with standard margins"""
+        return SimpleDocTemplate(
             buffer,
             pagesize=self.page_size,
             rightMargin=0.75*inch,
@@ -89,7 +152,13 @@ class InspectionPDFGenerator:
             bottomMargin=0.75*inch,
         )
         
-        # Build content
+    def _build_report_story(
+        self,
+        execution_data: dict,
+        template_data: dict,
+        photos: Optional[PhotoMap] = None
+    ) -> List:
+        """Build the flowables for one inspection report"""
         story = []
         
         # Header
@@ -103,6 +172,12 @@ class InspectionPDFGenerator:
         # Questions and answers
         story.extend(self._create_questions_section(execution_data, template_data))
         
+        # Photo evidence
+        photo_section = self._create_photos_section(execution_data, template_data, photos)
+        if photo_section:
+            story.append(Spacer(1, 0.3*inch))
+            story.extend(photo_section)
+        
         # Findings
         if execution_data.get('findings'):
             story.append(Spacer(1, 0.3*inch))
@@ -113,10 +188,7 @@ class InspectionPDFGenerator:
             story.append(Spacer(1, 0.3*inch))
             story.extend(self._create_summary_section(execution_data))
         
-        # Build PDF
-        doc.build(story)
-        buffer.seek(0)
-        return buffer
+        return story
         
     def _create_header(self, execution_data: dict, template_data: dict) -> List:
         """Create report header"""
@@ -243,6 +315,67 @@ class InspectionPDFGenerator:
         elements.append(table)
         return elements
         
+    def _create_photos_section(
+        self,
+        execution_data: dict,
+        template_data: dict,
+        photos: Optional[PhotoMap]
+    ) -> List:
+        """Create photo evidence section, grouped by question"""
+        answers_dict = {a['question_id']: a for a in execution_data.get('answers', [])}
+        readers = {}
+        elements = []
+        
+        for idx, question in enumerate(template_data.get('questions', []), 1):
+            photo_ids = answers_dict.get(question['id'], {}).get('photo_ids') or []
+            if not photo_ids:
+                continue
+            
+            label = Paragraph(f"<b>{idx}.</b> {question.get('question_text', '')}", self.styles['Normal'])
+            
+            if photos is None:
+                elements.append(label)
+                elements.append(Paragraph(f"{len(photo_ids)} photo(s) attached", self.styles['Normal']))
+                elements.append(Spacer(1, 0.1*inch))
+                continue
+            
+            cells = []
+            for photo_id in photo_ids:
+                if photo_id not in photos:
+                    continue
+                if photo_id not in readers:
+                    readers[photo_id] = ImageReader(BytesIO(photos[photo_id][0]))
+                _, width_px, height_px = photos[photo_id]
+                scale = min(PHOTO_MAX_WIDTH / width_px, PHOTO_MAX_HEIGHT / height_px)
+                cells.append(PhotoFlowable(readers[photo_id], width_px * scale, height_px * scale))
+            
+            missing = len(photo_ids) - len(cells)
+            if not cells and not missing:
+                continue
+            
+            block = [label, Spacer(1, 0.05*inch)]
+            if cells:
+                rows = [cells[i:i + PHOTO_COLUMNS] for i in range(0, len(cells), PHOTO_COLUMNS)]
+                rows[-1] += [''] * (PHOTO_COLUMNS - len(rows[-1]))
+                grid = Table(rows, colWidths=[PHOTO_MAX_WIDTH + 0.1*inch] * PHOTO_COLUMNS)
+                grid.setStyle(TableStyle([
+                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                    ('PADDING', (0, 0), (-1, -1), 3),
+                ]))
+                block.append(grid)
+            if missing:
+                block.append(Paragraph(f"{missing} photo(s) could not be included", self.styles['Normal']))
+            
+            # Keep the question label with (at least the first row of) its photos
+            elements.append(KeepTogether(block[:3]))
+            elements.extend(block[3:])
+            elements.append(Spacer(1, 0.15*inch))
+        
+        if elements:
+            elements.insert(0, Paragraph('Photo Evidence', self.styles['SectionHeading']))
+        return elements
+        
     def _create_findings_section(self, execution_data: dict) -> List:
         """Create findings section"""
         elements = []
@@ -0,0 +1,132 @@
+"""
+PDF Photos - Inspection photos prepared for embedding in reports
+
+Two halves:
+
+fetch_report_photos (API process, async)
+    Collects the GridFS photo ids referenced by an execution's answers and
+    reads them concurrently (PDF_PHOTO_FETCH_CONCURRENCY at a time). The
+    1024px JPEG rendition from the photo derivative pipeline is used when it
+    exists, so most photos arrive already close to print size. Photos left
+    out by policy (missing, another organization's, not an image, original
+    over PDF_PHOTO_MAX_SOURCE) are told apart from photos that failed to
+    load, so a report missing only the former can still be cached.
+
+prepare_photos (PDF worker process, Pillow)
+    Decodes each photo once, applies EXIF orientation and downscales it to
+    print resolution (PDF_PHOTO_MAX_PX on the long edge, ~200 DPI at the
+    report's photo width), re-encoding as JPEG. The result is keyed by photo
+    id, so a photo referenced by several answers is decoded once and -
+    because ReportLab embeds identical image data as one XObject - stored in
+    the PDF once.
+
+Full-resolution camera images embedded as-is make reports tens of MB and
+slow to build; see scripts/benchmark_pdf_photos.py.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
+import io
+import os
+import logging
+
+from .gridfs_streaming import open_grid_file
+
+logger = logging.getLogger(__name__)
+
+PDF_PHOTO_MAX_PX = int(os.environ.get("PDF_PHOTO_MAX_PX", "600"))
+PDF_PHOTO_QUALITY = int(os.environ.get("PDF_PHOTO_QUALITY", "80"))
+PDF_PHOTO_FETCH_CONCURRENCY = int(os.environ.get("PDF_PHOTO_FETCH_CONCURRENCY", "8"))
+
+# Originals larger than this are left out of the report
+PDF_PHOTO_MAX_SOURCE = int(os.environ.get("PDF_PHOTO_MAX_SOURCE", str(25 * 1024 * 1024)))
+
+# Rendition used in place of the original when available
+PDF_PHOTO_RENDITION = ("medium", "jpeg")
+
+
+def referenced_photo_ids(execution: Dict[str, Any]) -> List[str]:
+    """Photo ids in answer order, without duplicates"""
+    photo_ids: Dict[str, None] = {}
+    for answer in execution.get("answers", []):
+        for photo_id in answer.get("photo_ids") or []:
+            photo_ids[photo_id] = None
+    return list(photo_ids)
+
+
+async def _fetch_photo(db: AsyncIOMotorDatabase, photo_id: str, organization_id: str) -> Optional[bytes]:
+    """Photo bytes, or None when the photo is excluded by policy; load errors raise"""
+    grid_out = await open_grid_file(db, photo_id)
+    if not grid_out:
+        return None
+
+    metadata = grid_out.metadata or {}
+    if metadata.get("organization_id") not in (None, organization_id):
+        return None
+    if not (metadata.get("content_type") or "image/").startswith("image/"):
+        return None
+
+    rendition, fmt = PDF_PHOTO_RENDITION
+    derivative_id = ((metadata.get("derivatives") or {}).get(rendition) or {}).get(fmt)
+    if derivative_id:
+        derivative = await open_grid_file(db, derivative_id)
+        if derivative:
+            return await derivative.read()
+
+    if grid_out.length > PDF_PHOTO_MAX_SOURCE:
+        return None
+    return await grid_out.read()
+
+
+async def fetch_report_photos(
+    db: AsyncIOMotorDatabase,
+    execution: Dict[str, Any]
+) -> Tuple[Dict[str, bytes], List[str]]:
+    """Read every photo an execution references from GridFS, concurrently
+
+    Returns ({photo_id: bytes}, failed photo ids). Photos excluded by policy
+    are in neither.
+    """
+    photo_ids = referenced_photo_ids(execution)
+    if not photo_ids:
+        return {}, []
+
+    semaphore = asyncio.Semaphore(PDF_PHOTO_FETCH_CONCURRENCY)
+
+    async def fetch(photo_id: str) -> Tuple[str, Optional[bytes], bool]:
+        async with semaphore:
+            try:
+                return photo_id, await _fetch_photo(db, photo_id, execution["organization_id"]), False
+            except Exception as e:
+                logger.warning(f"Could not load photo {photo_id} for report {execution.get('id')}: {str(e)}")
+                return photo_id, None, True
+
+    results = await asyncio.gather(*(fetch(photo_id) for photo_id in photo_ids))
+    photos = {photo_id: data for photo_id, data, _ in results if data}
+    failed = [photo_id for photo_id, _, load_failed in results if load_failed]
+    return photos, failed
+
+
+def prepare_photos(photos: Dict[str, bytes]) -> Dict[str, Tuple[bytes, int, int]]:
+    """Downscale photos to print size; returns {photo_id: (jpeg_bytes, width, height)}
+
+    Runs in the PDF worker. Photos Pillow cannot decode are dropped.
+    """
+    from PIL import Image, ImageOps
+
+    prepared: Dict[str, Tuple[bytes, int, int]] = {}
+    for photo_id, data in photos.items():
+        try:
+            with Image.open(io.BytesIO(data)) as source:
+                source.draft("RGB", (PDF_PHOTO_MAX_PX, PDF_PHOTO_MAX_PX))
+                image = ImageOps.exif_transpose(source)
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            image.thumbnail((PDF_PHOTO_MAX_PX, PDF_PHOTO_MAX_PX), Image.Resampling.LANCZOS)
+
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=PDF_PHOTO_QUALITY, optimize=True)
+            prepared[photo_id] = (buffer.getvalue(), image.width, image.height)
+        except Exception as e:
+            logger.warning(f"Skipping undecodable photo {photo_id}: {str(e)}")
+    return prepared
@@ -0,0 +1,193 @@
+"""
+PDF Render Pool - Inspection report rendering off the event loop
+
+ReportLab is pure Python and CPU bound: a long report with photos holds the
+GIL for seconds, so rendering it inside an async handler (or a thread) stalls
+every other request on the worker. Reports are rendered in a
+ProcessPoolExecutor instead. Each worker process builds one
+InspectionPDFGenerator when it starts (ReportLab imports, sample stylesheet
+and custom styles) and reuses it for every report it renders.
+
+Concurrency is capped per API process: at most PDF_WORKERS reports render at
+once, and at most PDF_MAX_QUEUED more wait for a slot. Beyond that, exports
+are refused with 503 + Retry-After rather than piling up behind each other
+and holding connections and memory. A render that times out keeps its slot
+until its worker process is actually done with it.
+"""
+from fastapi import HTTPException, status
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Dict, Any, Iterator, List, Tuple
+import asyncio
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", "2"))
+PDF_MAX_QUEUED = int(os.environ.get("PDF_MAX_QUEUED", "8"))
+PDF_RENDER_TIMEOUT = float(os.environ.get("PDF_RENDER_TIMEOUT", "120"))
+
+# Response bodies are written in slices this size
+PDF_STREAM_CHUNK_SIZE = 64 * 1024
+
+# ==================== WORKER PROCESS ====================
+
+_generator = None
+
+
+def _init_worker():
+    """Build the worker's generator once, before it takes any work"""
+    global _generator
+    from .pdf_generator_service import InspectionPDFGenerator
+    _generator = InspectionPDFGenerator()
+
+
+def _warm() -> int:
+    return os.getpid()
+
+
+def _render_inspection_report(
+    execution_data: Dict[str, Any],
+    template_data: Dict[str, Any],
+    photos: Optional[Dict[str, bytes]] = None
+) -> bytes:
+    from .pdf_photos import prepare_photos
+
+    buffer = _generator.generate_inspection_report(
+        execution_data=execution_data,
+        template_data=template_data,
+        photos=prepare_photos(photos) if photos is not None else None
+    )
+    return buffer.getvalue()
+
+
+def _render_combined_report(reports: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> bytes:
+    return _generator.generate_combined_report(reports).getvalue()
+
+
+# ==================== API PROCESS ====================
+
+def iter_pdf(pdf_bytes: bytes) -> Iterator[bytes]:
+    """Slice rendered PDF bytes for a StreamingResponse"""
+    view = memoryview(pdf_bytes)
+    for offset in range(0, len(view), PDF_STREAM_CHUNK_SIZE):
+        yield bytes(view[offset:offset + PDF_STREAM_CHUNK_SIZE])
+
+
+class PDFRenderPool:
+    """Process pool of warmed report generators with bounded concurrency"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._waiting = 0
+
+    async def start(self):
+        """Start the worker processes and build their generators up front"""
+        if self._pool is not None:
+            return
+
+        self._pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, initializer=_init_worker)
+        self._slots = asyncio.Semaphore(PDF_WORKERS)
+
+        # One no-op per worker forces every process (and its generator) to
+        # exist before the first export arrives
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(*[
+                loop.run_in_executor(self._pool, _warm) for _ in range(PDF_WORKERS)
+            ])
+            logger.info(f"PDF render pool started with {len(set(pids))} warmed workers")
+        except Exception as e:
+            logger.error(f"PDF render pool failed to warm up: {str(e)}")
+
+    async def stop(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _run(
+        self,
+        func,
+        *args,
+        reject_when_busy: bool = True,
+        timeout: Optional[float] = PDF_RENDER_TIMEOUT
+    ) -> bytes:
+        if self._pool is None:
+            await self.start()
+
+        if reject_when_busy and self._waiting >= PDF_WORKERS + PDF_MAX_QUEUED:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Too many PDF exports in progress. Please retry shortly.",
+                headers={"Retry-After": "10"}
+            )
+
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            self._waiting -= 1
+            raise
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._pool, func, *args)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=timeout)
+        except BaseException as e:
+            if future.done():
+                self._release()
+            else:
+                # A worker process cannot be interrupted mid-render: it keeps
+                # its slot until the render actually ends, so timeouts never
+                # let more than PDF_WORKERS renders run at once
+                if isinstance(e, asyncio.TimeoutError):
+                    logger.warning(f"PDF render exceeded {timeout}s; its worker stays busy until it finishes")
+                future.add_done_callback(self._release_abandoned)
+            raise
+
+        self._release()
+        return result
+
+    def _release(self):
+        self._slots.release()
+        self._waiting -= 1
+
+    def _release_abandoned(self, future: asyncio.Future):
+        """Free the slot of a render nobody waits for any more, once its worker is done"""
+        if not future.cancelled() and future.exception():
+            logger.warning(f"Abandoned PDF render failed: {future.exception()}")
+        self._release()
+
+    async def render_inspection_report(
+        self,
+        execution_data: Dict[str, Any],
+        template_data: Dict[str, Any],
+        photos: Optional[Dict[str, bytes]] = None,
+        reject_when_busy: bool = True
+    ) -> bytes:
+        """Render an inspection report in a worker process; returns the PDF bytes
+
+        photos are raw image bytes by GridFS id (pdf_photos.fetch_report_photos);
+        the worker downscales them before embedding. Background jobs pass
+        reject_when_busy=False to wait for a slot instead of getting a 503.
+        """
+        return await self._run(
+            _render_inspection_report, execution_data, template_data, photos,
+            reject_when_busy=reject_when_busy
+        )
+
+    async def render_combined_report(self, reports: List[Tuple[Dict[str, Any], Dict[str, Any]]]) -> bytes:
+        """Render several inspection reports into one PDF
+
+        Waits for a slot, and the render timeout scales with the number of
+        reports.
+        """
+        return await self._run(
+            _render_combined_report, reports,
+            reject_when_busy=False,
+            timeout=PDF_RENDER_TIMEOUT * max(len(reports) / 10, 1)
+        )
+
+
+pdf_pool = PDFRenderPool()
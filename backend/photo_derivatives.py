@@ -0,0 +1,253 @@
+"""
+Photo Derivatives - Thumbnail and medium renditions for inspection photos
+
+After an inspection photo is uploaded, a background task reads it back from
+GridFS and renders every rendition (RENDITIONS x DERIVATIVE_FORMATS) in a
+process pool, so Pillow's decode/resize/encode work never runs on the event
+loop. Each rendition is stored as its own GridFS file with
+metadata.derivative_of pointing at the original, and the original's
+metadata records them:
+
+    metadata.derivative_status  pending | ready | failed | skipped
+    metadata.derivatives        {"thumb": {"webp": "<file_id>", "jpeg": "<file_id>"},
+                                 "medium": {...}}
+
+GET /api/inspections/photos/{file_id}?size=thumb|medium serves a rendition
+(WebP when the client accepts it, JPEG otherwise). Photos uploaded before
+the pipeline existed, or whose background run was lost to a restart, get
+their renditions generated on first request.
+
+Sources that are not images, or larger than PHOTO_DERIVATIVE_MAX_SOURCE, are
+marked skipped and served at full size.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from concurrent.futures import ProcessPoolExecutor
+from bson import ObjectId
+from typing import Optional, Dict, Any, Tuple
+from datetime import datetime, timezone
+import asyncio
+import io
+import os
+import logging
+
+from .gridfs_streaming import CHUNK_SIZE, open_grid_file
+
+logger = logging.getLogger(__name__)
+
+# Longest edge in pixels for each rendition
+RENDITIONS = {
+    "thumb": 256,
+    "medium": 1024,
+}
+
+# format -> (Pillow format, content type, save options)
+DERIVATIVE_FORMATS = {
+    "webp": ("WEBP", "image/webp", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", "image/jpeg", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+PHOTO_WORKERS = int(os.environ.get("PHOTO_WORKERS", "2"))
+PHOTO_DERIVATIVE_MAX_SOURCE = int(os.environ.get("PHOTO_DERIVATIVE_MAX_SOURCE", str(40 * 1024 * 1024)))
+
+
+def _render_derivatives(data: bytes) -> Dict[str, Dict[str, bytes]]:
+    """Render every rendition of an image (runs in a worker process)
+
+    Returns {rendition: {format: encoded bytes}}. Raises for data Pillow
+    cannot decode.
+    """
+    from PIL import Image, ImageOps
+
+    largest = max(RENDITIONS.values())
+    with Image.open(io.BytesIO(data)) as source:
+        # Let the JPEG decoder downscale by a power of two while decoding;
+        # far cheaper than decoding a full 12MP frame and resizing it
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+    results: Dict[str, Dict[str, bytes]] = {}
+    # Largest first so each smaller rendition is resized from the previous one
+    for rendition, edge in sorted(RENDITIONS.items(), key=lambda item: -item[1]):
+        image = image.copy()
+        image.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        results[rendition] = {}
+        for fmt, (pil_format, _, options) in DERIVATIVE_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, pil_format, **options)
+            results[rendition][fmt] = buffer.getvalue()
+    return results
+
+
+def pick_format(accept_header: Optional[str]) -> str:
+    """WebP when the client advertises it, otherwise JPEG"""
+    return "webp" if accept_header and "image/webp" in accept_header else "jpeg"
+
+
+class PhotoDerivatives:
+    """Generates photo renditions in a process pool and stores them in GridFS"""
+
+    def __init__(self):
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        # file_id -> running generation task, so a request for a rendition
+        # joins the background run instead of starting a second one
+        self._inflight: Dict[str, asyncio.Task] = {}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=PHOTO_WORKERS)
+            # Bounds the number of source images held in memory at once
+            self._semaphore = asyncio.Semaphore(PHOTO_WORKERS * 2)
+            logger.info(f"Photo derivative pool started with {PHOTO_WORKERS} workers")
+        return self._pool
+
+    async def stop(self):
+        """Cancel queued generations and shut the process pool down"""
+        tasks = list(self._inflight.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self._inflight.clear()
+
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    # ==================== SCHEDULING ====================
+
+    def schedule(self, db: AsyncIOMotorDatabase, file_id: str) -> asyncio.Task:
+        """Start generating renditions for an uploaded photo in the background"""
+        task = self._inflight.get(file_id)
+        if task is None:
+            task = asyncio.create_task(self._generate(db, file_id))
+            self._inflight[file_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(file_id, None))
+        return task
+
+    async def ensure(self, db: AsyncIOMotorDatabase, file_id: str) -> Dict[str, Any]:
+        """Return the photo's renditions, generating them now if needed
+
+        Returns the derivatives map; empty when the photo was skipped or
+        generation failed.
+        """
+        try:
+            return await asyncio.shield(self.schedule(db, file_id))
+        except Exception as e:
+            logger.error(f"Photo derivative generation failed for {file_id}: {str(e)}")
+            return {}
+
+    # ==================== GENERATION ====================
+
+    async def _generate(self, db: AsyncIOMotorDatabase, file_id: str) -> Dict[str, Any]:
+        grid_out = await open_grid_file(db, file_id)
+        if not grid_out:
+            return {}
+
+        metadata = grid_out.metadata or {}
+        if metadata.get("derivative_status") == "ready":
+            return metadata.get("derivatives") or {}
+
+        content_type = metadata.get("content_type") or ""
+        if not content_type.startswith("image/") or grid_out.length > PHOTO_DERIVATIVE_MAX_SOURCE:
+            await self._set_status(db, grid_out._id, "skipped")
+            return {}
+
+        self._get_pool()
+        async with self._semaphore:
+            data = await grid_out.read()
+            try:
+                loop = asyncio.get_running_loop()
+                rendered = await loop.run_in_executor(self._pool, _render_derivatives, data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Could not render derivatives for photo {file_id}: {str(e)}")
+                await self._set_status(db, grid_out._id, "failed", error=str(e))
+                return {}
+            finally:
+                del data
+
+        derivatives = await self._store(db, grid_out._id, metadata, rendered)
+        await self._set_status(db, grid_out._id, "ready", derivatives=derivatives)
+        logger.info(f"Generated {sum(len(f) for f in derivatives.values())} derivatives for photo {file_id}")
+        return derivatives
+
+    async def _store(
+        self,
+        db: AsyncIOMotorDatabase,
+        original_id: ObjectId,
+        original_metadata: Dict[str, Any],
+        rendered: Dict[str, Dict[str, bytes]]
+    ) -> Dict[str, Dict[str, str]]:
+        fs = AsyncIOMotorGridFSBucket(db)
+        derivatives: Dict[str, Dict[str, str]] = {}
+
+        for rendition, encoded in rendered.items():
+            derivatives[rendition] = {}
+            for fmt, data in encoded.items():
+                _, content_type, _ = DERIVATIVE_FORMATS[fmt]
+                derivative_id = await fs.upload_from_stream(
+                    f"{original_id}_{rendition}.{fmt}",
+                    data,
+                    chunk_size_bytes=CHUNK_SIZE,
+                    metadata={
+                        "content_type": content_type,
+                        "derivative_of": str(original_id),
+                        "rendition": rendition,
+                        "format": fmt,
+                        "size": len(data),
+                        "organization_id": original_metadata.get("organization_id"),
+                        "uploaded_at": datetime.now(timezone.utc).isoformat(),
+                    }
+                )
+                derivatives[rendition][fmt] = str(derivative_id)
+        return derivatives
+
+    async def _set_status(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: ObjectId,
+        derivative_status: str,
+        derivatives: Optional[Dict[str, Dict[str, str]]] = None,
+        error: Optional[str] = None
+    ):
+        update: Dict[str, Any] = {"metadata.derivative_status": derivative_status}
+        if derivatives is not None:
+            update["metadata.derivatives"] = derivatives
+        if error is not None:
+            update["metadata.derivative_error"] = error
+        await db["fs.files"].update_one({"_id": file_id}, {"$set": update})
+
+    # ==================== LOOKUP ====================
+
+    async def resolve(
+        self,
+        db: AsyncIOMotorDatabase,
+        file_id: str,
+        metadata: Dict[str, Any],
+        rendition: str,
+        accept_header: Optional[str]
+    ) -> Optional[Tuple[str, str]]:
+        """Pick the stored rendition to serve; returns (derivative_id, format)
+
+        None means the original should be served (not an image, too large,
+        or rendering failed).
+        """
+        if metadata.get("derivative_status") in ("skipped", "failed"):
+            return None
+
+        derivatives = metadata.get("derivatives") or {}
+        if rendition not in derivatives:
+            derivatives = await self.ensure(db, file_id)
+
+        formats = derivatives.get(rendition) or {}
+        fmt = pick_format(accept_header)
+        if fmt not in formats:
+            fmt = next(iter(formats), None)
+        return (formats[fmt], fmt) if fmt else None
+
+
+derivatives = PhotoDerivatives()
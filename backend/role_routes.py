@@ -5,6 +5,7 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List, Optional
 from .auth_utils import get_current_user
 from .role_models import Role, RoleCreate, RoleUpdate, ExtendedRole, ExtendedRoleCreate
+from .workflow_engine import get_workflow_engine
 from datetime import datetime, timezone
 
 router = APIRouter(prefix="/roles", tags=["Roles"])
@@ -217,6 +218,8 @@ async def update_role(
         {"$set": update_data}
     )
     
+    get_workflow_engine(db).invalidate_roles(current_user["organization_id"])
+    
     return {"message": "Role updated successfully"}
 
 
@@ -257,6 +260,8 @@ async def delete_role(
     
     await db.roles.delete_one({"id": role_id})
     
+    get_workflow_engine(db).invalidate_roles(current_user["organization_id"])
+    
     return {"message": "Role deleted successfully"}
 
 
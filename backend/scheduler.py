@@ -1,161 +1,402 @@
 """
 Background Task Scheduler for Workflow Escalations and Maintenance
+
+Every worker process calls start_scheduler(), but only the process holding
+the leader lease (scheduler_locks collection) actually runs the jobs. The
+leader keeps job state in a MongoDB job store, so next run times survive
+restarts and failover, and records every run in scheduler_runs.
+
+The job store uses blocking pymongo, so APScheduler runs as a
+BackgroundScheduler in its own thread: job store reads and writes, wakeups
+and run-time bookkeeping never block the event loop. A due job is handed
+back to the event loop with run_coroutine_threadsafe, and the scheduler
+thread that triggered it waits for it to finish, so max_instances and
+coalescing still apply to the actual run.
 """
-from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.interval import IntervalTrigger
+from apscheduler.jobstores.mongodb import MongoDBJobStore
+from apscheduler.events import EVENT_JOB_SUBMITTED
 from motor.motor_asyncio import AsyncIOMotorDatabase
-from .workflow_engine import WorkflowEngine
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from .workflow_engine import get_workflow_engine
 from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import concurrent.futures
+import os
+import socket
+import time
+import uuid
 import logging
 
 logger = logging.getLogger(__name__)
 
-scheduler = AsyncIOScheduler()
+# Leader lease: renewed every LEASE_RENEW_SECONDS, taken over by another
+# process if not renewed for LEASE_SECONDS
+LEADER_LOCK_ID = "scheduler_leader"
+LEASE_SECONDS = 60
+LEASE_RENEW_SECONDS = 20
+
+# Who is told when inventory drops below its reorder point, and how many
+# part numbers one low-stock notification lists
+LOW_STOCK_NOTIFY_ROLES = ["master", "admin", "manager", "operations_manager"]
+LOW_STOCK_LISTED_ITEMS = 10
+
+INSTANCE_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+scheduler: Optional[BackgroundScheduler] = None
+
+_db: Optional[AsyncIOMotorDatabase] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_leader_task: Optional[asyncio.Task] = None
+_lease_expires_at = 0.0  # time.monotonic() deadline of our current lease
+_scheduled_run_times: Dict[str, datetime] = {}
 
 
 async def check_workflow_escalations(db: AsyncIOMotorDatabase):
     """Check for workflows that need escalation"""
-    try:
-        engine = WorkflowEngine(db)
-        escalated = await engine.check_escalations()
-        
-        if escalated:
-            logger.info(f"Escalated {len(escalated)} workflows")
-            
-            # Send escalation notifications
-            for workflow in escalated:
-                try:
-                    # Get new approvers
-                    approver_emails = []
-                    for approver_id in workflow.get("current_approvers", []):
-                        approver = await db.users.find_one({"id": approver_id}, {"email": 1})
-                        if approver and approver.get("email"):
-                            approver_emails.append(approver["email"])
-                    
-                    if approver_emails:
-                        from .email_service import EmailService
-                        email_service = EmailService()
-                        
-                        # Reuse workflow start email for escalations
-                        email_service.send_workflow_started_email(
-                            to_emails=approver_emails,
-                            workflow_name=f"[ESCALATED] {workflow['template_name']}",
-                            resource_type=workflow["resource_type"],
-                            resource_name=workflow["resource_name"],
-                            frontend_url=email_service.client and "https://app.opsplatform.com" or "http://localhost:3000"
-                        )
-                except Exception as e:
-                    logger.error(f"Failed to send escalation email: {str(e)}")
+    engine = get_workflow_engine(db)
+    escalated = await engine.check_escalations()
+    
+    if escalated:
+        logger.info(f"Escalated {len(escalated)} workflows")
         
-    except Exception as e:
-        logger.error(f"Escalation check failed: {str(e)}")
+        # Queue escalation notifications (reuses the workflow start email)
+        for workflow in escalated:
+            engine.notifier.notify_approvers(
+                workflow.get("current_approvers", []),
+                workflow_name=f"[ESCALATED] {workflow['template_name']}",
+                resource_type=workflow["resource_type"],
+                resource_name=workflow["resource_name"]
+            )
 
 
 async def cleanup_old_audit_logs(db: AsyncIOMotorDatabase):
     """Auto-purge audit logs older than 180 days"""
-    try:
-        cutoff_date = (datetime.now(timezone.utc) - timedelta(days=180)).isoformat()
-        
-        result = await db.audit_logs.delete_many({
-            "timestamp": {"$lt": cutoff_date}
-        })
-        
-        if result.deleted_count > 0:
-            logger.info(f"Auto-purged {result.deleted_count} old audit logs")
+    cutoff_date = (datetime.now(timezone.utc) - timedelta(days=180)).isoformat()
     
-    except Exception as e:
-        logger.error(f"Audit log cleanup failed: {str(e)}")
+    result = await db.audit_logs.delete_many({
+        "timestamp": {"$lt": cutoff_date}
+    })
+    
+    if result.deleted_count > 0:
+        logger.info(f"Auto-purged {result.deleted_count} old audit logs")
 
 
 async def send_workflow_reminders(db: AsyncIOMotorDatabase):
     """Send reminders for workflows approaching due date"""
-    try:
-        # Find workflows due in next 4 hours
-        now = datetime.now(timezone.utc)
-        reminder_threshold = (now + timedelta(hours=4)).isoformat()
-        
-        workflows = await db.workflow_instances.find({
+    # Find workflows due in next 4 hours that haven't been reminded yet
+    now = datetime.now(timezone.utc)
+    reminder_threshold = (now + timedelta(hours=4)).isoformat()
+    
+    # Claim them atomically before sending (to avoid duplicate reminders):
+    # each instance flips reminder_sent exactly once, tagged with our claim id
+    claim_id = str(uuid.uuid4())
+    result = await db.workflow_instances.update_many(
+        {
             "status": {"$in": ["in_progress", "escalated"]},
-            "due_at": {"$lte": reminder_threshold, "$gte": now.isoformat()}
-        }).to_list(100)
-        
-        if workflows:
-            from .email_service import EmailService
-            email_service = EmailService()
-            
-            for workflow in workflows:
-                # Check if reminder already sent (to avoid spam)
-                reminder_sent = workflow.get("reminder_sent", False)
-                if not reminder_sent:
-                    approver_emails = []
-                    for approver_id in workflow.get("current_approvers", []):
-                        approver = await db.users.find_one({"id": approver_id}, {"email": 1})
-                        if approver and approver.get("email"):
-                            approver_emails.append(approver["email"])
-                    
-                    if approver_emails:
-                        try:
-                            email_service.send_workflow_started_email(
-                                to_emails=approver_emails,
-                                workflow_name=f"[REMINDER] {workflow['template_name']}",
-                                resource_type=workflow["resource_type"],
-                                resource_name=workflow["resource_name"],
-                                frontend_url="http://localhost:3000"
-                            )
-                            
-                            # Mark reminder as sent
-                            await db.workflow_instances.update_one(
-                                {"id": workflow["id"]},
-                                {"$set": {"reminder_sent": True}}
-                            )
-                        except Exception as e:
-                            logger.error(f"Failed to send reminder: {str(e)}")
-            
-            logger.info(f"Sent reminders for {len(workflows)} workflows")
+            "due_at": {"$lte": reminder_threshold, "$gte": now.isoformat()},
+            "reminder_sent": {"$ne": True}
+        },
+        {"$set": {"reminder_sent": True, "reminder_claim_id": claim_id}}
+    )
     
-    except Exception as e:
-        logger.error(f"Workflow reminder failed: {str(e)}")
+    if result.modified_count == 0:
+        return
+    
+    workflows = await db.workflow_instances.find(
+        {"reminder_claim_id": claim_id},
+        {"_id": 0}
+    ).to_list(None)
+    
+    notifier = get_workflow_engine(db).notifier
+    
+    for workflow in workflows:
+        notifier.notify_approvers(
+            workflow.get("current_approvers", []),
+            workflow_name=f"[REMINDER] {workflow['template_name']}",
+            resource_type=workflow["resource_type"],
+            resource_name=workflow["resource_name"]
+        )
+    
+    logger.info(f"Sent reminders for {len(workflows)} workflows")
 
 
-def start_scheduler(db: AsyncIOMotorDatabase):
-    """Start the background scheduler"""
-    
-    # Check workflow escalations every hour
-    scheduler.add_job(
-        check_workflow_escalations,
-        trigger=IntervalTrigger(hours=1),
-        args=[db],
-        id="workflow_escalations",
-        name="Check Workflow Escalations",
-        replace_existing=True
+async def notify_low_stock(db: AsyncIOMotorDatabase):
+    """Notify each organization once about items that dropped below their reorder point"""
+    # Claim the newly low items atomically; stock writes clear reorder_notified
+    # when an item recovers, so it is reported again if it drops again
+    claim_id = str(uuid.uuid4())
+    result = await db.inventory_items.update_many(
+        {"below_reorder": True, "reorder_notified": {"$ne": True}, "is_active": True},
+        {"$set": {"reorder_notified": True, "reorder_claim_id": claim_id}}
     )
     
+    if result.modified_count == 0:
+        return
+    
+    items = await db.inventory_items.find(
+        {"below_reorder": True, "reorder_notified": True, "reorder_claim_id": claim_id},
+        {"_id": 0, "id": 1, "organization_id": 1, "part_number": 1, "quantity_available": 1, "reorder_point": 1}
+    ).sort("part_number", 1).to_list(None)
+    
+    items_by_org: Dict[str, List[dict]] = {}
+    for item in items:
+        items_by_org.setdefault(item["organization_id"], []).append(item)
+    
+    recipients = await db.users.find(
+        {
+            "organization_id": {"$in": list(items_by_org)},
+            "role": {"$in": LOW_STOCK_NOTIFY_ROLES},
+            "is_active": True
+        },
+        {"_id": 0, "id": 1, "organization_id": 1}
+    ).to_list(None)
+    
+    now = datetime.now(timezone.utc).isoformat()
+    notifications = []
+    for recipient in recipients:
+        org_items = items_by_org[recipient["organization_id"]]
+        listed = ", ".join(
+            f"{item['part_number']} ({item.get('quantity_available', 0):g} / {item.get('reorder_point', 0):g})"
+            for item in org_items[:LOW_STOCK_LISTED_ITEMS]
+        )
+        more = len(org_items) - LOW_STOCK_LISTED_ITEMS
+        notifications.append({
+            "id": str(uuid.uuid4()),
+            "organization_id": recipient["organization_id"],
+            "user_id": recipient["id"],
+            "type": "low_stock",
+            "title": f"{len(org_items)} inventory item{'s' if len(org_items) != 1 else ''} below reorder point",
+            "message": listed + (f" and {more} more" if more > 0 else ""),
+            "link": "/inventory",
+            "metadata": {"item_ids": [item["id"] for item in org_items]},
+            "is_read": False,
+            "created_at": now
+        })
+    
+    if notifications:
+        await db.notifications.insert_many(notifications)
+    
+    logger.info(f"Reported {len(items)} low-stock items across {len(items_by_org)} organizations")
+
+
+# =====================================
+# JOB REGISTRY AND RUN RECORDING
+# =====================================
+
+# job id -> (function, trigger, name). Jobs are stored in MongoDB by
+# reference to run_scheduled_job(job_id), so nothing unpicklable (like the
+# Motor database or the event loop) ends up in the job store.
+JOBS = {
+    # Check workflow escalations every hour
+    "workflow_escalations": (check_workflow_escalations, IntervalTrigger(hours=1), "Check Workflow Escalations"),
     # Send workflow reminders every 2 hours
-    scheduler.add_job(
-        send_workflow_reminders,
-        trigger=IntervalTrigger(hours=2),
-        args=[db],
-        id="workflow_reminders",
-        name="Send Workflow Reminders",
-        replace_existing=True
-    )
+    "workflow_reminders": (send_workflow_reminders, IntervalTrigger(hours=2), "Send Workflow Reminders"),
+    # Batch low-stock notifications per organization every 15 minutes
+    "low_stock_notifications": (notify_low_stock, IntervalTrigger(minutes=15), "Notify Low Stock"),
+    # Cleanup old audit logs daily
+    "audit_cleanup": (cleanup_old_audit_logs, IntervalTrigger(hours=24), "Cleanup Old Audit Logs"),
+}
+
+
+def is_leader() -> bool:
+    """True while this process holds an unexpired leader lease"""
+    return time.monotonic() < _lease_expires_at
+
+
+def run_scheduled_job(job_id: str):
+    """Scheduler thread entry point: run the job on the event loop and wait for it"""
+    if _loop is None or _loop.is_closed():
+        logger.info(f"Skipping job {job_id}: event loop not running")
+        return
+    try:
+        asyncio.run_coroutine_threadsafe(_run_job(job_id), _loop).result()
+    except concurrent.futures.CancelledError:
+        logger.info(f"Job {job_id} cancelled: event loop shutting down")
+
+
+async def _run_job(job_id: str):
+    """Run a registered job on the leader and record duration, lag and outcome"""
+    if _db is None or not is_leader():
+        logger.info(f"Skipping job {job_id}: not the scheduler leader")
+        return
+    
+    func = JOBS[job_id][0]
+    started_at = datetime.now(timezone.utc)
+    scheduled_at = _scheduled_run_times.pop(job_id, None)
+    start = time.perf_counter()
+    outcome, error = "success", None
+    
+    try:
+        await func(_db)
+    except Exception as e:
+        outcome, error = "error", str(e)
+        logger.error(f"Scheduled job {job_id} failed: {error}")
+    
+    duration_ms = round((time.perf_counter() - start) * 1000, 1)
+    
+    try:
+        await _db.scheduler_runs.insert_one({
+            "id": str(uuid.uuid4()),
+            "job_id": job_id,
+            "instance_id": INSTANCE_ID,
+            "scheduled_at": scheduled_at.isoformat() if scheduled_at else None,
+            "started_at": started_at.isoformat(),
+            "finished_at": datetime.now(timezone.utc).isoformat(),
+            "lag_ms": round((started_at - scheduled_at).total_seconds() * 1000, 1) if scheduled_at else None,
+            "duration_ms": duration_ms,
+            "outcome": outcome,
+            "error": error
+        })
+    except Exception as e:
+        logger.error(f"Failed to record run of job {job_id}: {str(e)}")
+
+
+def _on_job_submitted(event):
+    """Remember when a job was due, so its run can report scheduler lag"""
+    if event.scheduled_run_times:
+        _scheduled_run_times[event.job_id] = event.scheduled_run_times[-1]
+
+
+# =====================================
+# LEADER ELECTION
+# =====================================
+
+async def _acquire_or_renew_lease(db: AsyncIOMotorDatabase) -> bool:
+    """Take the leader lock if it is free/expired, or extend it if we hold it"""
+    global _lease_expires_at
+    
+    requested_at = time.monotonic()
+    now = datetime.now(timezone.utc)
+    
+    try:
+        lock = await db.scheduler_locks.find_one_and_update(
+            {
+                "_id": LEADER_LOCK_ID,
+                "$or": [
+                    {"owner": INSTANCE_ID},
+                    {"expires_at": {"$lt": now.isoformat()}}
+                ]
+            },
+            {
+                "$set": {
+                    "owner": INSTANCE_ID,
+                    "expires_at": (now + timedelta(seconds=LEASE_SECONDS)).isoformat(),
+                    "renewed_at": now.isoformat()
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # Lock exists, unexpired, and held by another process
+        lock = None
     
-    # Cleanup old audit logs daily at 2 AM
-    scheduler.add_job(
-        cleanup_old_audit_logs,
-        trigger=IntervalTrigger(hours=24),
-        args=[db],
-        id="audit_cleanup",
-        name="Cleanup Old Audit Logs",
-        replace_existing=True
+    if lock and lock.get("owner") == INSTANCE_ID:
+        # Measure from before the request so our view of the lease never
+        # outlives the one stored in the database
+        _lease_expires_at = requested_at + LEASE_SECONDS
+        return True
+    
+    _lease_expires_at = 0.0
+    return False
+
+
+def _create_job_runner() -> BackgroundScheduler:
+    """Start APScheduler with the MongoDB job store in its own thread (blocking pymongo calls)"""
+    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+    db_name = os.environ.get('DB_NAME', 'operational_platform')
+    
+    runner = BackgroundScheduler(
+        jobstores={
+            "default": MongoDBJobStore(
+                database=db_name,
+                collection="scheduler_jobs",
+                client=MongoClient(mongo_url)
+            )
+        },
+        job_defaults={"coalesce": True, "max_instances": 1, "misfire_grace_time": 3600}
     )
+    runner.add_listener(_on_job_submitted, EVENT_JOB_SUBMITTED)
+    runner.start()
     
-    scheduler.start()
-    logger.info("✅ Background scheduler started")
+    # Keep persisted next run times; only register jobs that are missing
+    for job_id, (func, trigger, name) in JOBS.items():
+        if runner.get_job(job_id) is None:
+            runner.add_job(
+                run_scheduled_job,
+                trigger=trigger,
+                args=[job_id],
+                id=job_id,
+                name=name
+            )
+    return runner
+
 
+async def _start_job_runner():
+    """Start the job runner (leader only) without blocking the event loop"""
+    global scheduler
+    
+    scheduler = await asyncio.to_thread(_create_job_runner)
+    logger.info(f"✅ Background scheduler started (leader {INSTANCE_ID})")
 
-def stop_scheduler():
-    """Stop the background scheduler"""
-    if scheduler.running:
-        scheduler.shutdown()
+
+async def _stop_job_runner():
+    """Stop APScheduler, leaving persisted jobs for the next leader"""
+    global scheduler
+    
+    runner, scheduler = scheduler, None
+    if runner and runner.running:
+        # Joins the scheduler thread, which may be inside a job store call
+        await asyncio.to_thread(runner.shutdown, wait=False)
         logger.info("Background scheduler stopped")
+
+
+async def _leader_loop(db: AsyncIOMotorDatabase):
+    """Contend for the leader lease and run the job scheduler while holding it"""
+    while True:
+        try:
+            leader = await _acquire_or_renew_lease(db)
+        except Exception as e:
+            logger.error(f"Scheduler lease renewal failed: {str(e)}")
+            leader = is_leader()
+        
+        if leader and scheduler is None:
+            try:
+                await _start_job_runner()
+            except Exception as e:
+                logger.error(f"Failed to start background scheduler: {str(e)}")
+        elif not leader and scheduler is not None:
+            logger.warning("Lost scheduler leadership")
+            await _stop_job_runner()
+        
+        await asyncio.sleep(LEASE_RENEW_SECONDS)
+
+
+def start_scheduler(db: AsyncIOMotorDatabase):
+    """Join scheduler leader election; the elected process runs the jobs"""
+    global _db, _loop, _leader_task
+    
+    _db = db
+    _loop = asyncio.get_running_loop()
+    if _leader_task is None or _leader_task.done():
+        _leader_task = asyncio.create_task(_leader_loop(db))
+        logger.info(f"Scheduler candidate {INSTANCE_ID} joined leader election")
+
+
+async def stop_scheduler():
+    """Stop the background scheduler and release the leader lease"""
+    global _leader_task, _lease_expires_at
+    
+    if _leader_task:
+        _leader_task.cancel()
+        _leader_task = None
+    
+    await _stop_job_runner()
+    
+    if _db is not None and is_leader():
+        _lease_expires_at = 0.0
+        await _db.scheduler_locks.delete_one({"_id": LEADER_LOCK_ID, "owner": INSTANCE_ID})
@@ -53,6 +53,7 @@ from .dashboard_enhanced_routes import router as dashboard_enhanced_router
 from .project_routes import router as project_router
 from .group_routes import router as group_router
 from .bulk_import_routes import router as bulk_import_router
+from .bulk_routes import router as bulk_router
 from .webhook_routes import router as webhook_router
 from .search_routes import router as search_router
 from .mention_routes import router as mention_router
@@ -100,10 +101,75 @@ async def startup_db_client():
         from .scheduler import start_scheduler
         start_scheduler(db)
         
+        # Start webhook delivery workers
+        from .webhook_delivery import dispatcher as webhook_dispatcher
+        await webhook_dispatcher.start(db)
+        
+        from .email_outbox import outbox as email_outbox
+        await email_outbox.start(db)
+        
+        from .sms_bulk import sender as sms_sender
+        await sms_sender.start(db)
+        
+        from .pdf_render_pool import pdf_pool
+        await pdf_pool.start()
+        
+        from .pdf_exports import exporter as pdf_exporter
+        await pdf_exporter.start(db)
+        
+        from .user_import import importer as user_importer
+        await user_importer.start(db)
+        
+        # Items stored before below_reorder existed would be missing from the reorder list
+        from .inventory_stock import backfill_derived_fields
+        try:
+            await backfill_derived_fields(db)
+        except Exception as e:
+            print(f"⚠️ Inventory below_reorder backfill failed: {str(e)}")
+        
+        # Bulk op_id reservations need their unique index; /bulk answers 503 until it exists
+        from .bulk_routes import ensure_indexes as ensure_bulk_indexes
+        try:
+            await ensure_bulk_indexes(db)
+        except Exception as e:
+            print(f"⚠️ Bulk operation indexes not ensured: {str(e)}")
+        
     except Exception as e:
         print(f"❌ MongoDB connection failed: {str(e)}")
         raise
 
+
+@app.on_event("shutdown")
+async def shutdown_db_client():
+    """Stop background workers and hand the scheduler lease to another worker"""
+    from .scheduler import stop_scheduler
+    await stop_scheduler()
+    
+    # Finish queueing workflow emails still being looked up
+    from .workflow_engine import drain_workflow_notifications
+    await drain_workflow_notifications()
+    
+    from .webhook_delivery import dispatcher as webhook_dispatcher
+    await webhook_dispatcher.stop()
+    
+    from .email_outbox import outbox as email_outbox
+    await email_outbox.stop()
+    
+    from .sms_bulk import sender as sms_sender
+    await sms_sender.stop()
+    
+    from .photo_derivatives import derivatives as photo_derivatives
+    await photo_derivatives.stop()
+    
+    from .pdf_exports import exporter as pdf_exporter
+    await pdf_exporter.stop()
+    
+    from .user_import import importer as user_importer
+    await user_importer.stop()
+    
+    from .pdf_render_pool import pdf_pool
+    await pdf_pool.stop()
+
 # Create API router
 api_router = APIRouter(prefix="/api")
 
@@ -200,6 +266,7 @@ api_router.include_router(dashboard_enhanced_router)
 api_router.include_router(project_router)
 api_router.include_router(group_router)
 api_router.include_router(bulk_import_router)
+api_router.include_router(bulk_router)
 api_router.include_router(webhook_router)
 api_router.include_router(search_router)
 api_router.include_router(mention_router)
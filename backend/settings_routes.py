@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from .auth_utils import get_current_user
-from .email_service import EmailService
+from .email_outbox import outbox as email_outbox
 from pydantic import BaseModel
 import uuid
 
@@ -138,15 +138,11 @@ async def test_email_settings(
             detail="SendGrid sender email not configured. Please add a verified sender email address."
         )
     
-    # Initialize email service with configured sender
-    email_service = EmailService(
+    # Send test email directly (not queued) so the result reflects the configuration
+    success, error = await email_outbox.send_now(
         api_key=settings["sendgrid_api_key"],
         from_email=settings.get("sendgrid_from_email", "noreply@opsplatform.com"),
-        from_name=settings.get("sendgrid_from_name", "Operations Platform")
-    )
-    
-    # Send test email
-    success = email_service.send_email(
+        from_name=settings.get("sendgrid_from_name", "Operations Platform"),
         to_email=current_user["email"],
         subject="✅ SendGrid Test Email - Configuration Successful",
         html_content=f"""
@@ -166,4 +162,5 @@ async def test_email_settings(
     if success:
         return {"success": True, "message": f"Test email sent successfully to {current_user['email']}"}
     else:
+        print(f"⚠️ SendGrid test email failed: {error}")
         return {"success": False, "message": "Failed to send test email. Check your SendGrid sender verification."}
@@ -0,0 +1,476 @@
+"""
+Bulk SMS / WhatsApp - Durable, throttled broadcast jobs
+
+A bulk send creates one sms_jobs document plus one sms_job_recipients
+document per (deduplicated) number and returns immediately. Background job
+workers claim queued jobs with a renewable lease and send to recipients with
+bounded concurrency (SMS_CONCURRENCY), paced by a token bucket at the
+organization's messages/sec (twilio_rate_per_second, default
+SMS_RATE_PER_SECOND). Requests go straight to the Twilio REST API over one
+pooled aiohttp session.
+
+Progress is flushed to the job document after every page of recipients, so
+GET /api/sms/jobs/{job_id} can be polled while the job runs. Throttling
+(429), provider errors (5xx) and network failures are retried with backoff
+up to SMS_MAX_ATTEMPTS; a 429 also pauses the job's sender. Other Twilio
+errors (invalid number, unsubscribed recipient, ...) fail the recipient
+immediately. Failed recipients can be requeued with
+POST /api/sms/jobs/{job_id}/retry.
+
+Job statuses:
+    queued                  - waiting for a worker
+    running                 - claimed (reclaimable once locked_until passes)
+    completed               - every recipient was sent
+    completed_with_errors   - finished, some recipients failed
+    failed                  - could not run (e.g. Twilio not configured)
+
+Recipient statuses: pending, sending, retrying, sent, failed.
+
+With SMS_PROVIDER=stub, messages go to an in-process StubSMSProvider
+instead of Twilio (no credentials needed) - for tests and local runs.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument, UpdateOne
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any
+from dataclasses import dataclass
+import asyncio
+import os
+import random
+import uuid
+import logging
+
+import aiohttp
+
+from .email_outbox import RateLimiter
+from .sms_service import format_phone_number
+
+logger = logging.getLogger(__name__)
+
+TWILIO_API_BASE_URL = os.environ.get("TWILIO_API_BASE_URL", "https://api.twilio.com").rstrip("/")
+SMS_PROVIDER = os.environ.get("SMS_PROVIDER", "twilio")
+
+# Jobs run concurrently per process, messages in flight per job, and the
+# default provider rate when the organization hasn't configured one
+SMS_JOB_WORKERS = int(os.environ.get("SMS_JOB_WORKERS", "2"))
+SMS_CONCURRENCY = int(os.environ.get("SMS_CONCURRENCY", "10"))
+SMS_RATE_PER_SECOND = float(os.environ.get("SMS_RATE_PER_SECOND", "10"))
+SMS_MAX_CONNECTIONS = int(os.environ.get("SMS_MAX_CONNECTIONS", "20"))
+
+SMS_MAX_ATTEMPTS = 3
+RETRY_BASE_DELAY = 5
+MAX_BACKOFF_SECONDS = 300
+THROTTLE_PAUSE_SECONDS = 1
+
+# Recipients sent between progress flushes / lease renewals
+PAGE_SIZE = max(SMS_CONCURRENCY * 5, 50)
+
+REQUEST_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
+JOB_LEASE_SECONDS = 120
+POLL_INTERVAL_SECONDS = 5
+
+PENDING_RECIPIENT_STATUSES = ["pending", "retrying"]
+
+
+@dataclass
+class SendResult:
+    success: bool
+    message_sid: Optional[str] = None
+    status: Optional[str] = None
+    error: Optional[str] = None
+    code: Optional[int] = None
+    retryable: bool = False
+    throttled: bool = False
+    retry_after: Optional[float] = None
+
+
+# ==================== PROVIDERS ====================
+
+class TwilioProvider:
+    """Twilio Messages API over a shared aiohttp session"""
+
+    def __init__(self, session: aiohttp.ClientSession, account_sid: str, auth_token: str):
+        self.session = session
+        self.url = f"{TWILIO_API_BASE_URL}/2010-04-01/Accounts/{account_sid}/Messages.json"
+        self.auth = aiohttp.BasicAuth(account_sid, auth_token)
+
+    async def send(self, to: str, from_: str, body: str, media_url: Optional[str] = None) -> SendResult:
+        data = {"To": to, "From": from_, "Body": body}
+        if media_url:
+            data["MediaUrl"] = media_url
+
+        try:
+            async with self.session.post(self.url, data=data, auth=self.auth) as response:
+                try:
+                    payload = await response.json(content_type=None)
+                except ValueError:
+                    payload = {}
+
+                if response.status < 300:
+                    return SendResult(True, message_sid=payload.get("sid"), status=payload.get("status"))
+
+                retry_after = response.headers.get("Retry-After")
+                return SendResult(
+                    False,
+                    error=f"Twilio error: {payload.get('message') or f'HTTP {response.status}'}",
+                    code=payload.get("code"),
+                    retryable=response.status == 429 or response.status >= 500,
+                    throttled=response.status == 429,
+                    retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None
+                )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            return SendResult(False, error=str(e) or e.__class__.__name__, retryable=True)
+
+
+class StubSMSProvider:
+    """In-process stand-in for Twilio
+
+    Records every message in `sent`. Mirrors Twilio's magic test number
+    +15005550001 (invalid number, permanent failure); SMS_STUB_FAILURE_RATE
+    adds random transient failures and SMS_STUB_LATENCY_MS simulates
+    provider latency.
+    """
+
+    INVALID_NUMBER = "+15005550001"
+
+    def __init__(self):
+        self.latency = int(os.environ.get("SMS_STUB_LATENCY_MS", "20")) / 1000
+        self.failure_rate = float(os.environ.get("SMS_STUB_FAILURE_RATE", "0"))
+        self.sent: List[Dict[str, Any]] = []
+
+    async def send(self, to: str, from_: str, body: str, media_url: Optional[str] = None) -> SendResult:
+        await asyncio.sleep(self.latency)
+
+        if to.endswith(self.INVALID_NUMBER):
+            return SendResult(False, error="Twilio error: The 'To' number is not a valid phone number.", code=21211)
+        if random.random() < self.failure_rate:
+            return SendResult(False, error="Stub transient failure", retryable=True)
+
+        sid = f"SM{uuid.uuid4().hex}"
+        self.sent.append({"sid": sid, "to": to, "from": from_, "body": body, "media_url": media_url})
+        return SendResult(True, message_sid=sid, status="queued")
+
+
+def compute_backoff(attempt: int) -> float:
+    """Exponential backoff with jitter: half fixed, half random, capped"""
+    delay = min(MAX_BACKOFF_SECONDS, RETRY_BASE_DELAY * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+# ==================== JOB RUNNER ====================
+
+class SMSBulkSender:
+    """Creates bulk send jobs and runs them in background workers"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.stub = StubSMSProvider()
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Open the shared HTTP session and start the job workers"""
+        if self._workers:
+            return
+
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=SMS_MAX_CONNECTIONS),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(SMS_JOB_WORKERS)
+        ]
+        logger.info(f"SMS bulk sender started with {SMS_JOB_WORKERS} job workers ({SMS_PROVIDER})")
+
+    async def stop(self):
+        """Stop workers; running jobs are picked up again once their lease expires"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    # ==================== JOB CREATION ====================
+
+    async def create_job(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        channel: str,
+        phone_numbers: List[str],
+        message: str,
+        created_by: str,
+        media_url: Optional[str] = None,
+        source: Optional[Dict[str, Any]] = None
+    ) -> Dict[str, Any]:
+        """Persist a job and its recipients (one insert each); returns the job"""
+        numbers = list(dict.fromkeys(format_phone_number(p) for p in phone_numbers if p and p.strip()))
+        now = datetime.now(timezone.utc).isoformat()
+
+        job = {
+            "id": str(uuid.uuid4()),
+            "organization_id": organization_id,
+            "channel": channel,
+            "message": message,
+            "media_url": media_url,
+            "source": source,
+            "status": "queued" if numbers else "completed",
+            "total": len(numbers),
+            "sent": 0,
+            "failed": 0,
+            "created_by": created_by,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "completed_at": None if numbers else now
+        }
+
+        if numbers:
+            await db.sms_job_recipients.insert_many([
+                {
+                    "job_id": job["id"],
+                    "phone": phone,
+                    "status": "pending",
+                    "attempts": 0,
+                    "next_attempt_at": now
+                }
+                for phone in numbers
+            ], ordered=False)
+        await db.sms_jobs.insert_one(job.copy())
+
+        self.wake()
+        return job
+
+    async def retry_failed(self, db: AsyncIOMotorDatabase, job: Dict[str, Any]) -> int:
+        """Requeue failed recipients (and a job that could not run); returns recipients requeued"""
+        now = datetime.now(timezone.utc).isoformat()
+        result = await db.sms_job_recipients.update_many(
+            {"job_id": job["id"], "status": "failed"},
+            {"$set": {"status": "pending", "attempts": 0, "next_attempt_at": now},
+             "$unset": {"error": "", "code": ""}}
+        )
+        if result.modified_count or job["status"] == "failed":
+            await db.sms_jobs.update_one(
+                {"id": job["id"]},
+                {"$inc": {"failed": -result.modified_count},
+                 "$set": {"status": "queued", "completed_at": None, "updated_at": now},
+                 "$unset": {"error": ""}}
+            )
+            self.wake()
+        return result.modified_count
+
+    # ==================== WORKERS ====================
+
+    async def _worker_loop(self, index: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = await self._claim_job()
+                if job:
+                    await self._run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"SMS job worker {index} error: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _lease(self) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+    async def _claim_job(self) -> Optional[dict]:
+        """Atomically claim the oldest queued job (or one whose lease expired)"""
+        now = datetime.now(timezone.utc).isoformat()
+        return await self.db.sms_jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "locked_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {"status": "running", "locked_by": self.worker_id, "locked_until": self._lease()}},
+            sort=[("created_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _provider_for(self, job: dict):
+        """Provider, sender number and rate for the job's organization"""
+        settings = await self.db.organization_settings.find_one(
+            {"organization_id": job["organization_id"]},
+            {"_id": 0, "twilio_account_sid": 1, "twilio_auth_token": 1,
+             "twilio_phone_number": 1, "twilio_whatsapp_number": 1, "twilio_rate_per_second": 1}
+        ) or {}
+
+        sender = settings.get("twilio_whatsapp_number") if job["channel"] == "whatsapp" else settings.get("twilio_phone_number")
+        rate = float(settings.get("twilio_rate_per_second") or SMS_RATE_PER_SECOND)
+
+        if SMS_PROVIDER == "stub":
+            return self.stub, sender or "+15005550006", rate
+
+        if not settings.get("twilio_account_sid") or not settings.get("twilio_auth_token"):
+            return None, None, rate
+
+        provider = TwilioProvider(self.session, settings["twilio_account_sid"], settings["twilio_auth_token"])
+        return provider, sender, rate
+
+    async def _run_job(self, job: dict):
+        """Send to every due recipient, page by page, until none remain"""
+        job_id = job["id"]
+        provider, sender, rate = await self._provider_for(job)
+
+        if not provider or not sender:
+            await self._finish_job(job_id, "failed", "Twilio not configured for this organization")
+            return
+
+        # WhatsApp needs the prefix on both ends; stored phones stay plain E.164
+        address_prefix = "whatsapp:" if job["channel"] == "whatsapp" else ""
+        sender = f"{address_prefix}{sender}"
+
+        if not job.get("started_at"):
+            await self.db.sms_jobs.update_one(
+                {"id": job_id}, {"$set": {"started_at": datetime.now(timezone.utc).isoformat()}}
+            )
+
+        # Recipients left "sending" by a worker that died are sent again
+        await self.db.sms_job_recipients.update_many(
+            {"job_id": job_id, "status": "sending"},
+            {"$set": {"status": "pending"}}
+        )
+
+        limiter = RateLimiter(rate)
+        semaphore = asyncio.Semaphore(SMS_CONCURRENCY)
+
+        while True:
+            now = datetime.now(timezone.utc).isoformat()
+            page = await self.db.sms_job_recipients.find(
+                {"job_id": job_id, "status": {"$in": PENDING_RECIPIENT_STATUSES}, "next_attempt_at": {"$lte": now}},
+                {"_id": 0, "phone": 1, "attempts": 1}
+            ).limit(PAGE_SIZE).to_list(PAGE_SIZE)
+
+            if not page:
+                upcoming = await self.db.sms_job_recipients.find_one(
+                    {"job_id": job_id, "status": "retrying"},
+                    {"_id": 0, "next_attempt_at": 1},
+                    sort=[("next_attempt_at", 1)]
+                )
+                if not upcoming:
+                    break
+                wait = (datetime.fromisoformat(upcoming["next_attempt_at"]) - datetime.now(timezone.utc)).total_seconds()
+                await asyncio.sleep(min(max(wait, 0.1), POLL_INTERVAL_SECONDS))
+                if not await self._renew_lease(job_id):
+                    return
+                continue
+
+            await self.db.sms_job_recipients.update_many(
+                {"job_id": job_id, "phone": {"$in": [r["phone"] for r in page]}},
+                {"$set": {"status": "sending"}}
+            )
+
+            async def send_one(recipient: dict):
+                async with semaphore:
+                    await limiter.acquire()
+                    result = await provider.send(
+                        f"{address_prefix}{recipient['phone']}", sender, job["message"], job.get("media_url")
+                    )
+                    if result.throttled:
+                        limiter.pause(result.retry_after or THROTTLE_PAUSE_SECONDS)
+                    return recipient, result
+
+            results = await asyncio.gather(*(send_one(r) for r in page))
+            await self._record_page(job_id, results)
+
+            if not await self._renew_lease(job_id):
+                return
+
+        job = await self.db.sms_jobs.find_one({"id": job_id}, {"_id": 0, "failed": 1})
+        await self._finish_job(job_id, "completed_with_errors" if job and job.get("failed") else "completed")
+
+    async def _record_page(self, job_id: str, results: list):
+        """Store recipient outcomes and bump job counters in two writes"""
+        now = datetime.now(timezone.utc)
+        operations = []
+        sent = failed = 0
+
+        for recipient, result in results:
+            attempts = recipient.get("attempts", 0) + 1
+            match = {"job_id": job_id, "phone": recipient["phone"]}
+
+            if result.success:
+                sent += 1
+                operations.append(UpdateOne(match, {"$set": {
+                    "status": "sent",
+                    "attempts": attempts,
+                    "message_sid": result.message_sid,
+                    "provider_status": result.status,
+                    "sent_at": now.isoformat()
+                }, "$unset": {"error": "", "code": ""}}))
+            elif result.retryable and attempts < SMS_MAX_ATTEMPTS:
+                delay = max(result.retry_after or 0, compute_backoff(attempts))
+                operations.append(UpdateOne(match, {"$set": {
+                    "status": "retrying",
+                    "attempts": attempts,
+                    "error": result.error,
+                    "next_attempt_at": (now + timedelta(seconds=delay)).isoformat()
+                }}))
+            else:
+                failed += 1
+                operations.append(UpdateOne(match, {"$set": {
+                    "status": "failed",
+                    "attempts": attempts,
+                    "error": result.error,
+                    "code": result.code,
+                    "failed_at": now.isoformat()
+                }}))
+
+        if operations:
+            await self.db.sms_job_recipients.bulk_write(operations, ordered=False)
+        await self.db.sms_jobs.update_one(
+            {"id": job_id},
+            {"$inc": {"sent": sent, "failed": failed}, "$set": {"updated_at": now.isoformat()}}
+        )
+
+    async def _renew_lease(self, job_id: str) -> bool:
+        """Extend our lease; False if another worker took the job over"""
+        result = await self.db.sms_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            {"$set": {"locked_until": self._lease()}}
+        )
+        return result.matched_count == 1
+
+    async def _finish_job(self, job_id: str, status: str, error: Optional[str] = None):
+        """Record the final status and release the lease"""
+        now = datetime.now(timezone.utc).isoformat()
+        update = {"status": status, "completed_at": now, "updated_at": now}
+        if error:
+            update["error"] = error
+
+        await self.db.sms_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            {"$set": update, "$unset": {"locked_by": "", "locked_until": ""}}
+        )
+        logger.info(f"SMS job {job_id} finished: {status}")
+
+
+# Process-wide sender (started from server startup)
+sender = SMSBulkSender()
@@ -7,6 +7,7 @@ from pydantic import BaseModel, Field
 from typing import Optional, List
 from .auth_utils import get_current_user
 from .sms_service import SMSService
+from .sms_bulk import sender as sms_sender, SMS_PROVIDER
 import logging
 
 logger = logging.getLogger(__name__)
@@ -267,75 +268,184 @@ async def send_whatsapp(
         )
 
 
-@router.post("/send-bulk")
+async def _create_bulk_job(
+    request: Request,
+    db: AsyncIOMotorDatabase,
+    channel: str,
+    phone_numbers: List[str],
+    message: str,
+    media_url: Optional[str] = None
+) -> dict:
+    """Validate Twilio configuration and queue a bulk send job"""
+    user = await get_current_user(request, db)
+    
+    if SMS_PROVIDER != "stub":
+        settings = await db.organization_settings.find_one(
+            {"organization_id": user["organization_id"]}
+        )
+        
+        if not settings or not settings.get("twilio_account_sid"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Twilio not configured for this organization"
+            )
+        
+        if channel == "whatsapp" and not settings.get("twilio_whatsapp_number"):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="No sender WhatsApp number configured"
+            )
+    
+    return await sms_sender.create_job(
+        db,
+        organization_id=user["organization_id"],
+        channel=channel,
+        phone_numbers=phone_numbers,
+        message=message,
+        created_by=user["id"],
+        media_url=media_url
+    )
+
+
+@router.post("/send-bulk", status_code=status.HTTP_202_ACCEPTED)
 async def send_bulk_sms(
     bulk_request: BulkSMSRequest,
     request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Send SMS to multiple recipients"""
+    """Queue an SMS to multiple recipients; poll GET /sms/jobs/{job_id} for progress"""
+    return await _create_bulk_job(
+        request, db, "sms",
+        phone_numbers=bulk_request.phone_numbers,
+        message=bulk_request.message
+    )
+
+
+@router.post("/whatsapp/send-bulk", status_code=status.HTTP_202_ACCEPTED)
+async def send_bulk_whatsapp(
+    bulk_request: BulkWhatsAppRequest,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Queue a WhatsApp message to multiple recipients; poll GET /sms/jobs/{job_id} for progress"""
+    return await _create_bulk_job(
+        request, db, "whatsapp",
+        phone_numbers=bulk_request.phone_numbers,
+        message=bulk_request.message,
+        media_url=bulk_request.media_url
+    )
+
+
+# ==================== BULK JOBS ====================
+
+JOB_PROJECTION = {"_id": 0, "locked_by": 0, "locked_until": 0}
+
+
+@router.get("/jobs")
+async def list_bulk_jobs(
+    request: Request,
+    limit: int = 50,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """List recent bulk send jobs for the organization"""
     user = await get_current_user(request, db)
     
-    # Get organization Twilio settings
-    settings = await db.organization_settings.find_one(
-        {"organization_id": user["organization_id"]}
+    jobs = await db.sms_jobs.find(
+        {"organization_id": user["organization_id"]},
+        JOB_PROJECTION
+    ).sort("created_at", -1).limit(limit).to_list(limit)
+    
+    return jobs
+
+
+@router.get("/jobs/{job_id}")
+async def get_bulk_job(
+    job_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get bulk send job progress"""
+    user = await get_current_user(request, db)
+    
+    job = await db.sms_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        JOB_PROJECTION
     )
     
-    if not settings or not settings.get("twilio_account_sid"):
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Twilio not configured for this organization"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
     
-    sms_service = SMSService(
-        account_sid=settings["twilio_account_sid"],
-        auth_token=settings["twilio_auth_token"],
-        phone_number=settings.get("twilio_phone_number"),
-        whatsapp_number=settings.get("twilio_whatsapp_number")
-    )
+    job["pending"] = job["total"] - job["sent"] - job["failed"]
+    job["progress"] = round((job["sent"] + job["failed"]) / job["total"] * 100, 1) if job["total"] else 100.0
+    return job
+
+
+@router.get("/jobs/{job_id}/recipients")
+async def list_bulk_job_recipients(
+    job_id: str,
+    request: Request,
+    recipient_status: Optional[str] = None,
+    skip: int = 0,
+    limit: int = 100,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """List per-recipient results of a bulk send job (filter with recipient_status=failed)"""
+    user = await get_current_user(request, db)
     
-    result = sms_service.send_bulk_sms(
-        phone_numbers=bulk_request.phone_numbers,
-        message=bulk_request.message
+    job = await db.sms_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        {"_id": 0, "id": 1}
     )
     
-    return result
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
+        )
+    
+    query = {"job_id": job_id}
+    if recipient_status:
+        query["status"] = recipient_status
+    
+    recipients = await db.sms_job_recipients.find(
+        query, {"_id": 0}
+    ).sort("phone", 1).skip(skip).limit(limit).to_list(limit)
+    
+    return recipients
 
 
-@router.post("/whatsapp/send-bulk")
-async def send_bulk_whatsapp(
-    bulk_request: BulkWhatsAppRequest,
+@router.post("/jobs/{job_id}/retry")
+async def retry_bulk_job(
+    job_id: str,
     request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
-    """Send WhatsApp to multiple recipients"""
+    """Requeue the failed recipients of a finished bulk send job"""
     user = await get_current_user(request, db)
     
-    # Get organization Twilio settings
-    settings = await db.organization_settings.find_one(
-        {"organization_id": user["organization_id"]}
+    job = await db.sms_jobs.find_one(
+        {"id": job_id, "organization_id": user["organization_id"]},
+        {"_id": 0}
     )
     
-    if not settings or not settings.get("twilio_account_sid"):
+    if not job:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Twilio not configured for this organization"
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Job not found"
         )
     
-    sms_service = SMSService(
-        account_sid=settings["twilio_account_sid"],
-        auth_token=settings["twilio_auth_token"],
-        phone_number=settings.get("twilio_phone_number"),
-        whatsapp_number=settings.get("twilio_whatsapp_number")
-    )
+    if job["status"] in ["queued", "running"]:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Job is still running"
+        )
     
-    result = sms_service.send_bulk_whatsapp(
-        phone_numbers=bulk_request.phone_numbers,
-        message=bulk_request.message,
-        media_url=bulk_request.media_url
-    )
+    requeued = await sms_sender.retry_failed(db, job)
     
-    return result
+    return {"message": f"Requeued {requeued} failed recipients", "job_id": job_id, "requeued": requeued}
 
 
 @router.get("/message-status/{message_sid}")
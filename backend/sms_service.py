@@ -1,16 +1,29 @@
 """
 SMS and WhatsApp Service using Twilio
 Handles sending notifications via SMS and WhatsApp
+(bulk sends run as background jobs, see sms_bulk.py)
 """
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
 import os
-from typing import Optional, List
+from typing import Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def format_phone_number(phone: str) -> str:
+    """Format phone number to E.164 format"""
+    # Remove spaces, dashes, and parentheses
+    phone = phone.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    
+    # Add + if not present
+    if not phone.startswith("+"):
+        phone = "+" + phone
+    
+    return phone
+
+
 class SMSService:
     """SMS and WhatsApp service using Twilio"""
     
@@ -35,14 +48,7 @@ class SMSService:
     
     def _format_phone_number(self, phone: str) -> str:
         """Format phone number to E.164 format"""
-        # Remove spaces, dashes, and parentheses
-        phone = phone.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-        
-        # Add + if not present
-        if not phone.startswith("+"):
-            phone = "+" + phone
-        
-        return phone
+        return format_phone_number(phone)
     
     def send_sms(
         self,
@@ -178,76 +184,6 @@ class SMSService:
                 "error": str(e)
             }
     
-    def send_bulk_sms(
-        self,
-        phone_numbers: List[str],
-        message: str
-    ) -> dict:
-        """
-        Send SMS to multiple recipients
-        
-        Args:
-            phone_numbers: List of recipient phone numbers
-            message: Message body
-            
-        Returns:
-            dict with success count and results
-        """
-        results = []
-        success_count = 0
-        
-        for phone in phone_numbers:
-            result = self.send_sms(phone, message)
-            results.append({
-                "phone": phone,
-                "result": result
-            })
-            if result.get("success"):
-                success_count += 1
-        
-        return {
-            "total": len(phone_numbers),
-            "success": success_count,
-            "failed": len(phone_numbers) - success_count,
-            "results": results
-        }
-    
-    def send_bulk_whatsapp(
-        self,
-        phone_numbers: List[str],
-        message: str,
-        media_url: Optional[str] = None
-    ) -> dict:
-        """
-        Send WhatsApp to multiple recipients
-        
-        Args:
-            phone_numbers: List of recipient phone numbers
-            message: Message body
-            media_url: Optional media URL
-            
-        Returns:
-            dict with success count and results
-        """
-        results = []
-        success_count = 0
-        
-        for phone in phone_numbers:
-            result = self.send_whatsapp(phone, message, media_url=media_url)
-            results.append({
-                "phone": phone,
-                "result": result
-            })
-            if result.get("success"):
-                success_count += 1
-        
-        return {
-            "total": len(phone_numbers),
-            "success": success_count,
-            "failed": len(phone_numbers) - success_count,
-            "results": results
-        }
-    
     def test_connection(self) -> dict:
         """Test Twilio connection"""
         if not self.client:
@@ -1,10 +1,11 @@
 from fastapi import APIRouter, HTTPException, status, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from datetime import datetime, timezone, timedelta
-from typing import Optional
+from typing import Optional, Dict
 from .task_models import Task, TaskCreate, TaskUpdate, TaskComment, TaskStats
 from .auth_utils import get_current_user
 from .sanitization import sanitize_dict
+from .inventory_stock import apply_adjustment
 
 router = APIRouter(prefix="/tasks", tags=["Tasks"])
 
@@ -297,31 +298,32 @@ async def get_task(
     return task
 
 
-@router.put("/{task_id}")
-async def update_task(
-    task_id: str,
-    task_data: TaskUpdate,
-    request: Request,
-    db: AsyncIOMotorDatabase = Depends(get_db)
-):
-    """Update a task"""
-    user = await get_current_user(request, db)
-    
-    task = await db.tasks.find_one({"id": task_id, "organization_id": user["organization_id"]})
-    if not task:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
-    
-    update_data = task_data.model_dump(exclude_unset=True)
+async def task_update_fields(
+    db: AsyncIOMotorDatabase,
+    user: dict,
+    task: dict,
+    update_data: dict,
+    assignee_names: Optional[Dict[str, str]] = None
+) -> dict:
+    """Fields to $set for a task update (without updated_at)
     
+    Sanitizes text, fills assigned_to_name (from assignee_names when the
+    caller has already looked them up) and handles completion, starting the
+    approval workflow when the task requires one.
+    """
     # Sanitize user inputs to prevent XSS
     if 'title' in update_data or 'description' in update_data:
         update_data = sanitize_dict(update_data, ['title', 'description'])
     
     # Update assigned user name if changed
     if "assigned_to" in update_data and update_data["assigned_to"]:
-        assigned_user = await db.users.find_one({"id": update_data["assigned_to"]}, {"name": 1})
-        if assigned_user:
-            update_data["assigned_to_name"] = assigned_user["name"]
+        if assignee_names is not None:
+            assigned_name = assignee_names.get(update_data["assigned_to"])
+        else:
+            assigned_user = await db.users.find_one({"id": update_data["assigned_to"]}, {"name": 1})
+            assigned_name = assigned_user["name"] if assigned_user else None
+        if assigned_name:
+            update_data["assigned_to_name"] = assigned_name
     
     # Handle status change to completed
     if update_data.get("status") == "completed" and task.get("status") != "completed":
@@ -332,14 +334,14 @@ async def update_task(
             update_data["status"] = "pending_approval"
             
             # Auto-start workflow
-            from .workflow_engine import WorkflowEngine
-            engine = WorkflowEngine(db)
+            from .workflow_engine import get_workflow_engine
+            engine = get_workflow_engine(db)
             
             try:
                 # Check for duplicate workflow
                 existing_workflow = await db.workflow_instances.find_one({
                     "resource_type": "task",
-                    "resource_id": task_id,
+                    "resource_id": task["id"],
                     "status": {"$in": ["pending", "in_progress", "escalated"]}
                 })
                 
@@ -347,7 +349,7 @@ async def update_task(
                     workflow = await engine.start_workflow(
                         template_id=task["workflow_template_id"],
                         resource_type="task",
-                        resource_id=task_id,
+                        resource_id=task["id"],
                         resource_name=task.get("title", "Task"),
                         created_by=user["id"],
                         created_by_name=user["name"],
@@ -357,7 +359,26 @@ async def update_task(
                     update_data["workflow_id"] = workflow["id"]
             except Exception as e:
                 import logging
-                logging.error(f"Failed to start workflow for task {task_id}: {str(e)}")
+                logging.error(f"Failed to start workflow for task {task['id']}: {str(e)}")
+    
+    return update_data
+
+
+@router.put("/{task_id}")
+async def update_task(
+    task_id: str,
+    task_data: TaskUpdate,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Update a task"""
+    user = await get_current_user(request, db)
+    
+    task = await db.tasks.find_one({"id": task_id, "organization_id": user["organization_id"]})
+    if not task:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Task not found")
+    
+    update_data = await task_update_fields(db, user, task, task_data.model_dump(exclude_unset=True))
     
     if update_data:
         update_data["updated_at"] = datetime.now(timezone.utc).isoformat()
@@ -538,16 +559,38 @@ async def log_parts_usage(
             detail="Task not found",
         )
     
-    # Add parts to task
-    parts_used = task.get("parts_used", [])
-    parts_used.append(parts_data)
+    # Draw stock for inventory parts ({part_id, quantity}) atomically, with a ledger entry
+    item = None
+    if parts_data.get("part_id") and parts_data.get("quantity"):
+        try:
+            quantity = float(parts_data["quantity"])
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Quantity must be a number")
+        
+        item = await apply_adjustment(
+            db,
+            user["organization_id"],
+            parts_data["part_id"],
+            -quantity,
+            user["id"],
+            movement_type="consumption",
+            reference_type="task",
+            reference_id=task_id
+        )
+        if not item:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Inventory item not found")
     
+    # $push, so concurrent logs on one task are all kept
     await db.tasks.update_one(
         {"id": task_id},
-        {"$set": {"parts_used": parts_used}}
+        {"$push": {"parts_used": parts_data}}
     )
     
-    return {"message": "Parts logged successfully", "parts": parts_data}
+    return {
+        "message": "Parts logged successfully",
+        "parts": parts_data,
+        "quantity_on_hand": item["quantity_on_hand"] if item else None
+    }
 
 
 @router.get("/{task_id}/dependencies")
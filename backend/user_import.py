@@ -0,0 +1,627 @@
+"""
+User Import - Streaming, batched bulk user import jobs
+
+POST /api/bulk-import/users streams the uploaded CSV into GridFS, stores a
+user_import_jobs document and returns 202. Background workers claim queued
+jobs with a renewable lease (same scheme as the bulk SMS sender and PDF
+exports) and import the file USER_IMPORT_BATCH_SIZE rows at a time:
+
+    1. rows are parsed incrementally from GridFS (the file is never held in
+       memory as a whole) and checked with validate_csv_row
+    2. the batch's role codes and emails are resolved with one `$in` query
+       each; roles and groups are cached for the rest of the job
+    3. passwords are bcrypt-hashed in a process pool, split across
+       USER_IMPORT_HASH_WORKERS processes
+    4. users are written with one insert_many(ordered=False), group
+       memberships with one bulk_write, invitations with one insert_many and
+       their emails with one outbox insert
+    5. rejected rows go to user_import_errors and the job counters advance
+
+GET /api/bulk-import/jobs/{job_id} can be polled while the job runs; the
+rejected rows are downloadable as CSV from /jobs/{job_id}/errors.
+
+Job statuses: queued, running, completed, completed_with_errors, failed.
+A job whose worker died is reclaimed once its lease expires and resumes
+after the last committed batch (rows_done).
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from fastapi import UploadFile, HTTPException, status
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any, Tuple, Set, AsyncIterator, Awaitable, Callable
+import asyncio
+import csv
+import io
+import os
+import uuid
+import logging
+
+from .auth_utils import get_password_hash
+from .gridfs_streaming import CHUNK_SIZE, open_grid_file
+from .import_files import ImportFileError, iter_csv_rows
+from .email_service import EmailService
+from .email_outbox import outbox as email_outbox
+from .permission_models import UserInvitation
+from .invitation_routes import generate_invitation_token
+from .webhook_routes import trigger_webhooks_many
+
+logger = logging.getLogger(__name__)
+
+USER_IMPORT_WORKERS = int(os.environ.get("USER_IMPORT_WORKERS", "1"))
+USER_IMPORT_BATCH_SIZE = int(os.environ.get("USER_IMPORT_BATCH_SIZE", "500"))
+USER_IMPORT_HASH_WORKERS = int(os.environ.get("USER_IMPORT_HASH_WORKERS", str(os.cpu_count() or 2)))
+USER_IMPORT_MAX_BYTES = int(os.environ.get("USER_IMPORT_MAX_BYTES", str(50 * 1024 * 1024)))
+
+VALID_ROLES = ["viewer", "operator", "inspector", "supervisor", "manager", "team_lead", "operations_manager", "admin", "master", "developer"]
+REQUIRED_COLUMNS = ["email", "name"]
+ERROR_REPORT_COLUMNS = ["row", "email", "errors"]
+
+INVITATION_DAYS = 7
+JOB_LEASE_SECONDS = 300
+POLL_INTERVAL_SECONDS = 5
+
+
+# ==================== ROWS ====================
+
+def validate_csv_row(row: dict, row_number: int) -> tuple:
+    """Validate a single CSV row"""
+    errors = []
+
+    # Required fields
+    if not row.get("email"):
+        errors.append(f"Row {row_number}: Email is required")
+    if not row.get("name"):
+        errors.append(f"Row {row_number}: Name is required")
+
+    # Email format validation (basic)
+    email = row.get("email", "")
+    if email and "@" not in email:
+        errors.append(f"Row {row_number}: Invalid email format")
+
+    # Role validation
+    role = row_role(row)
+    if role not in VALID_ROLES:
+        errors.append(f"Row {row_number}: Invalid role. Must be one of: {', '.join(VALID_ROLES)}")
+
+    return (len(errors) == 0, errors)
+
+
+def row_role(row: dict) -> str:
+    """Role code for a row; blank means viewer"""
+    return (row.get("role") or "viewer").strip().lower()
+
+
+def row_email(row: dict) -> str:
+    return (row.get("email") or "").strip().lower()
+
+
+def iter_user_rows(read: Callable[[int], Awaitable[bytes]]) -> AsyncIterator[Tuple[int, Dict[str, str]]]:
+    """Rows of a user CSV; raises ImportFileError when it cannot be read"""
+    return iter_csv_rows(read, REQUIRED_COLUMNS)
+
+
+# ==================== BATCH CHECKS ====================
+
+class ImportContext:
+    """Per-import lookups shared by every batch (validation dry runs and jobs)"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, organization_id: str, creator_level: int):
+        self.db = db
+        self.organization_id = organization_id
+        self.creator_level = creator_level
+        self.roles: Dict[str, Optional[dict]] = {}
+        self.groups: Optional[Dict[str, str]] = None
+        self.seen_emails: Set[str] = set()
+
+    async def _resolve_roles(self, codes: Set[str]):
+        """Cache role levels for codes not seen yet, in one query"""
+        missing = [code for code in codes if code not in self.roles]
+        if not missing:
+            return
+        found = await self.db.roles.find(
+            {"organization_id": self.organization_id, "code": {"$in": missing}},
+            {"_id": 0, "code": 1, "level": 1}
+        ).to_list(None)
+        self.roles.update({code: None for code in missing})
+        self.roles.update({role["code"]: role for role in found})
+
+    async def _existing_emails(self, emails: Set[str]) -> Set[str]:
+        if not emails:
+            return set()
+        existing = await self.db.users.find(
+            {"organization_id": self.organization_id, "email": {"$in": list(emails)}},
+            {"_id": 0, "email": 1}
+        ).to_list(None)
+        return {user["email"] for user in existing}
+
+    async def group_ids(self) -> Dict[str, str]:
+        """Group name -> id for the organization, loaded once"""
+        if self.groups is None:
+            groups = await self.db.user_groups.find(
+                {"organization_id": self.organization_id},
+                {"_id": 0, "id": 1, "name": 1}
+            ).to_list(None)
+            self.groups = {group["name"]: group["id"] for group in groups}
+        return self.groups
+
+    async def check_batch(self, rows: List[Tuple[int, Dict[str, str]]]) -> Tuple[List[dict], List[dict]]:
+        """Validate a batch of rows; returns (accepted, rejected)
+
+        Rejected entries carry row, email, data, errors and whether the email
+        already exists in the organization.
+        """
+        await self._resolve_roles({row_role(row) for _, row in rows})
+        existing = await self._existing_emails({row_email(row) for _, row in rows if row_email(row)})
+
+        accepted = []
+        rejected = []
+        for row_number, row in rows:
+            is_valid, errors = validate_csv_row(row, row_number)
+            role_code = row_role(row)
+            email = row_email(row)
+
+            # Can only import users with equal or lower authority (higher level number)
+            target_role = self.roles.get(role_code)
+            if target_role and self.creator_level > target_role.get("level", 999):
+                errors.append(f"Cannot import {role_code} role (higher authority than your role)")
+                is_valid = False
+
+            if email in existing:
+                rejected.append({"row": row_number, "email": email, "data": row, "errors": ["Email already exists"], "duplicate": True})
+                continue
+            if email and email in self.seen_emails:
+                errors.append(f"Row {row_number}: Email appears more than once in the file")
+                is_valid = False
+            if email:
+                self.seen_emails.add(email)
+
+            if not is_valid:
+                rejected.append({"row": row_number, "email": email, "data": row, "errors": errors, "duplicate": False})
+                continue
+
+            accepted.append({
+                "row": row_number,
+                "email": email,
+                "name": row.get("name", ""),
+                "role": role_code,
+                "group": row.get("group", ""),
+                "password": row.get("password", "")
+            })
+        return accepted, rejected
+
+
+def _hash_passwords(passwords: List[str]) -> List[str]:
+    """bcrypt-hash passwords (runs in the hashing pool)"""
+    return [get_password_hash(password) for password in passwords]
+
+
+# ==================== JOBS ====================
+
+class UserImportRunner:
+    """Creates bulk user import jobs and runs them in background workers"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.worker_id = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Start the import job workers"""
+        if self._workers:
+            return
+
+        self.db = db
+        self._wakeup = asyncio.Event()
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(USER_IMPORT_WORKERS)
+        ]
+        logger.info(f"User import runner started with {USER_IMPORT_WORKERS} job workers")
+
+    async def stop(self):
+        """Stop workers; running jobs resume once their lease expires"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def wake(self):
+        if self._wakeup:
+            self._wakeup.set()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=USER_IMPORT_HASH_WORKERS)
+        return self._pool
+
+    async def hash_passwords(self, passwords: List[str]) -> List[str]:
+        """Hash passwords in the pool, one slice per worker process; keeps order"""
+        if not passwords:
+            return []
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        size = -(-len(passwords) // USER_IMPORT_HASH_WORKERS)
+        parts = await asyncio.gather(*(
+            loop.run_in_executor(pool, _hash_passwords, passwords[i:i + size])
+            for i in range(0, len(passwords), size)
+        ))
+        return [hashed for part in parts for hashed in part]
+
+    # ==================== JOB CREATION ====================
+
+    async def create_job(
+        self,
+        db: AsyncIOMotorDatabase,
+        file: UploadFile,
+        user: Dict[str, Any],
+        creator_level: int,
+        send_invitations: bool
+    ) -> Dict[str, Any]:
+        """Stream the upload into GridFS and queue an import job; returns the job"""
+        job_id = str(uuid.uuid4())
+        now = datetime.now(timezone.utc).isoformat()
+
+        fs = AsyncIOMotorGridFSBucket(db)
+        grid_in = fs.open_upload_stream(
+            file.filename,
+            chunk_size_bytes=CHUNK_SIZE,
+            metadata={
+                "content_type": "text/csv",
+                "organization_id": user["organization_id"],
+                "user_import_job_id": job_id,
+                "uploaded_by": user["id"],
+                "uploaded_at": now
+            }
+        )
+        size = 0
+        try:
+            while chunk := await file.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > USER_IMPORT_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"File too large. Maximum size is {USER_IMPORT_MAX_BYTES // (1024 * 1024)}MB"
+                    )
+                await grid_in.write(chunk)
+        except BaseException:
+            await grid_in.abort()
+            raise
+        await grid_in.close()
+
+        job = {
+            "id": job_id,
+            "organization_id": user["organization_id"],
+            "filename": file.filename,
+            "file_id": str(grid_in._id),
+            "size": size,
+            "send_invitations": send_invitations,
+            "status": "queued",
+            "rows_done": 0,
+            "bytes_read": 0,
+            "processed": 0,
+            "imported": 0,
+            "failed": 0,
+            "invitations_queued": 0,
+            "error": None,
+            "created_by": user["id"],
+            "created_by_name": user.get("name"),
+            "created_by_email": user.get("email"),
+            "creator_level": creator_level,
+            "created_at": now,
+            "updated_at": now,
+            "started_at": None,
+            "completed_at": None
+        }
+        await db.user_import_jobs.insert_one(job.copy())
+
+        self.wake()
+        return job
+
+    # ==================== WORKERS ====================
+
+    async def _worker_loop(self, index: int):
+        """Claim and run jobs until cancelled"""
+        while True:
+            try:
+                job = await self._claim_job()
+                if job:
+                    await self._run_job(job)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"User import worker {index} error: {str(e)}")
+
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    def _lease(self) -> str:
+        return (datetime.now(timezone.utc) + timedelta(seconds=JOB_LEASE_SECONDS)).isoformat()
+
+    async def _claim_job(self) -> Optional[dict]:
+        """Atomically claim the oldest queued job (or one whose lease expired)"""
+        now = datetime.now(timezone.utc).isoformat()
+        return await self.db.user_import_jobs.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued"},
+                    {"status": "running", "locked_until": {"$lt": now}}
+                ]
+            },
+            {"$set": {"status": "running", "locked_by": self.worker_id, "locked_until": self._lease()}},
+            sort=[("created_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run_job(self, job: dict):
+        job_id = job["id"]
+        grid_out = await open_grid_file(self.db, job["file_id"])
+        if not grid_out:
+            await self._finish_job(job_id, "failed", error="Uploaded file is missing")
+            return
+
+        if not job.get("started_at"):
+            await self.db.user_import_jobs.update_one(
+                {"id": job_id},
+                {"$set": {"started_at": datetime.now(timezone.utc).isoformat()}}
+            )
+
+        # Rows up to rows_done were committed by a previous worker; their users
+        # now exist, so the email lookup rejects any that are replayed
+        resume_after = job.get("rows_done", 0)
+        context = ImportContext(self.db, job["organization_id"], job.get("creator_level", 999))
+        batch: List[Tuple[int, Dict[str, str]]] = []
+
+        try:
+            async for row_number, row in iter_user_rows(grid_out.read):
+                if row_number <= resume_after:
+                    continue
+                batch.append((row_number, row))
+                if len(batch) >= USER_IMPORT_BATCH_SIZE:
+                    await self._import_batch(job, context, batch, grid_out.tell())
+                    batch = []
+            if batch:
+                await self._import_batch(job, context, batch, grid_out.tell())
+        except asyncio.CancelledError:
+            raise
+        except _LeaseLost:
+            return
+        except ImportFileError as e:
+            await self._finish_job(job_id, "failed", error=f"Failed to parse CSV: {str(e)}")
+            return
+        except Exception as e:
+            logger.error(f"User import job {job_id} failed: {str(e)}")
+            await self._finish_job(job_id, "failed", error=str(e))
+            return
+
+        current = await self.db.user_import_jobs.find_one(
+            {"id": job_id}, {"_id": 0, "processed": 1, "imported": 1, "failed": 1}
+        ) or {}
+        await self._audit(job, current)
+        await self._finish_job(job_id, "completed_with_errors" if current.get("failed") else "completed")
+
+    async def _import_batch(
+        self,
+        job: dict,
+        context: ImportContext,
+        batch: List[Tuple[int, Dict[str, str]]],
+        bytes_read: int
+    ):
+        """Check, hash and write one batch, then record its progress"""
+        accepted, rejected = await context.check_batch(batch)
+
+        hashes = iter(await self.hash_passwords([entry["password"] for entry in accepted if entry["password"]]))
+        now = datetime.now(timezone.utc).isoformat()
+        users = []
+        for entry in accepted:
+            new_user = {
+                "id": str(uuid.uuid4()),
+                "email": entry["email"],
+                "name": entry["name"],
+                "role": entry["role"],
+                "organization_id": job["organization_id"],
+                "auth_provider": "local",
+                "is_active": True,
+                "created_at": now,
+                "updated_at": now
+            }
+            if entry["password"]:
+                new_user["password_hash"] = next(hashes)
+            users.append(new_user)
+
+        inserted = list(zip(accepted, users))
+        if users:
+            try:
+                await self.db.users.insert_many([user.copy() for user in users], ordered=False)
+            except BulkWriteError as e:
+                failed_indexes = set()
+                for error in e.details.get("writeErrors", []):
+                    failed_indexes.add(error["index"])
+                    entry = accepted[error["index"]]
+                    rejected.append({"row": entry["row"], "email": entry["email"], "errors": [error.get("errmsg", "Insert failed")]})
+                inserted = [pair for i, pair in enumerate(inserted) if i not in failed_indexes]
+
+        await self._add_to_groups(context, inserted)
+        invitations_queued = 0
+        if job.get("send_invitations") and inserted:
+            invitations_queued = await self._invite(job, [user for _, user in inserted])
+
+        if inserted:
+            await trigger_webhooks_many(
+                "user.created",
+                [{"id": user["id"], "email": user["email"], "name": user["name"], "role": user["role"]} for _, user in inserted],
+                job["organization_id"],
+                self.db
+            )
+
+        if rejected:
+            await self.db.user_import_errors.insert_many([
+                {
+                    "job_id": job["id"],
+                    "row": entry["row"],
+                    "email": entry.get("email"),
+                    "errors": entry["errors"],
+                    "created_at": now
+                }
+                for entry in sorted(rejected, key=lambda entry: entry["row"])
+            ])
+
+        result = await self.db.user_import_jobs.update_one(
+            {"id": job["id"], "locked_by": self.worker_id},
+            {
+                "$inc": {
+                    "processed": len(batch),
+                    "imported": len(inserted),
+                    "failed": len(rejected),
+                    "invitations_queued": invitations_queued
+                },
+                "$set": {
+                    "rows_done": batch[-1][0],
+                    "bytes_read": bytes_read,
+                    "updated_at": datetime.now(timezone.utc).isoformat(),
+                    "locked_until": self._lease()
+                }
+            }
+        )
+        if not result.matched_count:
+            raise _LeaseLost(job["id"])
+
+    async def _add_to_groups(self, context: ImportContext, inserted: List[Tuple[dict, dict]]):
+        """Add imported users to their named groups in one bulk write (unknown groups are ignored)"""
+        if not any(entry["group"] for entry, _ in inserted):
+            return
+        group_ids = await context.group_ids()
+
+        members: Dict[str, List[str]] = {}
+        for entry, user in inserted:
+            group_id = group_ids.get(entry["group"])
+            if group_id:
+                members.setdefault(group_id, []).append(user["id"])
+
+        if members:
+            await self.db.user_groups.bulk_write([
+                UpdateOne({"id": group_id}, {"$addToSet": {"member_ids": {"$each": member_ids}}})
+                for group_id, member_ids in members.items()
+            ], ordered=False)
+
+    async def _invite(self, job: dict, users: List[dict]) -> int:
+        """Create invitations for imported users and queue their emails; returns emails queued"""
+        expires_at = (datetime.now(timezone.utc) + timedelta(days=INVITATION_DAYS)).isoformat()
+        invitations = [
+            UserInvitation(
+                email=user["email"],
+                token=generate_invitation_token(),
+                invited_by=job["created_by"],
+                invited_by_name=job.get("created_by_name") or "Unknown",
+                organization_id=job["organization_id"],
+                role_id=user["role"],
+                expires_at=expires_at
+            ).dict()
+            for user in users
+        ]
+        await self.db.invitations.insert_many([invitation.copy() for invitation in invitations])
+
+        org_settings = await self.db.organization_settings.find_one(
+            {"organization_id": job["organization_id"]},
+            {"_id": 0, "sendgrid_api_key": 1}
+        )
+        sendgrid_key = org_settings.get("sendgrid_api_key") if org_settings else None
+        if not sendgrid_key:
+            return 0
+
+        email_service = EmailService(sendgrid_key)
+        frontend_url = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+        org = await self.db.organizations.find_one({"id": job["organization_id"]}, {"_id": 0, "name": 1})
+        org_name = org.get("name") if org else "Your Organization"
+
+        messages = []
+        for invitation in invitations:
+            subject, html_content = email_service.render_invitation_email(
+                inviter_name=job.get("created_by_name") or "A team member",
+                organization_name=org_name,
+                invitation_token=invitation["token"],
+                frontend_url=frontend_url
+            )
+            messages.append({
+                "to_emails": [invitation["email"]],
+                "subject": subject,
+                "html_content": html_content,
+                "organization_id": job["organization_id"],
+                "email_type": "invitation",
+                "from_email": "noreply@opsplatform.com",
+                "from_name": "OpsPlatform"
+            })
+        return len(await email_outbox.enqueue_many(self.db, messages))
+
+    async def _audit(self, job: dict, counters: dict):
+        await self.db.audit_logs.insert_one({
+            "id": str(uuid.uuid4()),
+            "organization_id": job["organization_id"],
+            "user_id": job["created_by"],
+            "user_email": job.get("created_by_email"),
+            "user_name": job.get("created_by_name"),
+            "action": "users.bulk_imported",
+            "resource_type": "user",
+            "resource_id": "bulk",
+            "result": "success",
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "context": {
+                "job_id": job["id"],
+                "total_rows": counters.get("processed", 0),
+                "imported": counters.get("imported", 0),
+                "failed": counters.get("failed", 0),
+                "filename": job["filename"]
+            }
+        })
+
+    async def _finish_job(self, job_id: str, status: str, error: Optional[str] = None):
+        """Record the final status and release the lease"""
+        now = datetime.now(timezone.utc).isoformat()
+        update = {"status": status, "completed_at": now, "updated_at": now}
+        if error:
+            update["error"] = error
+
+        await self.db.user_import_jobs.update_one(
+            {"id": job_id, "locked_by": self.worker_id},
+            {"$set": update, "$unset": {"locked_by": "", "locked_until": ""}}
+        )
+        logger.info(f"User import job {job_id} finished: {status}")
+
+    # ==================== ERROR REPORT ====================
+
+    async def iter_error_report(self, db: AsyncIOMotorDatabase, job_id: str) -> AsyncIterator[bytes]:
+        """Rejected rows as CSV (row, email, errors), streamed from the database"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(ERROR_REPORT_COLUMNS)
+
+        cursor = db.user_import_errors.find(
+            {"job_id": job_id}, {"_id": 0, "row": 1, "email": 1, "errors": 1}
+        ).sort("row", 1)
+        async for entry in cursor:
+            writer.writerow([entry["row"], entry.get("email") or "", "; ".join(entry.get("errors") or [])])
+            if buffer.tell() >= CHUNK_SIZE:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
+
+
+class _LeaseLost(Exception):
+    """Another worker took over the job"""
+
+
+# Process-wide runner (started from server startup)
+importer = UserImportRunner()
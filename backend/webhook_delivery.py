@@ -0,0 +1,809 @@
+"""
+Webhook Delivery Queue - Durable, retrying webhook delivery
+
+Deliveries are persisted in webhook_deliveries (status, next_attempt_at) and
+drained by a bounded pool of worker tasks sharing one pooled aiohttp session.
+Failed attempts are rescheduled with exponential backoff and jitter; after
+max_retries attempts a delivery is moved to the dead_letter state. Because
+the queue lives in MongoDB, in-flight retries survive restarts and are picked
+up by whichever worker process claims them first.
+
+Delivery statuses:
+    pending      - waiting for its first attempt
+    in_flight    - claimed by a worker (reclaimable once locked_until passes)
+    retrying     - last attempt failed, next attempt at next_attempt_at
+    success      - delivered (2xx/3xx response)
+    dead_letter  - gave up after max_retries attempts
+
+Webhooks in batch mode queue each event as batch_queued; a batcher task
+coalesces them per subscription into one "batch" delivery (flushed at
+batch_max_events events or batch_max_wait_ms after the oldest event), which
+is signed and sent once. Contained events are marked batched with the
+batch's id and take the batch's final status.
+
+Each receiving URL has a circuit breaker (webhook_circuits collection, shared
+by all workers): after CIRCUIT_FAILURE_THRESHOLD consecutive failures it
+opens and deliveries to that URL are pushed back to the queue without
+spending an attempt, until a single half-open probe succeeds. Concurrency
+per host adapts to observed latency (AIMD) inside each process.
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any
+from urllib.parse import urlparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import random
+import time
+import uuid
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+# Worker pool and connection pool sizing
+WEBHOOK_WORKERS = int(os.environ.get("WEBHOOK_WORKERS", "8"))
+WEBHOOK_MAX_CONNECTIONS = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", "100"))
+WEBHOOK_CONNECTIONS_PER_HOST = int(os.environ.get("WEBHOOK_CONNECTIONS_PER_HOST", "4"))
+WEBHOOK_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("WEBHOOK_MAX_CONNECTIONS_PER_HOST", "16"))
+
+# Circuit breaker: trip after N consecutive failures, stay open for a
+# cooldown that doubles on every failed half-open probe (capped)
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("WEBHOOK_CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_COOLDOWN_SECONDS = 60
+CIRCUIT_MAX_COOLDOWN_SECONDS = 30 * 60
+
+# Adaptive concurrency: responses slower than this shrink the per-host limit
+LATENCY_TARGET_SECONDS = 2.0
+
+# How long a worker waits for a per-host slot before putting the delivery back
+HOST_SLOT_WAIT_SECONDS = 1.0
+HOST_BUSY_REQUEUE_SECONDS = 2
+
+# Per-attempt timeouts (seconds)
+REQUEST_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
+
+# How long a claimed delivery stays locked before another worker may take it
+CLAIM_LEASE_SECONDS = REQUEST_TIMEOUT * 2
+
+# Backoff cap and idle polling interval (seconds)
+MAX_BACKOFF_SECONDS = 6 * 3600
+POLL_INTERVAL_SECONDS = 5
+
+# Routing table staleness bound for edits made by other worker processes
+ROUTING_TTL_SECONDS = 60
+
+CLAIMABLE_STATUSES = ["pending", "retrying"]
+FINAL_STATUSES = ["success", "dead_letter"]
+
+# Batcher tick, and how long claimed events may wait for their batch
+# document before being returned to the queue (crash recovery)
+BATCH_TICK_SECONDS = 0.25
+BATCH_ORPHAN_SECONDS = 60
+
+
+def create_signature(payload: str, secret: str) -> str:
+    """Create HMAC signature for webhook payload"""
+    return hmac.new(
+        secret.encode('utf-8'),
+        payload.encode('utf-8'),
+        hashlib.sha256
+    ).hexdigest()
+
+
+def compute_backoff(attempt: int, base_delay: int) -> float:
+    """Exponential backoff with jitter: half fixed, half random, capped"""
+    delay = min(MAX_BACKOFF_SECONDS, base_delay * (2 ** max(attempt - 1, 0)))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+def build_delivery(webhook: dict, event_type: str, payload: dict) -> Dict[str, Any]:
+    """Build a queued delivery document for one subscriber"""
+    delivery_id = str(uuid.uuid4())
+    now = datetime.now(timezone.utc)
+
+    delivery = {
+        "id": delivery_id,
+        "webhook_id": webhook["id"],
+        "organization_id": webhook["organization_id"],
+        "event_type": event_type,
+        "payload": payload,
+        # Body sent to the receiver; signed at send time with the current secret
+        "body": {
+            "id": delivery_id,
+            "event": event_type,
+            "timestamp": now.isoformat(),
+            "data": payload
+        },
+        "status": "pending",
+        "attempt_count": 0,
+        "max_retries": webhook.get("max_retries", 3),
+        "retry_delay": webhook.get("retry_delay", 60),
+        "next_attempt_at": now.isoformat(),
+        "created_at": now.isoformat()
+    }
+
+    if webhook.get("batch_mode"):
+        delivery["status"] = "batch_queued"
+        delivery["batch_max_events"] = webhook.get("batch_max_events", 100)
+        delivery["flush_at"] = (now + timedelta(milliseconds=webhook.get("batch_max_wait_ms", 5000))).isoformat()
+
+    return delivery
+
+
+def build_batch_delivery(batch_id: str, webhook_id: str, organization_id: str, events: List[dict]) -> Dict[str, Any]:
+    """Build one delivery carrying several queued events for the same subscription"""
+    now = datetime.now(timezone.utc).isoformat()
+    first = events[0]
+
+    return {
+        "id": batch_id,
+        "kind": "batch",
+        "webhook_id": webhook_id,
+        "organization_id": organization_id,
+        "event_type": "batch",
+        "event_count": len(events),
+        "event_delivery_ids": [e["id"] for e in events],
+        "body": {
+            "id": batch_id,
+            "event": "batch",
+            "timestamp": now,
+            "events": [e["body"] for e in events]
+        },
+        "status": "pending",
+        "attempt_count": 0,
+        "max_retries": first.get("max_retries", 3),
+        "retry_delay": first.get("retry_delay", 60),
+        "next_attempt_at": now,
+        "created_at": now
+    }
+
+
+class CircuitBreaker:
+    """Per-URL circuit breaker state, stored in webhook_circuits"""
+
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    async def before_attempt(self, url: str, worker_id: str) -> Optional[str]:
+        """
+        Decide whether a delivery to this URL may be attempted now
+        Returns None to allow it, or the ISO time until which the circuit stays
+        open (the delivery should be retried then, without spending an attempt)
+        """
+        circuit = await self.db.webhook_circuits.find_one({"url": url}, {"_id": 0})
+        if not circuit or circuit.get("state", "closed") == "closed":
+            return None
+
+        now = datetime.now(timezone.utc)
+
+        # Open circuit past its cooldown, or a half-open probe that never
+        # reported back: try to become the (single) probe
+        probe = await self.db.webhook_circuits.find_one_and_update(
+            {
+                "url": url,
+                "$or": [
+                    {"state": "open", "open_until": {"$lte": now.isoformat()}},
+                    {"state": "half_open", "probe_until": {"$lt": now.isoformat()}}
+                ]
+            },
+            {
+                "$set": {
+                    "state": "half_open",
+                    "probe_by": worker_id,
+                    "probe_until": (now + timedelta(seconds=CLAIM_LEASE_SECONDS)).isoformat()
+                }
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if probe:
+            logger.info(f"Webhook circuit for {url} half-open, probing")
+            return None
+
+        if circuit.get("state") == "half_open":
+            return circuit.get("probe_until") or now.isoformat()
+        return circuit.get("open_until") or now.isoformat()
+
+    async def record_success(self, url: str):
+        """Close the circuit after a successful delivery"""
+        now = datetime.now(timezone.utc).isoformat()
+        circuit = await self.db.webhook_circuits.find_one_and_update(
+            {"url": url, "$or": [{"state": {"$ne": "closed"}}, {"consecutive_failures": {"$gt": 0}}]},
+            {
+                "$set": {
+                    "state": "closed",
+                    "consecutive_failures": 0,
+                    "cooldown_seconds": CIRCUIT_COOLDOWN_SECONDS,
+                    "last_success_at": now
+                },
+                "$unset": {"open_until": "", "probe_by": "", "probe_until": ""}
+            }
+        )
+        if circuit and circuit.get("state") != "closed":
+            logger.info(f"Webhook circuit for {url} closed")
+
+    async def record_failure(self, url: str, webhook: dict):
+        """Count a failure; trip (or re-open after a failed probe) when due"""
+        now = datetime.now(timezone.utc)
+        circuit = await self.db.webhook_circuits.find_one_and_update(
+            {"url": url},
+            {
+                "$inc": {"consecutive_failures": 1},
+                "$set": {"last_failure_at": now.isoformat()},
+                "$setOnInsert": {
+                    "organization_id": webhook["organization_id"],
+                    "state": "closed",
+                    "trip_count": 0,
+                    "cooldown_seconds": CIRCUIT_COOLDOWN_SECONDS
+                }
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+
+        state = circuit.get("state", "closed")
+        if state == "half_open":
+            # Probe failed: back off harder before the next probe
+            cooldown = min(CIRCUIT_MAX_COOLDOWN_SECONDS, circuit.get("cooldown_seconds", CIRCUIT_COOLDOWN_SECONDS) * 2)
+        elif state == "closed" and circuit["consecutive_failures"] >= CIRCUIT_FAILURE_THRESHOLD:
+            cooldown = CIRCUIT_COOLDOWN_SECONDS
+        else:
+            return
+
+        # Only the caller that observes the transition performs it
+        result = await self.db.webhook_circuits.update_one(
+            {"url": url, "state": state},
+            {
+                "$set": {
+                    "state": "open",
+                    "opened_at": now.isoformat(),
+                    "open_until": (now + timedelta(seconds=cooldown)).isoformat(),
+                    "cooldown_seconds": cooldown
+                },
+                "$inc": {"trip_count": 1 if state == "closed" else 0},
+                "$unset": {"probe_by": "", "probe_until": ""}
+            }
+        )
+        if result.modified_count:
+            logger.warning(f"Webhook circuit for {url} opened for {cooldown}s")
+
+
+class AdaptiveHostLimiter:
+    """
+    Per-host concurrency limit driven by observed latency (AIMD):
+    fast successes grow the limit by one per window, slow responses and
+    failures halve it. Lives in-process; each worker process adapts on its own.
+    """
+
+    def __init__(self, initial: int, maximum: int):
+        self.initial = initial
+        self.maximum = maximum
+        self._hosts: Dict[str, Dict[str, Any]] = {}
+
+    def _host(self, host: str) -> Dict[str, Any]:
+        if host not in self._hosts:
+            self._hosts[host] = {
+                "limit": self.initial,
+                "in_flight": 0,
+                "successes": 0,
+                "latency_ewma": None,
+                "condition": asyncio.Condition()
+            }
+        return self._hosts[host]
+
+    async def acquire(self, host: str, timeout: float) -> bool:
+        """Take a slot for this host, waiting up to timeout seconds"""
+        state = self._host(host)
+        condition = state["condition"]
+
+        async with condition:
+            try:
+                await asyncio.wait_for(
+                    condition.wait_for(lambda: state["in_flight"] < state["limit"]),
+                    timeout=timeout
+                )
+            except asyncio.TimeoutError:
+                return False
+            state["in_flight"] += 1
+            return True
+
+    async def release(self, host: str, latency: float, success: bool):
+        """Return a slot and adapt the host's limit"""
+        state = self._host(host)
+        ewma = state["latency_ewma"]
+        state["latency_ewma"] = latency if ewma is None else 0.8 * ewma + 0.2 * latency
+
+        if not success or latency > LATENCY_TARGET_SECONDS:
+            state["limit"] = max(1, state["limit"] // 2)
+            state["successes"] = 0
+        else:
+            state["successes"] += 1
+            if state["successes"] >= state["limit"]:
+                state["limit"] = min(self.maximum, state["limit"] + 1)
+                state["successes"] = 0
+
+        async with state["condition"]:
+            state["in_flight"] -= 1
+            state["condition"].notify_all()
+
+    def snapshot(self, host: str) -> Optional[Dict[str, Any]]:
+        """Current limit/in-flight/latency for a host, if it has been used"""
+        state = self._hosts.get(host)
+        if not state:
+            return None
+        return {
+            "limit": state["limit"],
+            "in_flight": state["in_flight"],
+            "latency_ewma_ms": round(state["latency_ewma"] * 1000, 1) if state["latency_ewma"] is not None else None
+        }
+
+
+def url_host(url: str) -> str:
+    """Host key used for per-host concurrency"""
+    return urlparse(str(url)).netloc.lower()
+
+
+class WebhookRoutingTable:
+    """
+    In-memory (organization_id, event_type) -> active subscriptions map
+
+    Loaded lazily per organization with one query and cached, including
+    organizations with no webhooks, so emitting an event normally costs no
+    database round trip. Webhook edits in this process invalidate the
+    organization immediately; edits made by other worker processes are
+    picked up within ROUTING_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        # organization_id -> (version, loaded_at, {event_type: [webhook, ...]})
+        self._orgs: Dict[str, tuple] = {}
+        # A load that overlaps an invalidation of its organization (or of
+        # all of them) is not cached; other organizations' loads still are
+        self._version = 0
+        self._org_versions: Dict[str, int] = {}
+
+    def _current_version(self, organization_id: str) -> tuple:
+        return self._version, self._org_versions.get(organization_id, 0)
+
+    def invalidate(self, organization_id: Optional[str] = None):
+        """Drop cached subscriptions for one organization (or all)"""
+        if organization_id:
+            self._org_versions[organization_id] = self._org_versions.get(organization_id, 0) + 1
+            self._orgs.pop(organization_id, None)
+        else:
+            self._version += 1
+            self._orgs.clear()
+
+    async def subscriptions(
+        self,
+        db: AsyncIOMotorDatabase,
+        organization_id: str,
+        event_type: str
+    ) -> List[dict]:
+        """Active webhooks of an organization subscribed to an event"""
+        now = time.monotonic()
+        cached = self._orgs.get(organization_id)
+        if cached and cached[0] == self._current_version(organization_id) and now - cached[1] < ROUTING_TTL_SECONDS:
+            return cached[2].get(event_type, [])
+
+        version = self._current_version(organization_id)
+        # Secrets are not cached; the dispatcher reads them at send time
+        webhooks = await db.webhooks.find(
+            {"organization_id": organization_id, "is_active": True},
+            {"_id": 0, "secret": 0}
+        ).to_list(None)
+
+        routes: Dict[str, List[dict]] = {}
+        for webhook in webhooks:
+            for event in webhook.get("events", []):
+                routes.setdefault(event, []).append(webhook)
+
+        if version == self._current_version(organization_id):
+            self._orgs[organization_id] = (version, now, routes)
+
+        return routes.get(event_type, [])
+
+
+class WebhookDispatcher:
+    """Drains the webhook_deliveries queue with a bounded worker pool"""
+
+    def __init__(self):
+        self.db: Optional[AsyncIOMotorDatabase] = None
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.worker_id = f"{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._workers: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_wakeup: Optional[asyncio.Event] = None
+        self.circuits: Optional[CircuitBreaker] = None
+        self.host_limiter = AdaptiveHostLimiter(WEBHOOK_CONNECTIONS_PER_HOST, WEBHOOK_MAX_CONNECTIONS_PER_HOST)
+
+    # ==================== LIFECYCLE ====================
+
+    async def start(self, db: AsyncIOMotorDatabase):
+        """Open the shared HTTP session and start the worker pool"""
+        if self._workers:
+            return
+
+        self.db = db
+        self.circuits = CircuitBreaker(db)
+        self._wakeup = asyncio.Event()
+        self._batch_wakeup = asyncio.Event()
+        # Per-host concurrency is governed by the adaptive limiter; the
+        # connector only enforces its upper bound
+        self.session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=WEBHOOK_MAX_CONNECTIONS,
+                limit_per_host=WEBHOOK_MAX_CONNECTIONS_PER_HOST
+            ),
+            timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT)
+        )
+        self._workers = [
+            asyncio.create_task(self._worker_loop(i)) for i in range(WEBHOOK_WORKERS)
+        ]
+        self._workers.append(asyncio.create_task(self._batcher_loop()))
+        logger.info(f"Webhook dispatcher started with {WEBHOOK_WORKERS} workers")
+
+    async def stop(self):
+        """Stop workers and close the HTTP session; unfinished work stays queued"""
+        for task in self._workers:
+            task.cancel()
+        if self._workers:
+            await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    def wake(self):
+        """Nudge idle workers after new deliveries are queued"""
+        if self._wakeup:
+            self._wakeup.set()
+
+    # ==================== QUEUEING ====================
+
+    async def enqueue(
+        self,
+        db: AsyncIOMotorDatabase,
+        webhooks: List[dict],
+        event_type: str,
+        payloads: List[dict]
+    ) -> List[str]:
+        """Queue one delivery per webhook and payload in a single insert; returns delivery ids"""
+        deliveries = [build_delivery(w, event_type, p) for p in payloads for w in webhooks]
+        if not deliveries:
+            return []
+
+        await db.webhook_deliveries.insert_many([d.copy() for d in deliveries])
+
+        if any(d["status"] == "pending" for d in deliveries):
+            self.wake()
+        if any(d["status"] == "batch_queued" for d in deliveries) and self._batch_wakeup:
+            self._batch_wakeup.set()
+
+        return [d["id"] for d in deliveries]
+
+    # ==================== BATCHING ====================
+
+    async def _batcher_loop(self):
+        """Turn queued batch-mode events into batch deliveries when due"""
+        last_recovery = 0.0
+        while True:
+            try:
+                await self._flush_due_batches()
+
+                if time.monotonic() - last_recovery > BATCH_ORPHAN_SECONDS:
+                    await self._recover_orphaned_events()
+                    last_recovery = time.monotonic()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook batcher error: {str(e)}")
+
+            self._batch_wakeup.clear()
+            try:
+                await asyncio.wait_for(self._batch_wakeup.wait(), timeout=BATCH_TICK_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _flush_due_batches(self):
+        """Flush every subscription that reached its size limit or wait time"""
+        now = datetime.now(timezone.utc).isoformat()
+
+        ready = await self.db.webhook_deliveries.aggregate([
+            {"$match": {"status": "batch_queued"}},
+            {"$group": {
+                "_id": "$webhook_id",
+                "organization_id": {"$first": "$organization_id"},
+                "count": {"$sum": 1},
+                "flush_at": {"$min": "$flush_at"},
+                "max_events": {"$max": "$batch_max_events"}
+            }},
+            {"$match": {"$or": [
+                {"flush_at": {"$lte": now}},
+                {"$expr": {"$gte": ["$count", "$max_events"]}}
+            ]}}
+        ]).to_list(None)
+
+        for group in ready:
+            max_events = max(1, group.get("max_events") or 100)
+            for _ in range(-(-group["count"] // max_events)):
+                if not await self._form_batch(group["_id"], group["organization_id"], max_events):
+                    break
+
+    async def _form_batch(self, webhook_id: str, organization_id: str, max_events: int) -> bool:
+        """Claim up to max_events queued events and queue them as one delivery"""
+        candidates = await self.db.webhook_deliveries.find(
+            {"webhook_id": webhook_id, "status": "batch_queued"},
+            {"_id": 0, "id": 1}
+        ).sort("created_at", 1).limit(max_events).to_list(max_events)
+        if not candidates:
+            return False
+
+        # Claim atomically per event; another process may take some of them
+        batch_id = str(uuid.uuid4())
+        result = await self.db.webhook_deliveries.update_many(
+            {"id": {"$in": [c["id"] for c in candidates]}, "status": "batch_queued"},
+            {"$set": {
+                "status": "batched",
+                "batch_claim_id": batch_id,
+                "batched_at": datetime.now(timezone.utc).isoformat()
+            }}
+        )
+        if result.modified_count == 0:
+            return True
+
+        events = await self.db.webhook_deliveries.find(
+            {"batch_claim_id": batch_id},
+            {"_id": 0, "id": 1, "body": 1, "max_retries": 1, "retry_delay": 1}
+        ).sort("created_at", 1).to_list(None)
+
+        batch = build_batch_delivery(batch_id, webhook_id, organization_id, events)
+        await self.db.webhook_deliveries.insert_one(batch.copy())
+
+        await self.db.webhook_deliveries.update_many(
+            {"batch_claim_id": batch_id},
+            {"$set": {"batch_id": batch_id}}
+        )
+
+        self.wake()
+        return True
+
+    async def _recover_orphaned_events(self):
+        """Requeue events claimed for a batch whose delivery was never written"""
+        cutoff = (datetime.now(timezone.utc) - timedelta(seconds=BATCH_ORPHAN_SECONDS)).isoformat()
+
+        orphans = await self.db.webhook_deliveries.aggregate([
+            {"$match": {"status": "batched", "batch_id": {"$exists": False}, "batched_at": {"$lt": cutoff}}},
+            {"$lookup": {
+                "from": "webhook_deliveries",
+                "localField": "batch_claim_id",
+                "foreignField": "id",
+                "as": "batch"
+            }},
+            {"$match": {"batch": {"$size": 0}}},
+            {"$project": {"_id": 0, "id": 1}}
+        ]).to_list(None)
+
+        if orphans:
+            await self.db.webhook_deliveries.update_many(
+                {"id": {"$in": [o["id"] for o in orphans]}, "status": "batched"},
+                {"$set": {"status": "batch_queued"}, "$unset": {"batch_claim_id": "", "batched_at": ""}}
+            )
+            logger.warning(f"Requeued {len(orphans)} orphaned batched webhook events")
+
+    # ==================== WORKERS ====================
+
+    async def _worker_loop(self, index: int):
+        """Claim and deliver due deliveries until cancelled"""
+        while True:
+            try:
+                delivery = await self._claim_next()
+                if delivery:
+                    await self._attempt(delivery)
+                    continue
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook worker {index} error: {str(e)}")
+
+            # Idle: wait for new work or the next poll
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=POLL_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim_next(self) -> Optional[dict]:
+        """Atomically claim the oldest due delivery (or one whose claim expired)"""
+        now = datetime.now(timezone.utc)
+
+        return await self.db.webhook_deliveries.find_one_and_update(
+            {
+                "$or": [
+                    {"status": {"$in": CLAIMABLE_STATUSES}, "next_attempt_at": {"$lte": now.isoformat()}},
+                    {"status": "in_flight", "locked_until": {"$lt": now.isoformat()}}
+                ]
+            },
+            {
+                "$set": {
+                    "status": "in_flight",
+                    "locked_by": self.worker_id,
+                    "locked_until": (now + timedelta(seconds=CLAIM_LEASE_SECONDS)).isoformat()
+                }
+            },
+            sort=[("next_attempt_at", 1)],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _attempt(self, delivery: dict):
+        """Make one delivery attempt and record the outcome"""
+        webhook = await self.db.webhooks.find_one({"id": delivery["webhook_id"]}, {"_id": 0})
+
+        if not webhook or not webhook.get("is_active", True):
+            await self._finish(delivery, {
+                "status": "dead_letter",
+                "error_message": "Webhook deleted or inactive"
+            })
+            return
+
+        url = str(webhook["url"])
+        host = url_host(url)
+
+        # Deliveries pushed back without an attempt keep their queue status
+        requeue_status = "retrying" if delivery.get("attempt_count") else "pending"
+
+        # Circuit open: push back until it may be probed, without spending an attempt
+        open_until = await self.circuits.before_attempt(url, self.worker_id)
+        if open_until:
+            await self._finish(delivery, {
+                "status": requeue_status,
+                "next_attempt_at": open_until,
+                "error_message": "Circuit open for endpoint"
+            })
+            return
+
+        # Host saturated: let the worker serve other hosts meanwhile
+        if not await self.host_limiter.acquire(host, HOST_SLOT_WAIT_SECONDS):
+            await self._finish(delivery, {
+                "status": requeue_status,
+                "next_attempt_at": (datetime.now(timezone.utc) + timedelta(seconds=HOST_BUSY_REQUEUE_SECONDS)).isoformat()
+            })
+            return
+
+        attempt = delivery.get("attempt_count", 0) + 1
+        payload_str = json.dumps(delivery["body"])
+        signature = create_signature(payload_str, webhook["secret"])
+
+        status_code, response_text, error = None, None, None
+        started = time.monotonic()
+        try:
+            async with self.session.post(
+                url,
+                data=payload_str,
+                headers={
+                    "Content-Type": "application/json",
+                    "X-Webhook-Signature": signature,
+                    "X-Webhook-ID": webhook["id"],
+                    "X-Webhook-Delivery-ID": delivery["id"],
+                    **({"X-Webhook-Batch-Size": str(delivery["event_count"])} if delivery.get("kind") == "batch" else {})
+                }
+            ) as response:
+                status_code = response.status
+                response_text = (await response.text())[:1000]  # Limit size
+        except asyncio.CancelledError:
+            await self.host_limiter.release(host, time.monotonic() - started, False)
+            raise
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        succeeded = status_code is not None and status_code < 400
+        await self.host_limiter.release(host, time.monotonic() - started, succeeded)
+
+        if succeeded:
+            await self.circuits.record_success(url)
+        else:
+            await self.circuits.record_failure(url, webhook)
+
+        if succeeded:
+            await self._finish(delivery, {
+                "status": "success",
+                "status_code": status_code,
+                "response_body": response_text,
+                "attempt_count": attempt,
+                "delivered_at": datetime.now(timezone.utc).isoformat()
+            }, webhook=webhook, success=True)
+            return
+
+        result = {
+            "status_code": status_code,
+            "response_body": response_text,
+            "error_message": error or f"HTTP {status_code}",
+            "attempt_count": attempt,
+            "last_attempt_at": datetime.now(timezone.utc).isoformat()
+        }
+
+        if attempt >= delivery.get("max_retries", 3):
+            result["status"] = "dead_letter"
+            await self._finish(delivery, result, webhook=webhook, success=False)
+            return
+
+        delay = compute_backoff(attempt, delivery.get("retry_delay", 60))
+        result["status"] = "retrying"
+        result["next_attempt_at"] = (datetime.now(timezone.utc) + timedelta(seconds=delay)).isoformat()
+        await self._finish(delivery, result)
+
+    async def _finish(
+        self,
+        delivery: dict,
+        result: Dict[str, Any],
+        webhook: Optional[dict] = None,
+        success: Optional[bool] = None
+    ):
+        """Release the claim, store the attempt result and, if final, update webhook stats"""
+        await self.db.webhook_deliveries.update_one(
+            {"id": delivery["id"], "locked_by": self.worker_id},
+            {"$set": result, "$unset": {"locked_by": "", "locked_until": ""}}
+        )
+
+        # Events carried by a batch take its final outcome
+        if delivery.get("kind") == "batch" and result.get("status") in FINAL_STATUSES:
+            await self.db.webhook_deliveries.update_many(
+                {"batch_id": delivery["id"]},
+                {"$set": {
+                    "status": result["status"],
+                    "status_code": result.get("status_code"),
+                    "attempt_count": result.get("attempt_count", delivery.get("attempt_count", 0)),
+                    "delivered_at": result.get("delivered_at")
+                }}
+            )
+
+        if webhook is None or success is None:
+            return
+
+        await self.db.webhooks.update_one(
+            {"id": webhook["id"]},
+            {
+                "$inc": {
+                    "total_deliveries": 1,
+                    "successful_deliveries" if success else "failed_deliveries": 1
+                },
+                "$set": {
+                    "last_delivery_at": datetime.now(timezone.utc).isoformat(),
+                    "last_delivery_status": "success" if success else "failed"
+                }
+            }
+        )
+
+    async def circuit_status(self, db: AsyncIOMotorDatabase, urls: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Breaker state, trip counts and local concurrency for the given URLs"""
+        urls = list(dict.fromkeys(str(u) for u in urls))
+        circuits = await db.webhook_circuits.find({"url": {"$in": urls}}, {"_id": 0}).to_list(None)
+        by_url = {c["url"]: c for c in circuits}
+
+        status = {}
+        for url in urls:
+            circuit = by_url.get(url, {})
+            status[url] = {
+                "state": circuit.get("state", "closed"),
+                "consecutive_failures": circuit.get("consecutive_failures", 0),
+                "trip_count": circuit.get("trip_count", 0),
+                "opened_at": circuit.get("opened_at"),
+                "open_until": circuit.get("open_until"),
+                "last_failure_at": circuit.get("last_failure_at"),
+                "last_success_at": circuit.get("last_success_at"),
+                "concurrency": self.host_limiter.snapshot(url_host(url))
+            }
+        return status
+
+
+# Process-wide dispatcher (started from server startup) and routing table
+dispatcher = WebhookDispatcher()
+routing_table = WebhookRoutingTable()
@@ -20,6 +20,12 @@ class Webhook(BaseModel):
     max_retries: int = 3
     retry_delay: int = 60  # seconds
     
+    # Batching: coalesce events into one signed POST of up to
+    # batch_max_events events, sent at most batch_max_wait_ms after the first
+    batch_mode: bool = False
+    batch_max_events: int = 100
+    batch_max_wait_ms: int = 5000
+    
     # Statistics
     total_deliveries: int = 0
     successful_deliveries: int = 0
@@ -39,6 +45,9 @@ class WebhookCreate(BaseModel):
     name: str
     url: HttpUrl
     events: List[str]
+    batch_mode: bool = False
+    batch_max_events: int = Field(default=100, ge=1, le=1000)
+    batch_max_wait_ms: int = Field(default=5000, ge=100, le=60000)
 
 
 class WebhookUpdate(BaseModel):
@@ -47,6 +56,9 @@ class WebhookUpdate(BaseModel):
     url: Optional[HttpUrl] = None
     events: Optional[List[str]] = None
     is_active: Optional[bool] = None
+    batch_mode: Optional[bool] = None
+    batch_max_events: Optional[int] = Field(default=None, ge=1, le=1000)
+    batch_max_wait_ms: Optional[int] = Field(default=None, ge=100, le=60000)
 
 
 class WebhookDelivery(BaseModel):
@@ -58,12 +70,14 @@ class WebhookDelivery(BaseModel):
     organization_id: str
     event_type: str
     payload: Dict
-    status: str  # pending, success, failed
+    status: str  # pending, in_flight, retrying, success, dead_letter (+ batch_queued, batched)
     status_code: Optional[int] = None
     response_body: Optional[str] = None
     error_message: Optional[str] = None
     attempt_count: int = 0
-    next_retry_at: Optional[datetime] = None
+    max_retries: int = 3
+    next_attempt_at: Optional[datetime] = None
+    batch_id: Optional[str] = None  # Batch delivery that carried this event
     delivered_at: Optional[datetime] = None
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
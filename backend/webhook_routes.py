@@ -1,15 +1,12 @@
-from fastapi import APIRouter, HTTPException, status, Depends, Request, BackgroundTasks
+from fastapi import APIRouter, HTTPException, status, Depends, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from typing import List
 from datetime import datetime, timezone, timedelta
 from .webhook_models import Webhook, WebhookCreate, WebhookUpdate, WebhookDelivery, WEBHOOK_EVENTS
 from .auth_utils import get_current_user
+from .webhook_delivery import dispatcher, routing_table
 import uuid
 import secrets
-import hmac
-import hashlib
-import aiohttp
-import json
 
 router = APIRouter(prefix="/webhooks", tags=["Webhooks"])
 
@@ -26,157 +23,34 @@ def generate_webhook_secret() -> str:
     return secrets.token_urlsafe(32)
 
 
-def create_signature(payload: str, secret: str) -> str:
-    """Create HMAC signature for webhook payload"""
-    return hmac.new(
-        secret.encode('utf-8'),
-        payload.encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
-
-
-async def deliver_webhook(
-    webhook: dict,
+async def trigger_webhooks(
     event_type: str,
     payload: dict,
+    organization_id: str,
     db: AsyncIOMotorDatabase
 ):
-    """Deliver webhook to endpoint with retry logic"""
-    delivery_id = str(uuid.uuid4())
-    
-    # Create delivery log
-    delivery = {
-        "id": delivery_id,
-        "webhook_id": webhook["id"],
-        "organization_id": webhook["organization_id"],
-        "event_type": event_type,
-        "payload": payload,
-        "status": "pending",
-        "attempt_count": 0,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    
-    await db.webhook_deliveries.insert_one(delivery)
-    
-    # Prepare webhook payload
-    webhook_payload = {
-        "id": delivery_id,
-        "event": event_type,
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        "data": payload
-    }
-    
-    payload_str = json.dumps(webhook_payload)
-    signature = create_signature(payload_str, webhook["secret"])
-    
-    # Attempt delivery
-    max_retries = webhook.get("max_retries", 3)
-    retry_delay = webhook.get("retry_delay", 60)
-    
-    for attempt in range(max_retries):
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    str(webhook["url"]),
-                    json=webhook_payload,
-                    headers={
-                        "Content-Type": "application/json",
-                        "X-Webhook-Signature": signature,
-                        "X-Webhook-ID": webhook["id"],
-                        "X-Webhook-Delivery-ID": delivery_id
-                    },
-                    timeout=aiohttp.ClientTimeout(total=30)
-                ) as response:
-                    response_text = await response.text()
-                    
-                    # Update delivery status
-                    await db.webhook_deliveries.update_one(
-                        {"id": delivery_id},
-                        {
-                            "$set": {
-                                "status": "success" if response.status < 400 else "failed",
-                                "status_code": response.status,
-                                "response_body": response_text[:1000],  # Limit size
-                                "attempt_count": attempt + 1,
-                                "delivered_at": datetime.now(timezone.utc).isoformat()
-                            }
-                        }
-                    )
-                    
-                    # Update webhook statistics
-                    if response.status < 400:
-                        await db.webhooks.update_one(
-                            {"id": webhook["id"]},
-                            {
-                                "$inc": {
-                                    "total_deliveries": 1,
-                                    "successful_deliveries": 1
-                                },
-                                "$set": {
-                                    "last_delivery_at": datetime.now(timezone.utc).isoformat(),
-                                    "last_delivery_status": "success"
-                                }
-                            }
-                        )
-                        return True
-                    else:
-                        # Retry on failure
-                        if attempt < max_retries - 1:
-                            await asyncio.sleep(retry_delay * (attempt + 1))
-                        continue
-        
-        except Exception as e:
-            # Update delivery with error
-            await db.webhook_deliveries.update_one(
-                {"id": delivery_id},
-                {
-                    "$set": {
-                        "status": "failed",
-                        "error_message": str(e),
-                        "attempt_count": attempt + 1
-                    }
-                }
-            )
-            
-            if attempt < max_retries - 1:
-                await asyncio.sleep(retry_delay * (attempt + 1))
-    
-    # All retries failed
-    await db.webhooks.update_one(
-        {"id": webhook["id"]},
-        {
-            "$inc": {
-                "total_deliveries": 1,
-                "failed_deliveries": 1
-            },
-            "$set": {
-                "last_delivery_at": datetime.now(timezone.utc).isoformat(),
-                "last_delivery_status": "failed"
-            }
-        }
-    )
-    
-    return False
+    """Queue deliveries for all webhooks subscribed to an event"""
+    return await trigger_webhooks_many(event_type, [payload], organization_id, db)
 
 
-async def trigger_webhooks(
+async def trigger_webhooks_many(
     event_type: str,
-    payload: dict,
+    payloads: List[dict],
     organization_id: str,
     db: AsyncIOMotorDatabase
 ):
-    """Trigger all webhooks subscribed to an event"""
-    # Find active webhooks for this event
-    webhooks = await db.webhooks.find({
-        "organization_id": organization_id,
-        "is_active": True,
-        "events": event_type
-    }).to_list(100)
+    """Queue deliveries for many events of one type (bulk operations)"""
+    if not payloads:
+        return []
+    
+    # Active webhooks for this event, from the cached routing table
+    webhooks = await routing_table.subscriptions(db, organization_id, event_type)
+    if not webhooks:
+        return []
     
-    # Deliver to each webhook asynchronously
-    for webhook in webhooks:
-        # Don't await - fire and forget with retry logic
-        asyncio.create_task(deliver_webhook(webhook, event_type, payload, db))
+    # Persist one delivery per subscriber and event; the dispatcher's worker
+    # pool sends them (batched for batch-mode webhooks) and handles retries
+    return await dispatcher.enqueue(db, webhooks, event_type, payloads)
 
 
 # ==================== ENDPOINTS ====================
@@ -224,6 +98,9 @@ async def create_webhook(
         url=webhook_data.url,
         secret=secret,
         events=webhook_data.events,
+        batch_mode=webhook_data.batch_mode,
+        batch_max_events=webhook_data.batch_max_events,
+        batch_max_wait_ms=webhook_data.batch_max_wait_ms,
         created_by=user["id"],
         created_by_name=user["name"]
     )
@@ -234,6 +111,7 @@ async def create_webhook(
     webhook_dict["url"] = str(webhook_dict["url"])  # Convert HttpUrl to string for MongoDB
     
     await db.webhooks.insert_one(webhook_dict)
+    routing_table.invalidate(user["organization_id"])
     
     # Log audit event
     await db.audit_logs.insert_one({
@@ -329,6 +207,7 @@ async def update_webhook(
         {"id": webhook_id},
         {"$set": update_data}
     )
+    routing_table.invalidate(user["organization_id"])
     
     updated_webhook = await db.webhooks.find_one({"id": webhook_id}, {"_id": 0})
     
@@ -355,6 +234,7 @@ async def delete_webhook(
         )
     
     await db.webhooks.delete_one({"id": webhook_id})
+    routing_table.invalidate(user["organization_id"])
     
     return {"message": "Webhook deleted successfully"}
 
@@ -362,7 +242,6 @@ async def delete_webhook(
 @router.post("/{webhook_id}/test")
 async def test_webhook(
     webhook_id: str,
-    background_tasks: BackgroundTasks,
     request: Request,
     db: AsyncIOMotorDatabase = Depends(get_db)
 ):
@@ -388,16 +267,10 @@ async def test_webhook(
         "timestamp": datetime.now(timezone.utc).isoformat()
     }
     
-    # Trigger delivery in background
-    background_tasks.add_task(
-        deliver_webhook,
-        webhook,
-        "webhook.test",
-        test_payload,
-        db
-    )
+    # Queue delivery for the dispatcher
+    delivery_ids = await dispatcher.enqueue(db, [webhook], "webhook.test", [test_payload])
     
-    return {"message": "Test webhook triggered"}
+    return {"message": "Test webhook triggered", "delivery_id": delivery_ids[0]}
 
 
 @router.get("/{webhook_id}/deliveries")
@@ -428,6 +301,67 @@ async def get_webhook_deliveries(
     return deliveries
 
 
+@router.get("/{webhook_id}/circuit")
+async def get_webhook_circuit(
+    webhook_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Get the circuit breaker state of the webhook's endpoint"""
+    user = await get_current_user(request, db)
+    
+    webhook = await db.webhooks.find_one(
+        {"id": webhook_id, "organization_id": user["organization_id"]},
+        {"_id": 0, "url": 1}
+    )
+    
+    if not webhook:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Webhook not found"
+        )
+    
+    circuits = await dispatcher.circuit_status(db, [webhook["url"]])
+    return circuits[str(webhook["url"])]
+
+
+@router.post("/{webhook_id}/deliveries/{delivery_id}/retry")
+async def retry_webhook_delivery(
+    webhook_id: str,
+    delivery_id: str,
+    request: Request,
+    db: AsyncIOMotorDatabase = Depends(get_db)
+):
+    """Requeue a dead-lettered delivery for another round of attempts"""
+    user = await get_current_user(request, db)
+    
+    result = await db.webhook_deliveries.update_one(
+        {
+            "id": delivery_id,
+            "webhook_id": webhook_id,
+            "organization_id": user["organization_id"],
+            "status": "dead_letter"
+        },
+        {
+            "$set": {
+                "status": "pending",
+                "attempt_count": 0,
+                "next_attempt_at": datetime.now(timezone.utc).isoformat()
+            }
+        }
+    )
+    
+    if result.matched_count == 0:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Dead-lettered delivery not found"
+        )
+    
+    dispatcher.wake()
+    
+    return {"message": "Delivery requeued", "delivery_id": delivery_id}
+
+
 @router.post("/{webhook_id}/regenerate-secret")
 async def regenerate_webhook_secret(
     webhook_id: str,
@@ -454,9 +388,7 @@ async def regenerate_webhook_secret(
         {"id": webhook_id},
         {"$set": {"secret": new_secret, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    routing_table.invalidate(user["organization_id"])
     
     return {"message": "Secret regenerated", "secret": new_secret}
 
-
-# Import asyncio for background tasks
-import asyncio
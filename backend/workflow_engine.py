@@ -3,12 +3,20 @@ Workflow Engine - State Machine for Workflow Execution
 Handles workflow progression, approval routing, escalation
 """
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
 from datetime import datetime, timezone, timedelta
 from typing import Dict, List, Optional, Any
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Optimistic-locking retries for workflow state transitions
+MAX_TRANSITION_RETRIES = 5
+
+# Templates and roles change rarely, but other workers may edit them without
+# being able to reach this process' cache - bound staleness with a TTL.
+CACHE_TTL = 300  # 5 minutes
+
 
 class WorkflowEngine:
     """Core workflow execution engine"""
@@ -16,9 +24,93 @@ class WorkflowEngine:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.db = db
         from .email_service import EmailService
+        from .workflow_notifications import WorkflowNotifier
         import os
         self.email_service = EmailService()
         self.frontend_url = os.environ.get('REACT_APP_BACKEND_URL', 'http://localhost:3000').replace('/api', '')
+        self.notifier = WorkflowNotifier(db, self.email_service, self.frontend_url)
+        
+        # Versioned caches: entries are (version, cached_at, value). Bumping a
+        # version invalidates every entry stored under an older one, including
+        # lookups that were still in flight when the invalidation happened.
+        # Versions are kept per template / per organization, plus a global one
+        # bumped only when everything is invalidated, so invalidating one key
+        # does not stop in-flight lookups of other keys from being cached.
+        self._template_cache: Dict[str, tuple] = {}
+        self._template_version = 0
+        self._template_versions: Dict[str, int] = {}
+        self._role_cache: Dict[tuple, tuple] = {}
+        self._role_version = 0
+        self._role_versions: Dict[str, int] = {}
+    
+    # =====================================
+    # TEMPLATE / ROLE CACHE
+    # =====================================
+    
+    def invalidate_templates(self, template_id: Optional[str] = None) -> None:
+        """Drop cached workflow templates (one template, or all of them)"""
+        if template_id:
+            self._template_versions[template_id] = self._template_versions.get(template_id, 0) + 1
+            self._template_cache.pop(template_id, None)
+        else:
+            self._template_version += 1
+            self._template_cache.clear()
+    
+    def invalidate_roles(self, organization_id: Optional[str] = None) -> None:
+        """Drop cached role code -> role id resolutions (one org, or all of them)"""
+        if organization_id:
+            self._role_versions[organization_id] = self._role_versions.get(organization_id, 0) + 1
+            for key in [k for k in self._role_cache if k[0] == organization_id]:
+                del self._role_cache[key]
+        else:
+            self._role_version += 1
+            self._role_cache.clear()
+    
+    def _template_key_version(self, template_id: str) -> tuple:
+        return self._template_version, self._template_versions.get(template_id, 0)
+    
+    def _role_key_version(self, organization_id: str) -> tuple:
+        return self._role_version, self._role_versions.get(organization_id, 0)
+    
+    async def _get_template(self, template_id: str) -> Optional[Dict[str, Any]]:
+        """Get a workflow template by id, served from cache when fresh"""
+        now = datetime.now(timezone.utc).timestamp()
+        cached = self._template_cache.get(template_id)
+        if cached:
+            version, cached_at, template = cached
+            if version == self._template_key_version(template_id) and (now - cached_at) < CACHE_TTL:
+                return template
+        
+        version = self._template_key_version(template_id)
+        template = await self.db.workflow_templates.find_one({"id": template_id}, {"_id": 0})
+        
+        # Only cache hits, and only if nothing was invalidated meanwhile
+        if template and version == self._template_key_version(template_id):
+            self._template_cache[template_id] = (version, now, template)
+        
+        return template
+    
+    async def _get_role_id(self, organization_id: str, role_code: str) -> Optional[str]:
+        """Resolve a role code to its role id within an organization"""
+        key = (organization_id, role_code)
+        now = datetime.now(timezone.utc).timestamp()
+        cached = self._role_cache.get(key)
+        if cached:
+            version, cached_at, role_id = cached
+            if version == self._role_key_version(organization_id) and (now - cached_at) < CACHE_TTL:
+                return role_id
+        
+        version = self._role_key_version(organization_id)
+        role = await self.db.roles.find_one(
+            {"code": role_code, "organization_id": organization_id},
+            {"id": 1}
+        )
+        role_id = role["id"] if role else None
+        
+        if role_id and version == self._role_key_version(organization_id):
+            self._role_cache[key] = (version, now, role_id)
+        
+        return role_id
     
     async def start_workflow(
         self,
@@ -35,13 +127,13 @@ class WorkflowEngine:
         Returns the created workflow instance
         """
         # Get template
-        template = await self.db.workflow_templates.find_one({
-            "id": template_id,
-            "organization_id": organization_id,
-            "active": True
-        })
+        template = await self._get_template(template_id)
         
-        if not template:
+        if (
+            not template
+            or template.get("organization_id") != organization_id
+            or not template.get("active", False)
+        ):
             raise ValueError(f"Workflow template {template_id} not found or inactive")
         
         if not template.get("steps") or len(template["steps"]) == 0:
@@ -56,6 +148,7 @@ class WorkflowEngine:
         approvers = await self._find_approvers_for_step(
             first_step,
             organization_id,
+            resource_type,
             resource_id,
             created_by
         )
@@ -79,7 +172,7 @@ class WorkflowEngine:
             "created_by_name": created_by_name
         }
         
-        from workflow_models import WorkflowInstance
+        from .workflow_models import WorkflowInstance
         instance = WorkflowInstance(**workflow_instance)
         
         instance_dict = instance.model_dump()
@@ -90,25 +183,14 @@ class WorkflowEngine:
         
         logger.info(f"Started workflow {instance.id} for {resource_type}/{resource_id}")
         
-        # Send email notifications to approvers
+        # Queue email notifications to approvers
         if template.get("notify_on_start", True) and approvers:
-            approver_emails = []
-            for approver_id in approvers:
-                approver = await self.db.users.find_one({"id": approver_id}, {"email": 1})
-                if approver and approver.get("email"):
-                    approver_emails.append(approver["email"])
-            
-            if approver_emails:
-                try:
-                    self.email_service.send_workflow_started_email(
-                        to_emails=approver_emails,
-                        workflow_name=template["name"],
-                        resource_type=resource_type,
-                        resource_name=resource_name,
-                        frontend_url=self.frontend_url
-                    )
-                except Exception as e:
-                    logger.error(f"Failed to send workflow start emails: {str(e)}")
+            self.notifier.notify_approvers(
+                approvers,
+                workflow_name=template["name"],
+                resource_type=resource_type,
+                resource_name=resource_name
+            )
         
         # Return clean dict without MongoDB _id
         return instance_dict
@@ -124,13 +206,62 @@ class WorkflowEngine:
         """
         Process approval action (approve/reject/request_changes)
         Returns updated workflow instance
-        """
-        # Get workflow instance
-        workflow = await self.db.workflow_instances.find_one({"id": workflow_id})
         
-        if not workflow:
-            raise ValueError(f"Workflow {workflow_id} not found")
+        The transition is written with a conditional find_one_and_update on
+        (id, version, current_step, status). If another approver changed the
+        instance in between, the write matches nothing and the action is
+        re-evaluated against the fresh state.
+        """
+        for attempt in range(MAX_TRANSITION_RETRIES):
+            workflow = await self.db.workflow_instances.find_one({"id": workflow_id}, {"_id": 0})
+            
+            if not workflow:
+                raise ValueError(f"Workflow {workflow_id} not found")
+            
+            transition = await self._compute_transition(workflow, user_id, user_name, action, comments)
+            
+            updated = await self.db.workflow_instances.find_one_and_update(
+                self._version_filter(workflow),
+                transition["update"],
+                projection={"_id": 0},
+                return_document=ReturnDocument.AFTER
+            )
+            
+            if updated:
+                await self._after_transition(updated, transition, user_name, comments)
+                return updated
+            
+            logger.info(f"Workflow {workflow_id} changed concurrently, retrying {action} (attempt {attempt + 1})")
         
+        raise ValueError("Workflow was modified by another action, please retry")
+    
+    @staticmethod
+    def _version_filter(workflow: Dict[str, Any]) -> Dict[str, Any]:
+        """Match the instance only if it is still in the state we read"""
+        query = {
+            "id": workflow["id"],
+            "current_step": workflow["current_step"],
+            "status": workflow["status"]
+        }
+        # Instances created before versioning have no version field yet
+        if "version" in workflow:
+            query["version"] = workflow["version"]
+        else:
+            query["version"] = {"$exists": False}
+        return query
+    
+    async def _compute_transition(
+        self,
+        workflow: Dict[str, Any],
+        user_id: str,
+        user_name: str,
+        action: str,
+        comments: Optional[str]
+    ) -> Dict[str, Any]:
+        """
+        Work out the next state for an approval action
+        Returns the update document plus what happened, for post-commit effects
+        """
         if workflow["status"] not in ["pending", "in_progress"]:
             raise ValueError(f"Workflow is {workflow['status']}, cannot process action")
         
@@ -139,9 +270,13 @@ class WorkflowEngine:
             raise ValueError("User not authorized to approve this workflow step")
         
         # Get template and current step
-        template = await self.db.workflow_templates.find_one({"id": workflow["template_id"]})
+        template = await self._get_template(workflow["template_id"])
+        if not template:
+            raise ValueError(f"Workflow template {workflow['template_id']} not found")
+        
         current_step_num = workflow["current_step"]
         current_step = template["steps"][current_step_num - 1]
+        now = datetime.now(timezone.utc).isoformat()
         
         # Record the approval action
         step_completion = {
@@ -151,175 +286,133 @@ class WorkflowEngine:
             "approved_by_name": user_name,
             "action": action,
             "comments": comments,
-            "approved_at": datetime.now(timezone.utc).isoformat()
+            "approved_at": now
+        }
+        
+        transition = {
+            "outcome": None,
+            "template": template,
+            "next_approvers": [],
+            "update": {
+                "$push": {"steps_completed": step_completion},
+                "$inc": {"version": 1}
+            }
         }
         
-        # Update workflow based on action
         if action == "reject":
             # Workflow rejected - end workflow
-            await self.db.workflow_instances.update_one(
-                {"id": workflow_id},
-                {
-                    "$set": {
-                        "status": "rejected",
-                        "completed_at": datetime.now(timezone.utc).isoformat()
-                    },
-                    "$push": {"steps_completed": step_completion}
-                }
-            )
-            
-            # Sync resource status
-            await self._sync_resource_status(workflow, "rejected")
-            
-            logger.info(f"Workflow {workflow_id} rejected by {user_name}")
-            
-            # Send rejection email to creator
-            if template.get("notify_on_complete", True):
-                creator = await self.db.users.find_one({"id": workflow["created_by"]}, {"email": 1})
-                if creator and creator.get("email"):
-                    try:
-                        self.email_service.send_workflow_rejected_email(
-                            to_email=creator["email"],
-                            workflow_name=workflow["template_name"],
-                            resource_type=workflow["resource_type"],
-                            resource_name=workflow["resource_name"],
-                            rejected_by=user_name,
-                            comments=comments or "No comments provided",
-                            frontend_url=self.frontend_url
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to send rejection email: {str(e)}")
-            
+            transition["outcome"] = "rejected"
+            transition["update"]["$set"] = {"status": "rejected", "completed_at": now}
+        
         elif action == "approve":
             # Check if this step requires all approvers
-            approval_type = current_step.get("approval_type", "any")
-            
-            if approval_type == "all":
-                # Check if all approvers have approved
-                completed_by = [s["approved_by"] for s in workflow.get("steps_completed", []) if s["step_number"] == current_step_num and s["action"] == "approve"]
+            if current_step.get("approval_type", "any") == "all":
+                completed_by = [
+                    s["approved_by"] for s in workflow.get("steps_completed", [])
+                    if s["step_number"] == current_step_num and s["action"] == "approve"
+                ]
                 completed_by.append(user_id)
                 
-                all_approved = all(approver in completed_by for approver in workflow["current_approvers"])
-                
-                if not all_approved:
+                if not all(approver in completed_by for approver in workflow["current_approvers"]):
                     # Not all have approved yet, just record this approval
-                    await self.db.workflow_instances.update_one(
-                        {"id": workflow_id},
-                        {"$push": {"steps_completed": step_completion}}
-                    )
-                    return await self.db.workflow_instances.find_one({"id": workflow_id}, {"_id": 0})
+                    transition["outcome"] = "recorded"
+                    return transition
             
-            # Step approved - move to next step
             if current_step_num < len(template["steps"]):
-                # More steps remaining
+                # More steps remaining - move to next step
                 next_step_num = current_step_num + 1
                 next_step = template["steps"][next_step_num - 1]
                 
-                # Find approvers for next step
                 next_approvers = await self._find_approvers_for_step(
                     next_step,
                     workflow["organization_id"],
+                    workflow["resource_type"],
                     workflow["resource_id"],
                     workflow["created_by"]
                 )
                 
-                # Calculate new due date
                 timeout_hours = next_step.get("timeout_hours", 24)
                 due_at = (datetime.now(timezone.utc) + timedelta(hours=timeout_hours)).isoformat()
                 
-                await self.db.workflow_instances.update_one(
-                    {"id": workflow_id},
-                    {
-                        "$set": {
-                            "current_step": next_step_num,
-                            "current_approvers": next_approvers,
-                            "due_at": due_at
-                        },
-                        "$push": {"steps_completed": step_completion}
-                    }
-                )
-                
-                logger.info(f"Workflow {workflow_id} advanced to step {next_step_num}")
-                
-                # Send emails to next approvers
-                if next_approvers:
-                    approver_emails = []
-                    for approver_id in next_approvers:
-                        approver = await self.db.users.find_one({"id": approver_id}, {"email": 1})
-                        if approver and approver.get("email"):
-                            approver_emails.append(approver["email"])
-                    
-                    if approver_emails:
-                        try:
-                            self.email_service.send_workflow_started_email(
-                                to_emails=approver_emails,
-                                workflow_name=workflow["template_name"],
-                                resource_type=workflow["resource_type"],
-                                resource_name=workflow["resource_name"],
-                                frontend_url=self.frontend_url
-                            )
-                        except Exception as e:
-                            logger.error(f"Failed to send step advance emails: {str(e)}")
-                
+                transition["outcome"] = "advanced"
+                transition["next_approvers"] = next_approvers
+                transition["update"]["$set"] = {
+                    "current_step": next_step_num,
+                    "current_approvers": next_approvers,
+                    "due_at": due_at
+                }
             else:
                 # All steps completed - workflow approved
-                await self.db.workflow_instances.update_one(
-                    {"id": workflow_id},
-                    {
-                        "$set": {
-                            "status": "approved",
-                            "completed_at": datetime.now(timezone.utc).isoformat()
-                        },
-                        "$push": {"steps_completed": step_completion}
-                    }
-                )
-                
-                # Sync resource status
-                await self._sync_resource_status(workflow, "approved")
-                
-                logger.info(f"Workflow {workflow_id} fully approved")
-                
-                # Send approval email to creator
-                if template.get("notify_on_complete", True):
-                    creator = await self.db.users.find_one({"id": workflow["created_by"]}, {"email": 1})
-                    if creator and creator.get("email"):
-                        try:
-                            self.email_service.send_workflow_approved_email(
-                                to_email=creator["email"],
-                                workflow_name=workflow["template_name"],
-                                resource_type=workflow["resource_type"],
-                                resource_name=workflow["resource_name"],
-                                approved_by=user_name,
-                                frontend_url=self.frontend_url
-                            )
-                        except Exception as e:
-                            logger.error(f"Failed to send approval email: {str(e)}")
+                transition["outcome"] = "approved"
+                transition["update"]["$set"] = {"status": "approved", "completed_at": now}
         
         elif action == "request_changes":
             # Request changes - mark as pending
-            await self.db.workflow_instances.update_one(
-                {"id": workflow_id},
-                {
-                    "$set": {"status": "pending"},
-                    "$push": {"steps_completed": step_completion}
-                }
+            transition["outcome"] = "changes_requested"
+            transition["update"]["$set"] = {"status": "pending"}
+        
+        else:
+            raise ValueError(f"Unknown workflow action: {action}")
+        
+        return transition
+    
+    async def _after_transition(
+        self,
+        workflow: Dict[str, Any],
+        transition: Dict[str, Any],
+        user_name: str,
+        comments: Optional[str]
+    ) -> None:
+        """Side effects of a committed transition: resource sync, logging, emails"""
+        outcome = transition["outcome"]
+        template = transition["template"]
+        workflow_id = workflow["id"]
+        
+        if outcome == "rejected":
+            await self._sync_resource_status(workflow, "rejected")
+            logger.info(f"Workflow {workflow_id} rejected by {user_name}")
+            
+            # Queue rejection email to creator
+            if template.get("notify_on_complete", True):
+                self.notifier.notify_creator(workflow, "rejected", user_name, comments)
+        
+        elif outcome == "advanced":
+            logger.info(f"Workflow {workflow_id} advanced to step {workflow['current_step']}")
+            
+            # Queue emails to next approvers
+            self.notifier.notify_approvers(
+                transition["next_approvers"],
+                workflow_name=workflow["template_name"],
+                resource_type=workflow["resource_type"],
+                resource_name=workflow["resource_name"]
             )
+        
+        elif outcome == "approved":
+            await self._sync_resource_status(workflow, "approved")
+            logger.info(f"Workflow {workflow_id} fully approved")
             
-            logger.info(f"Changes requested for workflow {workflow_id}")
+            # Queue approval email to creator
+            if template.get("notify_on_complete", True):
+                self.notifier.notify_creator(workflow, "approved", user_name)
         
-        # Return updated workflow
-        return await self.db.workflow_instances.find_one({"id": workflow_id}, {"_id": 0})
+        elif outcome == "changes_requested":
+            logger.info(f"Changes requested for workflow {workflow_id}")
     
     async def _find_approvers_for_step(
         self,
         step: Dict[str, Any],
         organization_id: str,
+        resource_type: str,
         resource_id: str,
         created_by: str
     ) -> List[str]:
         """
         Find users who can approve this workflow step
         Based on role and context, including delegation routing
+        
+        Resolution is set-based so the number of database round trips does
+        not grow with the number of approvers: one query for base approvers,
+        one aggregation for unit/region membership and one for delegations.
         """
         approver_role = step["approver_role"]
         context = step.get("approver_context", "organization")
@@ -331,12 +424,12 @@ class WorkflowEngine:
         }
         
         # Find role ID from role code
-        role = await self.db.roles.find_one({"code": approver_role, "organization_id": organization_id})
-        if not role:
+        role_id = await self._get_role_id(organization_id, approver_role)
+        if not role_id:
             logger.warning(f"Role {approver_role} not found for organization {organization_id}")
             return []
         
-        query["role_id"] = role["id"]
+        query["role_id"] = role_id
         
         # Apply context filtering
         if context == "own":
@@ -345,61 +438,89 @@ class WorkflowEngine:
         
         elif context in ["team", "branch", "region"]:
             # Find users in same team/branch/region as resource
-            # Get resource's org unit
-            resource_unit_id = await self._get_resource_unit_id(workflow["resource_type"], resource_id)
+            resource_unit_id = await self._get_resource_unit_id(resource_type, resource_id)
             
             if resource_unit_id:
-                # Get org unit and find approvers in same context
-                org_unit = await self.db.org_units.find_one({"id": resource_unit_id})
-                
-                if org_unit and context == "branch":
-                    # Find users assigned to this specific unit
-                    query["assigned_unit_ids"] = resource_unit_id
-                elif org_unit and context == "region":
-                    # Find users in same parent unit (region)
-                    parent_id = org_unit.get("parent_id")
-                    if parent_id:
-                        # Find all units under this parent
-                        child_units = await self.db.org_units.find({"parent_id": parent_id}, {"id": 1}).to_list(100)
-                        child_unit_ids = [u["id"] for u in child_units]
-                        query["assigned_unit_ids"] = {"$in": child_unit_ids}
+                context_unit_ids = await self._resolve_context_unit_ids(resource_unit_id, context)
+                if context_unit_ids:
+                    query["assigned_unit_ids"] = {"$in": context_unit_ids}
             
-            users = await self.db.users.find(query, {"id": 1}).to_list(100)
-            base_approvers = [u["id"] for u in users] if users else []
+            base_approvers = await self.db.users.distinct("id", query)
             
             # Fallback to all users with role if no context match
-            if not base_approvers:
-                if "assigned_unit_ids" in query:
-                    del query["assigned_unit_ids"]
-                users = await self.db.users.find(query, {"id": 1}).to_list(100)
-                base_approvers = [u["id"] for u in users]
+            if not base_approvers and "assigned_unit_ids" in query:
+                del query["assigned_unit_ids"]
+                base_approvers = await self.db.users.distinct("id", query)
         
         else:  # organization
             # All users with this role in organization
-            users = await self.db.users.find(query, {"id": 1}).to_list(100)
-            base_approvers = [u["id"] for u in users]
+            base_approvers = await self.db.users.distinct("id", query)
+        
+        if not base_approvers:
+            return []
         
-        # Check for active delegations and add delegates
+        # Add delegates of every base approver with a single query. Only
+        # delegations that apply to all workflows are honoured.
         now = datetime.now(timezone.utc).isoformat()
-        final_approvers = set(base_approvers)
-        
-        for approver_id in base_approvers:
-            # Find active delegations from this approver
-            delegations = await self.db.delegations.find({
-                "delegator_id": approver_id,
-                "active": True,
-                "valid_from": {"$lte": now},
-                "valid_until": {"$gte": now}
-            }).to_list(100)
-            
-            for delegation in delegations:
-                # Check if delegation applies to this workflow
-                workflow_types = delegation.get("workflow_types", [])
-                if len(workflow_types) == 0 or "all" in workflow_types:
-                    # Delegation applies to all workflows, add delegate
-                    final_approvers.add(delegation["delegate_id"])
-        
-        return list(final_approvers)
+        delegates = await self.db.delegations.distinct("delegate_id", {
+            "delegator_id": {"$in": base_approvers},
+            "active": True,
+            "valid_from": {"$lte": now},
+            "valid_until": {"$gte": now},
+            "$or": [
+                {"workflow_types": {"$exists": False}},
+                {"workflow_types": {"$size": 0}},
+                {"workflow_types": "all"}
+            ]
+        })
+        
+        # Preserve order: base approvers first, then delegates
+        return list(dict.fromkeys([*base_approvers, *delegates]))
+    
+    async def _resolve_context_unit_ids(
+        self,
+        unit_id: str,
+        context: str
+    ) -> List[str]:
+        """
+        Resolve the org units whose members qualify for a team/branch/region
+        approval context, in a single aggregation against org_units.
+        
+        - team/branch: the resource's own unit
+        - region: every unit sharing the resource unit's parent
+        """
+        pipeline = [
+            {"$match": {"id": unit_id}},
+            {"$limit": 1},
+        ]
+        
+        if context == "region":
+            pipeline.append({
+                "$lookup": {
+                    "from": "org_units",
+                    "let": {"parent_id": "$parent_id"},
+                    "pipeline": [
+                        {"$match": {"$expr": {"$and": [
+                            {"$ne": ["$$parent_id", None]},
+                            {"$eq": ["$parent_id", "$$parent_id"]}
+                        ]}}},
+                        {"$project": {"_id": 0, "id": 1}}
+                    ],
+                    "as": "region_units"
+                }
+            })
+        
+        pipeline.append({"$project": {"_id": 0, "id": 1, "region_units": 1}})
+        
+        results = await self.db.org_units.aggregate(pipeline).to_list(1)
+        if not results:
+            return []
+        
+        org_unit = results[0]
+        if context == "region":
+            return [u["id"] for u in org_unit.get("region_units", [])]
+        
+        return [org_unit["id"]]
     
     async def check_escalations(self) -> List[Dict[str, Any]]:
         """
@@ -412,13 +533,13 @@ class WorkflowEngine:
         overdue_workflows = await self.db.workflow_instances.find({
             "status": "in_progress",
             "due_at": {"$lt": now}
-        }).to_list(1000)
+        }, {"_id": 0}).to_list(1000)
         
         escalated = []
         
         for workflow in overdue_workflows:
             # Get template
-            template = await self.db.workflow_templates.find_one({"id": workflow["template_id"]})
+            template = await self._get_template(workflow["template_id"])
             if not template:
                 continue
             
@@ -427,31 +548,33 @@ class WorkflowEngine:
             
             if escalate_to_role:
                 # Find users with escalation role
-                role = await self.db.roles.find_one({
-                    "code": escalate_to_role,
-                    "organization_id": workflow["organization_id"]
-                })
+                role_id = await self._get_role_id(workflow["organization_id"], escalate_to_role)
                 
-                if role:
-                    escalation_users = await self.db.users.find({
-                        "role_id": role["id"],
+                if role_id:
+                    escalation_approvers = await self.db.users.distinct("id", {
+                        "role_id": role_id,
                         "status": "active"
-                    }, {"id": 1}).to_list(100)
-                    
-                    escalation_approvers = [u["id"] for u in escalation_users]
+                    })
                     
-                    # Update workflow with escalated approvers
-                    await self.db.workflow_instances.update_one(
-                        {"id": workflow["id"]},
+                    # Update workflow with escalated approvers, unless an
+                    # approval moved it on since we read it
+                    updated = await self.db.workflow_instances.find_one_and_update(
+                        self._version_filter(workflow),
                         {
                             "$set": {
                                 "current_approvers": escalation_approvers,
                                 "status": "escalated"
-                            }
-                        }
+                            },
+                            "$inc": {"version": 1}
+                        },
+                        projection={"_id": 0},
+                        return_document=ReturnDocument.AFTER
                     )
                     
-                    escalated.append(workflow)
+                    if not updated:
+                        continue
+                    
+                    escalated.append(updated)
                     logger.info(f"Escalated workflow {workflow['id']} to role {escalate_to_role}")
         
         return escalated
@@ -463,42 +586,49 @@ class WorkflowEngine:
         reason: str
     ) -> Dict[str, Any]:
         """Cancel an active workflow"""
-        workflow = await self.db.workflow_instances.find_one({"id": workflow_id})
-        
-        if not workflow:
-            raise ValueError(f"Workflow {workflow_id} not found")
-        
-        if workflow["status"] not in ["pending", "in_progress", "escalated"]:
-            raise ValueError(f"Cannot cancel workflow with status {workflow['status']}")
+        now = datetime.now(timezone.utc).isoformat()
         
         # Record cancellation
         cancellation = {
-            "step_number": workflow["current_step"],
             "step_name": "Cancelled",
             "approved_by": user_id,
             "approved_by_name": "System",
             "action": "cancel",
             "comments": reason,
-            "approved_at": datetime.now(timezone.utc).isoformat()
+            "approved_at": now
         }
         
-        await self.db.workflow_instances.update_one(
-            {"id": workflow_id},
-            {
-                "$set": {
+        # Single conditional write: only active workflows can be cancelled
+        # (an update pipeline lets the pushed entry read current_step)
+        workflow = await self.db.workflow_instances.find_one_and_update(
+            {"id": workflow_id, "status": {"$in": ["pending", "in_progress", "escalated"]}},
+            [
+                {"$set": {
                     "status": "cancelled",
-                    "completed_at": datetime.now(timezone.utc).isoformat()
-                },
-                "$push": {"steps_completed": cancellation}
-            }
+                    "completed_at": now,
+                    "steps_completed": {"$concatArrays": [
+                        {"$ifNull": ["$steps_completed", []]},
+                        [{"$mergeObjects": [{"step_number": "$current_step"}, {"$literal": cancellation}]}]
+                    ]},
+                    "version": {"$add": [{"$ifNull": ["$version", 0]}, 1]}
+                }}
+            ],
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER
         )
         
+        if not workflow:
+            existing = await self.db.workflow_instances.find_one({"id": workflow_id}, {"status": 1})
+            if not existing:
+                raise ValueError(f"Workflow {workflow_id} not found")
+            raise ValueError(f"Cannot cancel workflow with status {existing['status']}")
+        
         logger.info(f"Workflow {workflow_id} cancelled by user {user_id}")
         
         # Sync resource status on cancellation
         await self._sync_resource_status(workflow, "cancelled")
         
-        return await self.db.workflow_instances.find_one({"id": workflow_id}, {"_id": 0})
+        return workflow
 
 
     
@@ -576,3 +706,22 @@ class WorkflowEngine:
         resource = await collection.find_one({"id": resource_id}, {"unit_id": 1})
         
         return resource.get("unit_id") if resource else None
+
+
+# Shared engine - built once per database rather than per request, so the
+# template/role caches and the email client survive across calls
+_engine: Optional[WorkflowEngine] = None
+
+
+def get_workflow_engine(db: AsyncIOMotorDatabase) -> WorkflowEngine:
+    """Get the process-wide WorkflowEngine for this database"""
+    global _engine
+    if _engine is None or _engine.db is not db:
+        _engine = WorkflowEngine(db)
+    return _engine
+
+
+async def drain_workflow_notifications() -> None:
+    """Wait for the shared engine's pending email queue inserts (on shutdown)"""
+    if _engine is not None:
+        await _engine.notifier.drain()
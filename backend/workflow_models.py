@@ -98,6 +98,7 @@ class WorkflowInstance(BaseModel):
     completed_at: Optional[str] = None
     created_by: str
     created_by_name: str
+    version: int = 0  # Incremented on every state transition (optimistic locking)
 
 
 class WorkflowInstanceCreate(BaseModel):
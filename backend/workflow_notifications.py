@@ -0,0 +1,132 @@
+"""
+Workflow Notifications - Recipient resolution and email queueing
+Keeps SendGrid calls off the workflow state transition path
+"""
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from typing import Dict, List, Optional, Any, Iterable
+import asyncio
+import logging
+
+from .email_outbox import outbox
+
+logger = logging.getLogger(__name__)
+
+# Sender used by workflow notifications
+WORKFLOW_FROM_EMAIL = "noreply@opsplatform.com"
+WORKFLOW_FROM_NAME = "OpsPlatform"
+
+
+class WorkflowNotifier:
+    """Resolves workflow email recipients in bulk and queues them in the email outbox"""
+
+    def __init__(self, db: AsyncIOMotorDatabase, email_service, frontend_url: str):
+        self.db = db
+        self.email_service = email_service
+        self.frontend_url = frontend_url
+        self._pending: set = set()
+
+    async def resolve_emails(self, user_ids: Iterable[str]) -> Dict[str, str]:
+        """Map user ids to email addresses with a single $in query"""
+        ids = list(dict.fromkeys(user_ids))
+        if not ids:
+            return {}
+
+        users = await self.db.users.find(
+            {"id": {"$in": ids}},
+            {"_id": 0, "id": 1, "email": 1}
+        ).to_list(None)
+
+        return {u["id"]: u["email"] for u in users if u.get("email")}
+
+    def notify_approvers(
+        self,
+        approver_ids: List[str],
+        workflow_name: str,
+        resource_type: str,
+        resource_name: str
+    ) -> None:
+        """Queue an approval request email to every approver"""
+        if not approver_ids:
+            return
+
+        async def _send():
+            emails = await self.resolve_emails(approver_ids)
+            if emails:
+                subject, html_content = self.email_service.render_workflow_started_email(
+                    workflow_name, resource_type, resource_name, self.frontend_url
+                )
+                await self._enqueue(list(emails.values()), subject, html_content, "workflow_started")
+
+        self._dispatch(_send(), "approval request")
+
+    def notify_creator(
+        self,
+        workflow: Dict[str, Any],
+        outcome: str,
+        acted_by: str,
+        comments: Optional[str] = None
+    ) -> None:
+        """Queue the approved/rejected email to the workflow creator"""
+        async def _send():
+            emails = await self.resolve_emails([workflow["created_by"]])
+            to_email = emails.get(workflow["created_by"])
+            if not to_email:
+                return
+
+            if outcome == "approved":
+                subject, html_content = self.email_service.render_workflow_approved_email(
+                    workflow["template_name"],
+                    workflow["resource_type"],
+                    workflow["resource_name"],
+                    acted_by,
+                    self.frontend_url
+                )
+            else:
+                subject, html_content = self.email_service.render_workflow_rejected_email(
+                    workflow["template_name"],
+                    workflow["resource_type"],
+                    workflow["resource_name"],
+                    acted_by,
+                    comments or "No comments provided",
+                    self.frontend_url
+                )
+            await self._enqueue([to_email], subject, html_content, f"workflow_{outcome}", workflow.get("id"))
+
+        self._dispatch(_send(), f"workflow {outcome}")
+
+    async def _enqueue(
+        self,
+        to_emails: List[str],
+        subject: str,
+        html_content: str,
+        email_type: str,
+        workflow_id: Optional[str] = None
+    ) -> None:
+        """Queue one outbox message; sent with the platform-wide SendGrid key"""
+        await outbox.enqueue(
+            self.db,
+            to_emails=to_emails,
+            subject=subject,
+            html_content=html_content,
+            email_type=email_type,
+            metadata={"workflow_id": workflow_id} if workflow_id else None,
+            from_email=WORKFLOW_FROM_EMAIL,
+            from_name=WORKFLOW_FROM_NAME
+        )
+
+    def _dispatch(self, coro, description: str) -> None:
+        """Fire-and-forget the recipient lookup and insert, keeping a reference until it finishes"""
+        async def _guarded():
+            try:
+                await coro
+            except Exception as e:
+                logger.error(f"Failed to queue {description} email: {str(e)}")
+
+        task = asyncio.create_task(_guarded())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def drain(self) -> None:
+        """Wait for all pending queue inserts to finish (used on shutdown)"""
+        if self._pending:
+            await asyncio.gather(*list(self._pending), return_exceptions=True)
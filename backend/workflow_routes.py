@@ -5,7 +5,7 @@ from .workflow_models import (
     WorkflowInstance, WorkflowInstanceCreate,
     WorkflowApprovalAction, WorkflowStats
 )
-from .workflow_engine import WorkflowEngine
+from .workflow_engine import get_workflow_engine
 from .auth_utils import get_current_user
 from .sanitization import sanitize_dict
 from datetime import datetime, timezone
@@ -257,6 +257,7 @@ async def update_workflow_template(
             {"id": template_id},
             {"$set": update_data}
         )
+        get_workflow_engine(db).invalidate_templates(template_id)
     
     updated = await db.workflow_templates.find_one({"id": template_id}, {"_id": 0})
     return updated
@@ -294,6 +295,8 @@ async def delete_workflow_template(
             detail="Workflow template not found"
         )
     
+    get_workflow_engine(db).invalidate_templates(template_id)
+    
     return {"message": "Workflow template deactivated successfully"}
 
 
@@ -310,7 +313,7 @@ async def start_workflow_instance(
     """Start a new workflow instance"""
     user = await get_current_user(request, db)
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     
     try:
         instance = await engine.start_workflow(
@@ -429,7 +432,7 @@ async def approve_workflow_step(
             detail="You don't have permission to approve workflows"
         )
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     
     try:
         updated_workflow = await engine.process_approval_action(
@@ -478,7 +481,7 @@ async def check_workflow_escalations_endpoint(
     """Check for workflows that need escalation (manual trigger)"""
     user = await get_current_user(request, db)
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     
     try:
         escalated = await engine.check_escalations()
@@ -498,7 +501,7 @@ async def check_workflow_escalations_endpoint(
             detail="You don't have permission to approve workflows"
         )
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     results = []
     
     for workflow_id in workflow_ids:
@@ -552,7 +555,7 @@ async def bulk_reject_workflows(
             detail="Comments are required for bulk rejection"
         )
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     results = []
     
     for workflow_id in workflow_ids:
@@ -586,7 +589,7 @@ async def cancel_workflow_instance(
     """Cancel an active workflow"""
     user = await get_current_user(request, db)
     
-    engine = WorkflowEngine(db)
+    engine = get_workflow_engine(db)
     
     try:
         updated_workflow = await engine.cancel_workflow(
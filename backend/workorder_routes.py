@@ -21,6 +21,21 @@ def generate_wo_number(org_id: str) -> str:
     return f"WO-{timestamp}-{random_suffix}"
 
 
+def status_change_fields(new_status: str, user: dict, started: bool) -> dict:
+    """Fields to $set when a work order moves to new_status (started: actual_start already set)"""
+    now = datetime.now(timezone.utc).isoformat()
+    update_data = {"status": new_status, "updated_at": now}
+    
+    if new_status == "in_progress" and not started:
+        update_data["actual_start"] = now
+    elif new_status == "completed":
+        update_data["actual_end"] = now
+        update_data["completed_by"] = user["id"]
+        update_data["completed_at"] = now
+    
+    return update_data
+
+
 @router.post("", status_code=status.HTTP_201_CREATED)
 async def create_work_order(
     wo_data: WorkOrderCreate,
@@ -235,14 +250,8 @@ async def change_status(
     if not new_status:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Status required")
     
-    update_data = {"status": new_status, "updated_at": datetime.now(timezone.utc).isoformat()}
-    
-    if new_status == "in_progress" and not await db.work_orders.find_one({"id": wo_id, "actual_start": {"$ne": None}}):
-        update_data["actual_start"] = datetime.now(timezone.utc).isoformat()
-    elif new_status == "completed":
-        update_data["actual_end"] = datetime.now(timezone.utc).isoformat()
-        update_data["completed_by"] = user["id"]
-        update_data["completed_at"] = datetime.now(timezone.utc).isoformat()
+    started = new_status == "in_progress" and await db.work_orders.find_one({"id": wo_id, "actual_start": {"$ne": None}}) is not None
+    update_data = status_change_fields(new_status, user, started)
     
     await db.work_orders.update_one({"id": wo_id}, {"$set": update_data})
     return await db.work_orders.find_one({"id": wo_id}, {"_id": 0})
@@ -81,7 +81,17 @@ const BulkImportPage = () => {
         { headers }
       );
 
-      setImportResults(response.data);
+      // The import runs as a background job: poll until it finishes
+      let job = response.data.job;
+      while (job.status === 'queued' || job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, 2000));
+        const poll = await axios.get(`${API_BASE_URL}/api/bulk-import/jobs/${job.id}`, {
+          headers: { Authorization: `Bearer ${token}` }
+        });
+        job = poll.data;
+      }
+
+      setImportResults(job);
       setFile(null);
       setValidationResults(null);
     } catch (err: unknown) {
@@ -92,6 +102,19 @@ const BulkImportPage = () => {
     }
   };
 
+  const downloadErrorReport = async (jobId: string) => {
+    const token = localStorage.getItem('token') || localStorage.getItem('access_token');
+    const response = await axios.get(`${API_BASE_URL}/api/bulk-import/jobs/${jobId}/errors`, {
+      headers: { Authorization: `Bearer ${token}` },
+      responseType: 'blob'
+    });
+    const url = URL.createObjectURL(response.data);
+    const a = document.createElement('a');
+    a.href = url;
+    a.download = 'user_import_errors.csv';
+    a.click();
+  };
+
   const downloadTemplate = () => {
     const csvContent = 'email,name,role\nexample@company.com,John Doe,viewer\ntest@company.com,Jane Smith,operator\nmanager@company.com,Bob Manager,manager';
     const blob = new Blob([csvContent], { type: 'text/csv' });
@@ -327,9 +350,13 @@ const BulkImportPage = () => {
         {importResults && (
           <div className="bg-white dark:bg-gray-800 rounded-lg border border-gray-200 dark:border-gray-700 p-6">
             <h2 className="text-lg font-semibold text-gray-900 dark:text-white mb-4">
-              Import Complete
+              {importResults.status === 'failed' ? 'Import Failed' : 'Import Complete'}
             </h2>
 
+            {importResults.error && (
+              <p className="mb-4 text-sm text-red-600 dark:text-red-400">{importResults.error}</p>
+            )}
+
             <div className="grid grid-cols-2 gap-4 mb-6">
               <div className="p-4 bg-green-50 dark:bg-green-900/20 rounded-lg">
                 <div className="flex items-center gap-2 text-green-600 dark:text-green-400 mb-2">
@@ -337,7 +364,7 @@ const BulkImportPage = () => {
                   <span className="text-sm font-medium">Successfully Imported</span>
                 </div>
                 <p className="text-2xl font-bold text-gray-900 dark:text-white">
-                  {importResults.success_count}
+                  {importResults.imported}
                 </p>
               </div>
 
@@ -347,30 +374,19 @@ const BulkImportPage = () => {
                   <span className="text-sm font-medium">Failed</span>
                 </div>
                 <p className="text-2xl font-bold text-gray-900 dark:text-white">
-                  {importResults.failed_count}
+                  {importResults.failed}
                 </p>
               </div>
             </div>
 
-            {importResults.failed_users && importResults.failed_users.length > 0 && (
-              <div>
-                <h3 className="text-sm font-semibold text-gray-900 dark:text-white mb-3 flex items-center gap-2">
-                  <AlertCircle className="w-4 h-4 text-red-600" />
-                  Failed Imports
-                </h3>
-                <div className="space-y-2 max-h-40 overflow-y-auto">
-                  {importResults.failed_users.map((failure: any, index: number) => (
-                    <div
-                      key={index}
-                      className="p-3 bg-red-50 dark:bg-red-900/20 border border-red-200 dark:border-red-800 rounded-lg text-sm"
-                    >
-                      <p className="text-red-800 dark:text-red-300">
-                        <strong>{failure.email}:</strong> {failure.reason}
-                      </p>
-                    </div>
-                  ))}
-                </div>
-              </div>
+            {importResults.failed > 0 && (
+              <button
+                onClick={() => downloadErrorReport(importResults.id)}
+                className="w-full px-4 py-2 border border-gray-300 dark:border-gray-600 text-gray-700 dark:text-gray-300 rounded-lg hover:bg-gray-50 dark:hover:bg-gray-700 flex items-center justify-center gap-2"
+              >
+                <Download className="w-4 h-4" />
+                Download Error Report
+              </button>
             )}
 
             <button
@@ -0,0 +1,169 @@
+"""
+Benchmark the bulk asset import pipeline.
+
+Generates --rows synthetic assets as CSV, gzip-compressed CSV and XLSX and
+runs each through the import path used by POST /api/assets/import:
+
+  parse     - import_files row reader only
+  prepare   - parse + AssetCreate validation + document building
+              (asset_import.prepare_rows), batched like the importer
+
+With --mongo-url the full import (duplicate-tag query, unit lookup and
+insert_many per batch) also runs against a scratch database, next to the
+previous per-row path (find_one on asset_tag + insert_one per row) for
+comparison. The scratch database is dropped afterwards.
+
+    python scripts/benchmark_asset_import.py [--rows 100000] [--mongo-url mongodb://localhost:27017]
+"""
+import argparse
+import asyncio
+import csv
+import gzip
+import io
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from starlette.datastructures import UploadFile  # noqa: E402
+
+from backend.asset_import import ASSET_IMPORT_BATCH_SIZE, REQUIRED_COLUMNS, prepare_rows, import_assets  # noqa: E402
+from backend.import_files import iter_upload_rows  # noqa: E402
+
+COLUMNS = ["asset_tag", "name", "description", "asset_type", "criticality", "make", "model",
+           "serial_number", "purchase_date", "purchase_cost", "status", "tags"]
+
+
+def make_rows(count: int):
+    for i in range(count):
+        yield [
+            f"BENCH-{i:07d}",
+            f"Pump {i}",
+            f"Centrifugal pump, line {i % 40}",
+            "equipment",
+            "ABC"[i % 3],
+            "Grundfos",
+            f"CR{i % 90}",
+            f"SN{i * 7919:010d}",
+            "2024-03-15",
+            f"{1000 + i % 5000}.50",
+            "active",
+            "pumps;line-a",
+        ]
+
+
+def make_csv(count: int) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    writer.writerows(make_rows(count))
+    return buffer.getvalue().encode()
+
+
+def make_xlsx(count: int) -> bytes:
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(COLUMNS)
+    for row in make_rows(count):
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
+def upload(data: bytes, filename: str) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename=filename)
+
+
+async def parse_only(data: bytes, filename: str) -> int:
+    count = 0
+    async for _ in iter_upload_rows(upload(data, filename), REQUIRED_COLUMNS):
+        count += 1
+    return count
+
+
+async def parse_and_prepare(data: bytes, filename: str) -> int:
+    prepared = 0
+    batch = []
+    async for row in iter_upload_rows(upload(data, filename), REQUIRED_COLUMNS):
+        batch.append(row)
+        if len(batch) >= ASSET_IMPORT_BATCH_SIZE:
+            prepared += len(prepare_rows(batch, "bench-org", "bench-user")[0])
+            batch = []
+    if batch:
+        prepared += len(prepare_rows(batch, "bench-org", "bench-user")[0])
+    return prepared
+
+
+async def timed(label: str, coro) -> float:
+    started = time.perf_counter()
+    result = await coro
+    elapsed = time.perf_counter() - started
+    print(f"  {label:<28} {elapsed:7.2f} s   {result:>8} rows")
+    return elapsed
+
+
+async def per_row_import(db, data: bytes, filename: str) -> int:
+    """The previous path: one tag lookup and one insert per row"""
+    imported = 0
+    async for row_number, row in iter_upload_rows(upload(data, filename), REQUIRED_COLUMNS):
+        documents, _ = prepare_rows([(row_number, row)], "bench-org", "bench-user")
+        for _, document in documents:
+            if await db.assets.find_one({"asset_tag": document["asset_tag"], "organization_id": "bench-org"}):
+                continue
+            await db.assets.insert_one(document)
+            imported += 1
+    return imported
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Bulk asset import benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--mongo-url", default=None)
+    args = parser.parse_args()
+
+    print(f"Generating {args.rows} assets...")
+    csv_bytes = make_csv(args.rows)
+    files = {
+        "assets.csv": csv_bytes,
+        "assets.csv.gz": gzip.compress(csv_bytes),
+        "assets.xlsx": make_xlsx(args.rows),
+    }
+    for filename, data in files.items():
+        print(f"  {filename:<14} {len(data) / (1024 * 1024):7.1f} MB")
+
+    print("Parse / validate (no database):")
+    for filename, data in files.items():
+        await timed(f"{filename} parse", parse_only(data, filename))
+        await timed(f"{filename} parse+prepare", parse_and_prepare(data, filename))
+
+    if not args.mongo_url:
+        return
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    client = AsyncIOMotorClient(args.mongo_url)
+    db = client[f"asset_import_bench_{uuid.uuid4().hex[:8]}"]
+    user = {"id": "bench-user", "organization_id": "bench-org"}
+    try:
+        await db.assets.create_index([("organization_id", 1), ("asset_tag", 1)])
+        print("Full import (MongoDB):")
+        batched = await timed("batched insert_many", count_imported(import_assets(db, user, iter_upload_rows(upload(csv_bytes, "assets.csv"), REQUIRED_COLUMNS))))
+        await db.assets.delete_many({})
+        per_row = await timed("per-row insert_one", per_row_import(db, csv_bytes, "assets.csv"))
+        print(f"  batched: {per_row / batched:.1f}x faster")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+async def count_imported(coro) -> int:
+    return (await coro)["imported"]
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
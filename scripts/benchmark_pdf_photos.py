@@ -0,0 +1,123 @@
+"""
+Benchmark inspection report rendering with embedded photos.
+
+Builds an inspection with --photos answers, each carrying one synthetic
+camera-size JPEG (4032x3024 by default), and renders it with
+InspectionPDFGenerator three ways:
+
+  full-res   - original camera JPEGs embedded as-is
+  prepared   - originals downscaled by pdf_photos.prepare_photos (what the
+               PDF worker does when no rendition exists)
+  rendition  - 1024px JPEG renditions (what the derivative pipeline stores)
+               downscaled by prepare_photos
+
+Times include photo preparation. Reports size and render time for each.
+
+    python scripts/benchmark_pdf_photos.py [--photos 50] [--repeat 3]
+"""
+import argparse
+import io
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from backend.pdf_generator_service import InspectionPDFGenerator  # noqa: E402
+from backend.pdf_photos import prepare_photos  # noqa: E402
+
+
+def make_photo(index: int, width: int, height: int) -> bytes:
+    """A camera-like JPEG: gradient, shapes and sensor noise (hard to compress)"""
+    image = Image.linear_gradient("L").resize((width, height)).convert("RGB")
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x = (index * 97 + i * 331) % width
+        y = (index * 53 + i * 211) % height
+        draw.rectangle([x, y, x + width // 6, y + height // 8], fill=((i * 40) % 255, (index * 30) % 255, 120))
+    noise = Image.effect_noise((width, height), 40).convert("RGB")
+    image = Image.blend(image, noise, 0.3).filter(ImageFilter.SMOOTH)
+
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def make_inspection(photo_ids):
+    questions = [
+        {"id": f"q{i}", "question_text": f"Check item {i + 1} and attach a photo"}
+        for i in range(len(photo_ids))
+    ]
+    execution = {
+        "id": str(uuid.uuid4()),
+        "organization_id": "bench",
+        "status": "completed",
+        "inspector_name": "Bench Inspector",
+        "started_at": "2026-10-01T09:00:00+00:00",
+        "score": 92,
+        "passed": True,
+        "answers": [
+            {"question_id": q["id"], "answer": True, "photo_ids": [photo_id], "notes": ""}
+            for q, photo_id in zip(questions, photo_ids)
+        ],
+        "findings": [],
+    }
+    template = {"id": "bench-template", "name": "Photo Benchmark", "questions": questions}
+    return execution, template
+
+
+def bench(label, generator, execution, template, prepare, repeat):
+    best = None
+    size = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        photos = prepare()
+        pdf = generator.generate_inspection_report(execution, template, photos=photos).getvalue()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+        size = len(pdf)
+    print(f"  {label:<10} {best:7.2f} s   {size / (1024 * 1024):8.2f} MB")
+    return best, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PDF photo embedding benchmark")
+    parser.add_argument("--photos", type=int, default=50)
+    parser.add_argument("--width", type=int, default=4032)
+    parser.add_argument("--height", type=int, default=3024)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"Generating {args.photos} photos at {args.width}x{args.height}...")
+    originals = {f"photo{i}": make_photo(i, args.width, args.height) for i in range(args.photos)}
+    renditions = {}
+    for photo_id, data in originals.items():
+        with Image.open(io.BytesIO(data)) as image:
+            image.thumbnail((1024, 1024))
+            buffer = io.BytesIO()
+            image.save(buffer, "JPEG", quality=82)
+            renditions[photo_id] = buffer.getvalue()
+
+    source_mb = sum(len(d) for d in originals.values()) / (1024 * 1024)
+    print(f"Source photos: {source_mb:.1f} MB total")
+
+    execution, template = make_inspection(list(originals))
+    generator = InspectionPDFGenerator()
+
+    def full_resolution():
+        return {pid: (data, args.width, args.height) for pid, data in originals.items()}
+
+    print(f"Report with {args.photos} photos (best of {args.repeat}):")
+    baseline, baseline_size = bench("full-res", generator, execution, template, full_resolution, args.repeat)
+    prepared, prepared_size = bench("prepared", generator, execution, template, lambda: prepare_photos(originals), args.repeat)
+    rendition, rendition_size = bench("rendition", generator, execution, template, lambda: prepare_photos(renditions), args.repeat)
+
+    print(f"  prepared:  {baseline / prepared:.1f}x faster, {baseline_size / prepared_size:.1f}x smaller")
+    print(f"  rendition: {baseline / rendition:.1f}x faster, {baseline_size / rendition_size:.1f}x smaller")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Count the database round trips of workflow approver resolution.
+
+Seeds a scratch database with one organization per size in --sizes, each
+with that many users holding the approver role (spread over the units of
+one region) and a delegation for every tenth approver. It then resolves a
+step in each approver context with WorkflowEngine._find_approvers_for_step
+and counts the commands sent to MongoDB through pymongo command
+monitoring.
+
+Resolution is set-based, so the command count per context must be the same
+for every size. The script exits non-zero if it is not. The scratch
+database is dropped afterwards.
+
+    python scripts/benchmark_workflow_approvers.py --mongo-url mongodb://localhost:27017 [--sizes 10,1000,5000]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from pymongo import monitoring  # noqa: E402
+
+from backend.workflow_engine import WorkflowEngine  # noqa: E402
+
+CONTEXTS = ["organization", "team", "branch", "region", "own"]
+UNITS_PER_REGION = 20
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts commands sent to the server while enabled"""
+
+    def __init__(self):
+        self.enabled = False
+        self.commands = []
+
+    def started(self, event):
+        if self.enabled:
+            self.commands.append(event.command_name)
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+async def seed(db, organization_id: str, approvers: int) -> str:
+    """Users, units, role and delegations for one organization; returns the resource id"""
+    now = datetime.now(timezone.utc)
+    region_id = f"{organization_id}-region"
+    unit_ids = [f"{organization_id}-unit-{i}" for i in range(UNITS_PER_REGION)]
+    role_id = f"{organization_id}-role"
+
+    await db.roles.insert_one({"id": role_id, "code": "approver", "organization_id": organization_id})
+    await db.org_units.insert_many(
+        [{"id": region_id, "organization_id": organization_id, "parent_id": None}]
+        + [{"id": unit_id, "organization_id": organization_id, "parent_id": region_id} for unit_id in unit_ids]
+    )
+
+    users = [
+        {
+            "id": f"{organization_id}-user-{i}",
+            "organization_id": organization_id,
+            "status": "active",
+            "role_id": role_id,
+            "assigned_unit_ids": [unit_ids[i % UNITS_PER_REGION]]
+        }
+        for i in range(approvers)
+    ]
+    await db.users.insert_many(users)
+    await db.delegations.insert_many([
+        {
+            "id": str(uuid.uuid4()),
+            "delegator_id": user["id"],
+            "delegate_id": f"{user['id']}-delegate",
+            "active": True,
+            "valid_from": (now - timedelta(days=1)).isoformat(),
+            "valid_until": (now + timedelta(days=1)).isoformat(),
+            "workflow_types": ["all"]
+        }
+        for user in users[::10]
+    ])
+
+    resource_id = f"{organization_id}-task"
+    await db.tasks.insert_one({"id": resource_id, "organization_id": organization_id, "unit_id": unit_ids[0]})
+    return resource_id
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Workflow approver resolution round trips")
+    parser.add_argument("--mongo-url", required=True)
+    parser.add_argument("--sizes", default="10,1000,5000")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    counter = CommandCounter()
+    client = AsyncIOMotorClient(args.mongo_url, event_listeners=[counter])
+    db = client[f"workflow_approvers_bench_{uuid.uuid4().hex[:8]}"]
+    try:
+        await db.users.create_index([("organization_id", 1), ("role_id", 1), ("status", 1)])
+        await db.delegations.create_index([("delegator_id", 1), ("active", 1)])
+        await db.org_units.create_index([("id", 1)])
+        await db.org_units.create_index([("parent_id", 1)])
+        await db.tasks.create_index([("id", 1)])
+
+        engine = WorkflowEngine(db)
+        counts = {}
+        print(f"{'approvers':>10} {'context':<14} {'commands':>8} {'resolved':>9} {'ms':>8}")
+        for size in sizes:
+            organization_id = f"bench-org-{size}"
+            resource_id = await seed(db, organization_id, size)
+            for context in CONTEXTS:
+                engine.invalidate_roles()
+                step = {"approver_role": "approver", "approver_context": context}
+                counter.commands = []
+                counter.enabled = True
+                started = time.perf_counter()
+                approvers = await engine._find_approvers_for_step(
+                    step, organization_id, "task", resource_id, "creator"
+                )
+                elapsed = (time.perf_counter() - started) * 1000
+                counter.enabled = False
+                counts.setdefault(context, set()).add(len(counter.commands))
+                print(f"{size:>10} {context:<14} {len(counter.commands):>8} {len(approvers):>9} {elapsed:8.1f}")
+
+        varying = [context for context, seen in counts.items() if len(seen) > 1]
+        if varying:
+            print(f"FAIL: round trips grow with approvers for: {', '.join(varying)}")
+            sys.exit(1)
+        print("OK: round trips are constant in the number of approvers")
+    finally:
+        await client.drop_database(db.name)
+        client.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,59 @@
+"""
+Fake SendGrid sink for local testing of the email outbox.
+
+Accepts POST /v3/mail/send like SendGrid and keeps the requests in memory.
+Point the backend at it with EMAIL_API_BASE_URL=http://localhost:8025 and
+any SENDGRID_API_KEY value.
+
+    python scripts/fake_email_sink.py [--port 8025] [--status 202]
+
+GET /messages lists the received requests, DELETE /messages clears them.
+--status makes every send return that code (e.g. 429 or 500 to exercise
+retries).
+"""
+import argparse
+from datetime import datetime, timezone
+
+from aiohttp import web
+
+received = []
+
+
+async def mail_send(request):
+    body = await request.json()
+    received.append({
+        "received_at": datetime.now(timezone.utc).isoformat(),
+        "authorization": request.headers.get("Authorization"),
+        "recipients": [p["to"][0]["email"] for p in body.get("personalizations", [])],
+        "body": body
+    })
+    status = request.app["status"]
+    print(f"📧 {status} - {body.get('subject')} -> {len(body.get('personalizations', []))} recipient(s)")
+    return web.Response(status=status, text="" if status < 300 else "fake sink error")
+
+
+async def list_messages(request):
+    return web.json_response(received)
+
+
+async def clear_messages(request):
+    received.clear()
+    return web.json_response({"cleared": True})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake SendGrid HTTP sink")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--status", type=int, default=202)
+    args = parser.parse_args()
+
+    app = web.Application()
+    app["status"] = args.status
+    app.router.add_post("/v3/mail/send", mail_send)
+    app.router.add_get("/messages", list_messages)
+    app.router.add_delete("/messages", clear_messages)
+    web.run_app(app, port=args.port)
+
+
+if __name__ == "__main__":
+    main()